@@ -3,6 +3,9 @@ const vscode = require('vscode')
 const jsonrpc = require('vscode-jsonrpc')
 const errable = require("./errors").errable
 const pkg = require("../package.json")
+const resultStreams = new Map()
+const pendingResults = new Map()
+const MAX_PENDING_STREAMS = 10
 
 function subscribe(getClient, context) {
     pkg.contributes.commands.forEach(cmd => {
@@ -10,6 +13,33 @@ function subscribe(getClient, context) {
     })
 }
 
+/**
+ * Receive items streamed by the server (see pyxt/streams.py)
+ */
+function publish(client) {
+    client.onReady().then(errable(() => {
+        client.onNotification("pyxt.results", receiveResults)
+    }))
+}
+
+function receiveResults(params) {
+    const append = resultStreams.get(params.id)
+    if (append) {
+        append(params)
+        return
+    }
+    // Streaming starts before the command result is received. Hold
+    // batches until the stream is registered by streamResults.
+    if (!pendingResults.has(params.id)) {
+        pendingResults.set(params.id, [])
+        if (pendingResults.size > MAX_PENDING_STREAMS) {
+            // result of oldest stream was not received or not displayed
+            pendingResults.delete(pendingResults.keys().next().value)
+        }
+    }
+    pendingResults.get(params.id).push(params)
+}
+
 function registerCommand(id, getClient, context) {
     const slug = id === "pyxt.command" ? "" : (id.slice(5) + " ")
     const reg = vscode.commands.registerCommand(id, args => {
@@ -82,7 +112,7 @@ function dispatch(result, client, cmd, value) {
     }
     if (result.type === "items") {
         if (result.filter_results) {
-            return filterResults(result, cmd + value)
+            return filterResults(result, cmd + value, client)
         }
         if (result.value) {
             value = result.value.slice(cmd.length)
@@ -128,7 +158,7 @@ async function getCommandResult(input, client) {
     }
 }
 
-async function filterResults(result, command) {
+async function filterResults(result, command, client) {
     const input = vscode.window.createQuickPick()
     const disposables = [input]
     try {
@@ -137,18 +167,28 @@ async function filterResults(result, command) {
         input.ignoreFocusOut = true
         input.matchOnDescription = true
         input.matchOnDetail = true
+        if (result.stream) {
+            const items = streamResults(input, client, result, disposables)
+            result = {...result, items}
+        }
         setCompletions(input, command, result, toQuickPickItem)
         input.show()
         const item = await new Promise(resolve => {
             if (!result.keep_empty_details) {
                 const change = input.onDidChangeValue(errable(value => {
                     distributeDetails(input)
+                    input.pyxt_distribute_details = true
                     change.dispose()
                 }))
                 disposables.push(change)
             }
             disposables.push(input.onDidAccept(errable(() => {
-                resolve(input.selectedItems[0])
+                const item = input.selectedItems[0]
+                if (item && item.is_load_more) {
+                    input.pyxt_load_more()
+                } else {
+                    resolve(item)
+                }
             })))
             disposables.push(input.onDidHide(errable(() => resolve())))
         })
@@ -163,6 +203,64 @@ async function filterResults(result, command) {
     }
 }
 
+/**
+ * Append items streamed by the server to filtered results
+ *
+ * Items are sent in pages. A "Load more…" item is shown at the end of
+ * each page after the last; accepting it requests the next page. The
+ * server is notified if the results are closed before the final batch
+ * of items is received so it can stop producing items.
+ *
+ * @returns the initial list of items.
+ */
+function streamResults(input, client, result, disposables) {
+    const id = result.stream
+    const withLoadMore = (items, more) => more ? [...items, loadMoreItem()] : items
+    let {items, more} = result
+    let done = false
+    for (const params of pendingResults.get(id) || []) {
+        items = [...items, ...params.items]
+        more = params.more
+        done = params.done
+    }
+    pendingResults.delete(id)
+    resultStreams.set(id, params => {
+        const active = input.activeItems.filter(item => !item.is_load_more)
+        const items = input.items.filter(item => !item.is_load_more)
+        items.push(...params.items.map(toQuickPickItem))
+        input.items = withLoadMore(items, params.more)
+        if (input.pyxt_distribute_details) {
+            distributeDetails(input)
+        }
+        if (active.length) {
+            input.activeItems = active
+        }
+        if (params.done) {
+            resultStreams.delete(id)
+        }
+        input.busy = !(params.done || params.more)
+    })
+    input.pyxt_load_more = () => {
+        input.items = input.items.filter(item => !item.is_load_more)
+        input.busy = true
+        client.sendNotification("pyxt.loadResults", {id})
+    }
+    disposables.push({dispose: () => {
+        if (resultStreams.delete(id)) {
+            client.sendNotification("pyxt.cancelResults", {id})
+        }
+    }})
+    if (done) {
+        resultStreams.delete(id)
+    }
+    input.busy = !(done || more)
+    return withLoadMore(items, more)
+}
+
+function loadMoreItem() {
+    return {label: "Load more\u2026", alwaysShow: true, is_load_more: true}
+}
+
 /**
  * Copy "detail" to items without starting with the last item
  * 
@@ -330,6 +428,8 @@ function splitGoto(path) {
 
 module.exports = {
     subscribe,
+    publish,
+    receiveResults,
     command,
     commandInput,
     splitGoto,
@@ -6,6 +6,7 @@ const {workspace} = require('vscode')
 const {LanguageClient} = require('vscode-languageclient')
 const jsproxy = require("./jsproxy")
 const commander = require("./commander")
+const errable = require("./errors").errable
 const DEBUG_PORT = 2087
 let client
 
@@ -30,9 +31,32 @@ function getClient(context) {
 function setup(client, context) {
     context.subscriptions.push(client.start())
     jsproxy.publish(client, context)
+    commander.publish(client)
+    watchEditor(client, context)
     loadUserScript(client)
 }
 
+/**
+ * Notify server of editor changes that invalidate its cached editor state
+ *
+ * Document changes are reported with standard LSP notifications.
+ */
+function watchEditor(client, context) {
+    const notify = errable(() => {
+        const editor = vscode.window.activeTextEditor
+        const uri = editor ? editor.document.uri.toString() : null
+        client.sendNotification("pyxt.didChangeEditor", {uri})
+    })
+    client.onReady().then(errable(() => {
+        notify()
+        context.subscriptions.push(
+            vscode.window.onDidChangeActiveTextEditor(notify),
+            vscode.window.onDidChangeTextEditorSelection(notify),
+            vscode.window.onDidChangeTextEditorOptions(notify),
+        )
+    }))
+}
+
 function startServer() {
     if (isStartedInDebugMode()) {
         return startLangServerTCP(DEBUG_PORT)
@@ -91,7 +115,15 @@ async function loadUserScript(client) {
 }
 
 function getClientOptions() {
-    return {outputChannelName: "PyXT"}
+    return {
+        outputChannelName: "PyXT",
+        documentSelector: [{scheme: "file"}, {scheme: "untitled"}],
+        synchronize: {
+            configurationSection: "pyxt",
+            // keep workspace file index (open **/...) up to date
+            fileEvents: workspace.createFileSystemWatcher("**/*"),
+        },
+    }
 }
 
 module.exports = {
@@ -82,7 +82,7 @@ const editor = {
         })
     }),
 
-    set_texts: withEditor((editor, texts, ranges) => {
+    set_texts: withEditor(async (editor, texts, ranges, select) => {
         const uri = editor.document.uri
         const edits = new vscode.WorkspaceEdit()
         texts.forEach((text, i) => {
@@ -91,7 +91,12 @@ const editor = {
                 edits.replace(uri, rng, text)
             }
         })
-        return vscode.workspace.applyEdit(edits)
+        const applied = await vscode.workspace.applyEdit(edits)
+        if (applied && select) {
+            // select range in terms of offsets after edits are applied
+            editor.selection = selection(editor, select)
+        }
+        return applied
     }),
 
     rename: withEditor((editor, path, overwrite) => {
@@ -114,35 +119,85 @@ function publish(client, context) {
     }))
 }
 
-async function resolve(params) {
+async function resolve(params, token) {
+    if (Array.isArray(params)) {
+        return await resolveAll(params, token)
+    }
     try {
-        return await get(namespace[params.root], params)
+        return await get(namespace[params.root], params, token)
     } catch (error) {
         console.error(error)
         return ["__error__", error.message, error.stack]
     }
 }
 
-async function get(obj, params) {
+/**
+ * Resolve a batch of proxy specs in order
+ *
+ * Errors are returned per item so one failure does not discard the
+ * results of other items in the batch. Remaining items are not resolved
+ * after the request has been cancelled by the server.
+ */
+async function resolveAll(specs, token) {
+    const values = []
+    for (const params of specs) {
+        values.push(await resolve(params, token))
+    }
+    return values
+}
+
+async function get(obj, params, token) {
+    if (token && token.isCancellationRequested) {
+        throw new Error("cancelled")
+    }
+    if (params.path) {
+        return await getPath(obj, params, token)
+    }
     let value = obj[params.name]
     if (params.args) {
         if (!value) {
             console.error("not callable", params, value)
             return undefined
         }
-        const args = []
-        for (var i = 0; i < params.args.length; i++) {
-            const arg = params.args[i]
-            const shouldResolve = _.isObject(arg) && arg.__resolve__
-            args.push(shouldResolve ? await resolve(arg) : arg)
-        }
-        value = await value.apply(obj, args)
+        value = await value.apply(obj, await resolveArgs(params.args, token))
     }
     if (value === undefined) {
         return value
     }
     const next = params.next
-    return !next ? value : await get(value, next)
+    return !next ? value : await get(value, next, token)
+}
+
+/**
+ * Call function at path with args (compiled proxy spec)
+ *
+ * @param params - `{path: [...names], args: [...]}`
+ */
+async function getPath(obj, params, token) {
+    const names = params.path
+    const last = names.length - 1
+    for (var i = 0; i < last; i++) {
+        obj = obj[names[i]]
+        if (obj === undefined) {
+            return obj
+        }
+    }
+    const func = obj[names[last]]
+    if (!func) {
+        console.error("not callable", params, func)
+        return undefined
+    }
+    return await func.apply(obj, await resolveArgs(params.args, token))
+}
+
+async function resolveArgs(args, token) {
+    const values = []
+    for (var i = 0; i < args.length; i++) {
+        const arg = args[i]
+        const shouldResolve = _.isObject(arg) && arg.__resolve__
+        values.push(shouldResolve ? await resolve(arg, token) : arg)
+    }
+    return values
 }
 
 module.exports = {
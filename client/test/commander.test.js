@@ -551,6 +551,126 @@ suite('Commander', () => {
         assert(!await result)
     })
 
+    test("should append streamed results", async () => {
+        const items = [
+            {label: "1: file 1", detail: "file1", filepath: "/dir/file1"},
+        ]
+        const more = [
+            {label: "1: file 2", detail: "file2", filepath: "/dir/file2"},
+        ]
+        client = util.mockClient(
+            ["get_completions", ["ag file"], {items: []}],
+            ["do_command", ["ag file"], {
+                type: "items", items, filter_results: true, stream: "1",
+            }],
+        )
+        let input
+        const result = commander.commandInput(client, "", "ag file")
+        input = await env.inputItemsChanged()
+        env.accept(input)
+        input = await env.inputItemsChanged()
+        assert(input.busy)
+        const itemsChanged = env.inputItemsChanged()
+        commander.receiveResults({id: "1", items: more, done: true})
+        input = await itemsChanged
+        assert.deepStrictEqual(input.items, [...items, ...more])
+        assert(!input.busy)
+
+        input.hide()
+        assert(!await result)
+        assert.deepStrictEqual(client.notifications, [])
+    })
+
+    test("should show results streamed before command result", async () => {
+        const items = [
+            {label: "1: file 1", detail: "file1", filepath: "/dir/file1"},
+        ]
+        const more = [
+            {label: "1: file 2", detail: "file2", filepath: "/dir/file2"},
+        ]
+        client = util.mockClient(
+            ["get_completions", ["ag file"], {items: []}],
+            ["do_command", ["ag file"], {
+                type: "items", items, filter_results: true, stream: "4",
+            }],
+        )
+        commander.receiveResults({id: "4", items: more, done: true, more: false})
+        let input
+        const result = commander.commandInput(client, "", "ag file")
+        input = await env.inputItemsChanged()
+        env.accept(input)
+        input = await env.inputItemsChanged()
+        env.assertItems(input, ["1: file 1/file1", "1: file 2/file2"])
+        assert(!input.busy)
+
+        input.hide()
+        assert(!await result)
+        assert.deepStrictEqual(client.notifications, [])
+    })
+
+    test("should load more streamed results", async () => {
+        const items = [
+            {label: "1: file 1", detail: "file1", filepath: "/dir/file1"},
+        ]
+        const more = [
+            {label: "1: file 2", detail: "file2", filepath: "/dir/file2"},
+        ]
+        client = util.mockClient(
+            ["get_completions", ["ag file"], {items: []}],
+            ["do_command", ["ag file"], {
+                type: "items", items, filter_results: true, stream: "3", more: true,
+            }],
+        )
+        let input
+        const result = commander.commandInput(client, "", "ag file")
+        input = await env.inputItemsChanged()
+        env.accept(input)
+        input = await env.inputItemsChanged()
+        env.assertItems(input, ["1: file 1/file1", "Load more\u2026"])
+        assert(!input.busy)
+
+        input.selectedItems = input.items.slice(1, 2)
+        env.accept(input)
+        assert(input.busy)
+        env.assertItems(input, ["1: file 1/file1"])
+        assert.deepStrictEqual(client.notifications, [
+            ["pyxt.loadResults", {id: "3"}],
+        ])
+
+        const itemsChanged = env.inputItemsChanged()
+        commander.receiveResults({id: "3", items: more, done: true, more: false})
+        input = await itemsChanged
+        env.assertItems(input, ["1: file 1/file1", "1: file 2/file2"])
+        assert(!input.busy)
+
+        input.hide()
+        assert(!await result)
+        assert.strictEqual(client.notifications.length, 1)
+    })
+
+    test("should cancel streamed results on close", async () => {
+        const items = [
+            {label: "1: file 1", detail: "file1", filepath: "/dir/file1"},
+        ]
+        client = util.mockClient(
+            ["get_completions", ["ag file"], {items: []}],
+            ["do_command", ["ag file"], {
+                type: "items", items, filter_results: true, stream: "2",
+            }],
+        )
+        let input
+        const result = commander.commandInput(client, "", "ag file")
+        input = await env.inputItemsChanged()
+        env.accept(input)
+        input = await env.inputItemsChanged()
+
+        input.hide()
+        assert(!await result)
+        assert.deepStrictEqual(client.notifications, [
+            ["pyxt.cancelResults", {id: "2"}],
+        ])
+    })
+
     test("should show custom placeholder for filter results", async () => {
         client = util.mockClient(
             ["get_completions", ["ag file"], {items: []}],
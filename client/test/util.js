@@ -114,8 +114,13 @@ function itemText(item) {
 function mockClient(...responses) {
     responses = responses.reverse()
     const unexpected = []
+    const notifications = []
     return {
+        notifications,
         onReady: async () => undefined,
+        sendNotification: (method, params) => {
+            notifications.push([method, params])
+        },
         sendRequest: async (method, params) => {
             const command = params.command
             const args = params.arguments
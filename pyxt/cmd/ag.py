@@ -1,8 +1,12 @@
 import os
 import re
 import subprocess
-from asyncio.exceptions import CancelledError
+import sys
+from collections import OrderedDict
+from os.path import abspath, commonpath, expanduser
 
+from .. import fileindex, search
+from ..streams import ResultStream
 from ..command import command, get_context
 from ..parser import File, Regex, RegexPattern, String, VarArgs
 from ..process import process_lines
@@ -19,8 +23,27 @@ DEFAULT_OPTIONS = [
     "--nopager",
     "--nocolor",
 ]
+NATIVE_OPTIONS = {
+    "-i": "--ignore-case",
+    "-s": "--case-sensitive",
+    "-S": "--smart-case",
+    "-Q": "--literal",
+    "-w": "--word-regexp",
+}
+# ag options that search files not searched by default (hidden files,
+# ignored files or files outside of the searched tree)
+UNRESTRICTED_OPTIONS = frozenset([
+    "--all-types",
+    "--follow",
+    "--hidden",
+    "--path-to-ignore",
+    "--skip-vcs-ignores",
+    "--unrestricted",
+])
+UNRESTRICTED_FLAGS = frozenset("afpuU")
 MAX_LINE_LENGTH = 150
-MAX_RESULT_ITEMS = 200
+MAX_CACHE_SIZE = 32  # number of cached searches
+MAX_CACHE_BYTES = 32 * 1024 * 1024
 AG_NOT_INSTALLED = """
 {} not found. It may be necessary to set the ag executable path in the
 extension settings.
@@ -38,8 +61,8 @@ async def get_selection_regex(editor=None):
 async def project_dirname(editor=None):
     if editor is None:
         return None
-    project_path = await editor.project_path
-    return (await editor.dirname) if project_path == "~" else project_path
+    state = await editor.snapshot()
+    return state.dirname if state.project_path == "~" else state.project_path
 
 
 @command(
@@ -63,33 +86,68 @@ async def ag(editor, args):
     cwd = args.path or await editor.dirname
     if cwd is None:
         return input_required("path is required", args)
-    items = []
-    line_processor = make_line_processor(items, ag_path, cwd)
-    command = [ag_path, pattern] + [o for o in args.options if o] + options
+    if not args.path:
+        args.path = cwd
+    placeholder = await get_context(args).parser.arg_string(args)
+    backend = await editor.search_backend
+    native = backend == "native" or (backend != "ag" and not is_ag_installed(ag_path))
+    key = (
+        str(pattern),
+        pattern.flags,
+        cwd,
+        tuple(o for o in args.options if o),
+        "native" if native else ag_path,
+    )
+    fingerprint = tree_fingerprint(cwd, await editor.project_path, args.options)
+    cached = None if fingerprint is None else result_cache.get(key, fingerprint)
+    if fingerprint is not None and cached is None:
+        collector = ItemCollector(result_cache.max_bytes)
+    else:
+        collector = None
+    stream = ResultStream(
+        await editor.search_page_size,
+        ready=count_complete_files,
+        finish=finish_batch,
+        keep=collector,
+    )
+    if cached is not None:
+        producer = replay(stream, cached)
+    elif native:
+        producer = native_search(stream, pattern, args.options, cwd)
+    else:
+        line_processor = make_line_processor(stream, ag_path, cwd)
+        command = [ag_path, pattern] + [o for o in args.options if o] + options
+        producer = process_lines(command, cwd=cwd, **line_processor)
+    if collector is not None:
+        producer = cache_results(collector, producer, key, fingerprint)
+    stream.run(producer)
+    error_items = []
     try:
-        await process_lines(command, cwd=cwd, **line_processor)
+        complete = await stream.wait()
+        if complete:
+            await stream.task
     except AgNotFound:
         return error(AG_NOT_INSTALLED.format(ag_path))
     except CommandError as err:
-        if not items:
+        if not stream.count:
             return input_required(str(err), args)
-        items.append({"label": "", "description": str(err)})
-    except TooManyResults:
-        pass
-    if items:
-        drop_redundant_details(items)
-    if not args.path:
-        args.path = cwd
-    placeholder = await get_context(args).parser.arg_string(args)
-    return result(items, filter_results=True, placeholder=placeholder)
+        error_items.append({"label": "", "description": str(err)})
+    items = stream.take() + error_items
+    extra = {}
+    if not complete:
+        stream.start(editor.server)
+        extra.update(stream=stream.id, more=stream.more)
+    return result(items, filter_results=True, placeholder=placeholder, **extra)
 
 
-def make_line_processor(items, ag_path, cwd):
+def make_line_processor(stream, ag_path, cwd):
 
     async def ag_lines(lines):
         filepath = None
         absfilepath = None
         async for line in lines:
+            # pause (and stop reading ag output) while buffer is full
+            await stream.drain()
             line = line.rstrip("\n")
             line = line.rstrip("\0")  # bug in ag adds null char to some lines?
             if line.startswith(":"):
@@ -106,7 +164,7 @@ def make_line_processor(items, ag_path, cwd):
 
     def got_output(item, returncode, error=""):
         if item is not None:
-            items.append(item)
+            stream.put(item)
         if returncode:
             if not is_ag_installed(ag_path):
                 raise AgNotFound
@@ -115,8 +173,6 @@ def make_line_processor(items, ag_path, cwd):
             else:
                 message = f"[exit: {returncode}] {error}"
             raise CommandError(message)
-        if len(items) >= MAX_RESULT_ITEMS:
-            raise TooManyResults
 
     return {
         "iter_output": ag_lines,
@@ -125,6 +181,175 @@ def make_line_processor(items, ag_path, cwd):
     }
 
 
+async def native_search(stream, pattern, options, cwd):
+    """Search with `pyxt.search` instead of ag
+
+    Supports a subset of ag options (see `NATIVE_OPTIONS`). Like ag,
+    the search is case-insensitive if the pattern is all lowercase
+    unless `--case-sensitive` is given.
+    """
+    options = {NATIVE_OPTIONS.get(o, o) for o in options if o}
+    unsupported = options - set(NATIVE_OPTIONS.values())
+    if unsupported:
+        raise CommandError(
+            "unsupported option(s): " + " ".join(sorted(unsupported)) + " "
+            "(see pyxt.searchBackend setting)")
+    if not os.path.isdir(cwd):
+        raise CommandError(f"No such file or directory: {cwd}")
+    flags = pattern.flags
+    regex = str(pattern)
+    if "--literal" in options:
+        regex = re.escape(regex)
+    if "--word-regexp" in options:
+        regex = rf"\b(?:{regex})\b"
+    if "--case-sensitive" not in options and regex == regex.lower():
+        flags |= re.IGNORECASE
+    results = search.search(cwd, regex, flags)
+    try:
+        async for relpath, num, start, length, text in results:
+            abspath = os.path.join(cwd, relpath)
+            ranges = f";{start} {length}"
+            # truncate like an ag output line
+            text = text[:MAX_LINE_LENGTH - len(f"{num}{ranges}:")]
+            stream.put(create_item(abspath, relpath, str(num), ranges, ":", text))
+            await stream.drain()
+    except re.error as err:
+        raise CommandError(f"invalid pattern: {err}")
+    finally:
+        await results.aclose()
+    if not stream.count:
+        raise CommandError("no match")
+
+
+async def cache_results(collector, producer, key, fingerprint):
+    await producer
+    if collector.items is not None:
+        result_cache.set(key, fingerprint, collector.items, collector.nbytes)
+
+
+async def replay(stream, items):
+    for item in items:
+        stream.put(item)
+        await stream.drain()
+
+
+def tree_fingerprint(path, project_path, options=()):
+    """Get a value that changes when searched files under path change
+
+    Changes are reported by the client's file system watcher, which
+    watches workspace folders. Changes elsewhere are not reported.
+    Changes to files that are not searched by default are not counted
+    (see `fileindex.generation`), so searches with options that search
+    those files cannot be fingerprinted.
+
+    :param options: Search options.
+    :returns: The file index generation of the project or `None` if
+    path is not searched by default, the project is not a workspace
+    folder, or options search files that are not searched by default.
+    """
+    if not project_path or project_path in ["~", expanduser("~")]:
+        return None
+    if is_unrestricted(options):
+        return None
+    path = abspath(path)
+    project_path = abspath(project_path)
+    if commonpath([path, project_path]) != project_path:
+        return None
+    if not fileindex.is_searched(project_path, path):
+        return None
+    return fileindex.generation(project_path)
+
+
+def is_unrestricted(options):
+    """Check if options search files that are not searched by default"""
+    for option in options:
+        if option.startswith("--"):
+            if option.partition("=")[0] in UNRESTRICTED_OPTIONS:
+                return True
+        elif option.startswith("-") and UNRESTRICTED_FLAGS.intersection(option[1:]):
+            return True
+    return False
+
+
+class ResultCache:
+    """LRU cache of complete search results
+
+    Cached results are valid while the tree fingerprint with which they
+    were stored is unchanged.
+
+    :param max_size: Maximum number of cached searches.
+    :param max_bytes: Maximum (estimated) size of all cached items.
+    Searches with more items are not cached.
+    """
+
+    def __init__(self, max_size=MAX_CACHE_SIZE, max_bytes=MAX_CACHE_BYTES):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items = OrderedDict()
+
+    def get(self, key, fingerprint):
+        """Get cached items or `None`"""
+        entry = self._items.get(key)
+        if entry is None:
+            return None
+        if entry[0] != fingerprint:
+            self._discard(key)
+            return None
+        self._items.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, fingerprint, items, nbytes=None):
+        if nbytes is None:
+            nbytes = sum(_sizeof(item) for item in items)
+        self._discard(key)
+        if nbytes > self.max_bytes:
+            return
+        self._items[key] = (fingerprint, items, nbytes)
+        self.nbytes += nbytes
+        while len(self._items) > self.max_size or self.nbytes > self.max_bytes:
+            self._discard(next(iter(self._items)))
+
+    def _discard(self, key):
+        entry = self._items.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[2]
+
+    def clear(self):
+        self._items.clear()
+        self.nbytes = 0
+
+
+class ItemCollector:
+    """Collect search result items to be cached
+
+    Collecting stops (and `items` is set to `None`) when the estimated
+    size of the items exceeds `max_bytes` since they would not be
+    cached.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.items = []
+        self.nbytes = 0
+
+    def __call__(self, item):
+        if self.items is None:
+            return
+        self.nbytes += _sizeof(item)
+        if self.nbytes > self.max_bytes:
+            self.items = None
+        else:
+            self.items.append(item)
+
+
+def _sizeof(item):
+    return sys.getsizeof(item) + sum(sys.getsizeof(v) for v in item.values())
+
+
+result_cache = ResultCache()
+
+
 def create_item(abspath, relpath, num, ranges, delim, text):
     rng = next(iter(ranges.lstrip(";").split(",")), "")
     if rng:
@@ -139,6 +364,22 @@ def create_item(abspath, relpath, num, ranges, delim, text):
     }
 
 
+def count_complete_files(items):
+    """Count items excluding those of the last (possibly incomplete) file"""
+    end = len(items)
+    if end:
+        detail = items[-1].get("detail")
+        while end and items[end - 1].get("detail") == detail:
+            end -= 1
+    return end
+
+
+def finish_batch(items):
+    # copy items to leave those in the result cache unchanged
+    items[:] = [dict(item) for item in items]
+    drop_redundant_details(items)
+
+
 def drop_redundant_details(items):
     detail = None
     for item in reversed(items):
@@ -176,7 +417,3 @@ class CommandError(Exception):
 
 class AgNotFound(CommandError):
     pass
-
-
-class TooManyResults(CancelledError):
-    pass
@@ -3,12 +3,13 @@ import re
 from itertools import tee
 
 from ..command import command
+from ..jsproxy import gather
 
 log = logging.getLogger(__name__)
 
 
 async def default_scope(editor):
-    a, b = await editor.selection() or (0, 0)
+    a, b = (await editor.snapshot()).selection or (0, 0)
     return "all" if a == b else "selection"
 
 
@@ -19,17 +20,16 @@ async def argwrap(editor, args):
     Wrap if the selection spans a single line, unwrap if it spans
     multiple lines.
     """
-    full_text = await editor.get_text()
-    selections = await editor.selections()
+    full_text, state = await gather(editor.get_text(), editor.snapshot())
     texts = []
     ranges = []
-    for sel in reversed(selections):
+    for sel in reversed(state.selections):
         text, rng = toggle_wrap(
             full_text,
             sel,
-            await editor.eol,
-            await editor.insert_spaces,
-            await editor.tab_size,
+            state.eol,
+            state.insert_spaces,
+            state.tab_size,
             trailing_comma=True,
         )
         texts.append(text)
@@ -18,7 +18,7 @@ async def default_package(editor):
 
 
 async def default_scope(editor=None):
-    start, end = await editor.selection()
+    start, end = (await editor.snapshot()).selection or (0, 0)
     return bool(end - start)
 
 
@@ -2,14 +2,27 @@ import os
 from os.path import dirname, exists, expanduser, isabs, isdir, join, sep
 from pathlib import Path
 
+from .. import fileindex
 from ..command import command, Incomplete
-from ..parser import CompletionsList, File
+from ..parser import CompleteWord, CompletionsList, File, String
 from ..results import result
+from ..util import user_path
+
+FIND_ANYWHERE = "**/"
 
 
 class FilePath(File):
+    """File path with workspace-wide search
+
+    A path beginning with `**/` completes with files matching the rest
+    of the path (fuzzy) anywhere in the project directory.
+    """
 
     async def get_completions(self, arg):
+        if arg.start < len(arg.text):
+            token = (await String.consume(self, arg.text, arg.start))[0] or ""
+            if token.startswith(FIND_ANYWHERE):
+                return await self.find_anywhere(token[len(FIND_ANYWHERE):])
         items = await super().get_completions(arg)
         if isinstance(items, CompletionsList):
             root = expanduser(items.title)
@@ -19,6 +32,18 @@ class FilePath(File):
                     items[i] = {"label": item, "filepath": filepath}
         return items
 
+    async def find_anywhere(self, query):
+        root = await self.project_path
+        if not root or not isabs(root) or root == expanduser("~"):
+            return []
+        start = len(FIND_ANYWHERE)
+        paths = await fileindex.get_index(root).find(query)
+        items = [{
+            "label": CompleteWord(path, start=start),
+            "filepath": join(root, path),
+        } for path in paths]
+        return CompletionsList(items, title=user_path(root))
+
 
 @command(
     FilePath("path"),
@@ -27,7 +52,7 @@ class FilePath(File):
     has_history=False,
 )
 async def open_file(editor, args):
-    if not args.path or isdir(args.path):
+    if not args.path or isdir(args.path) or "**" in args.path.split(sep):
         raise Incomplete
     if not exists(args.path):
         create_new_file(args.path)
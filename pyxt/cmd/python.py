@@ -13,12 +13,12 @@ log = logging.getLogger(__name__)
 
 
 async def get_python_executable(editor=None):
-    path = await editor.python_path
+    path = (await editor.snapshot()).python_path
     return path if os.path.sep in path else which(path)
 
 
 async def default_scope(editor):
-    a, b = await editor.selection() or (0, 0)
+    a, b = (await editor.snapshot()).selection or (0, 0)
     return "all" if a == b else "selection"
 
 
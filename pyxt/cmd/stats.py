@@ -0,0 +1,36 @@
+from .. import stats as mod
+from ..command import command
+from ..parser import Choice, Int
+from ..results import result
+
+
+@command(
+    Choice("show", "reset", name="action"),
+    Int("limit", default=20),
+    has_history=False,
+)
+async def stats(editor, args):
+    """Show client round trip counts and latency by command and proxy path"""
+    if args.action == "reset":
+        mod.reset()
+        await editor.show_message("PyXT stats reset.")
+        return
+    items = [{
+        "label": stat.path,
+        "description": describe(stat),
+        "detail": stat.command or "(no command)",
+    } for stat in mod.top(args.limit)]
+    if not items:
+        items = [{"label": "", "description": "no stats"}]
+    return result(items, filter_results=True)
+
+
+def describe(stat):
+    def ms(seconds):
+        return f"{seconds * 1000:.1f}ms"
+    return (
+        f"n={stat.count} total={ms(stat.total)} "
+        f"p50={ms(stat.percentile(50))} "
+        f"p95={ms(stat.percentile(95))} "
+        f"p99={ms(stat.percentile(99))}"
+    )
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import re
 from collections import Counter
@@ -6,15 +7,18 @@ from dataclasses import dataclass
 from os.path import isabs, join
 from pathlib import Path
 from unittest import SkipTest
+from unittest.mock import patch
 
 from testil import eq, Regex, tempdir
 
 from .. import ag as mod
+from ... import fileindex, streams
 from ...tests.util import (
     async_test,
     do_command,
     get_completions,
     FakeEditor,
+    FakeServer,
     gentest,
     yield_test,
 )
@@ -128,15 +132,27 @@ async def test_huge_results():
 
 
 @async_test
-async def test_too_many_results():
+async def test_paged_results():
     with tempdir() as tmp:
         os.mkdir(join(tmp, "dir"))
         with open(join(tmp, "dir/long_lines.txt"), "w", encoding="utf-8") as fh:
-            fh.write("file.txt\n" * (mod.MAX_RESULT_ITEMS + 1))
+            fh.write("file.txt\n" * 25)
         editor = FakeEditor(join(tmp, "dir/file"), tmp)
+        editor.search_page_size = 10
+        editor.server = server = FakeServer()
         result = await do_command("ag txt", editor)
-        items = result["items"]
-        eq(len(items), mod.MAX_RESULT_ITEMS, result)
+        eq(len(result["items"]), 10, result)
+        assert result["more"], result
+        stream = streams._streams[result["stream"]]
+        streams.load(stream.id)
+        while not server.notifications:
+            await asyncio.sleep(0.01)
+        streams.load(stream.id)
+        await stream.sender
+        eq([(len(p["items"]), p["done"], p["more"]) for m, p in server.notifications], [
+            (10, False, True),
+            (5, True, False),
+        ])
 
 
 @async_test
@@ -156,6 +172,7 @@ async def test_ag_help():
     with tempdir() as tmp:
         command = "ag x . --help"
         editor = FakeEditor(join(tmp, "file"))
+        editor.search_backend = "ag"
         result = await do_command(command, editor)
         assert len(result["items"]) > 1, result
         result.pop("items")
@@ -168,11 +185,200 @@ async def test_ag_not_installed():
         command = "ag x xxxx"
         editor = FakeEditor(join(tmp, "file"))
         editor.ag_path = ag_path = join(tmp, "ag")
+        editor.search_backend = "ag"
         result = await do_command(command, editor)
         eq(result["type"], "error")
         eq(result["message"], Regex(f"{ag_path} not found. "))
 
 
+@async_test
+async def test_ag_streams_results():
+    async def search(stream, pattern, options, cwd):
+        for relpath, num in [("a.txt", 1), ("a.txt", 2), ("b.txt", 1)]:
+            path = join(cwd, relpath)
+            stream.put(mod.create_item(path, relpath, str(num), "", ":", "x"))
+        await proceed.wait()
+        path = join(cwd, "b.txt")
+        stream.put(mod.create_item(path, "b.txt", "2", "", ":", "x"))
+
+    proceed = asyncio.Event()
+    editor = FakeEditor("/dir/file", "/dir")
+    editor.search_backend = "native"
+    editor.server = server = FakeServer()
+    with patch.object(mod, "native_search", search):
+        result = await do_command("ag x", editor, stream_delay=0)
+        stream_id = result["stream"]
+        eq(result["items"], [
+            {"label": "1: x", "filepath": "/dir/a.txt:0"},
+            {"label": "2: x", "detail": "a.txt", "filepath": "/dir/a.txt:1"},
+        ])
+        proceed.set()
+        await streams._streams[stream_id].sender
+    eq(server.notifications, [(streams.RESULTS, {
+        "id": stream_id,
+        "items": [
+            {"label": "1: x", "filepath": "/dir/b.txt:0"},
+            {"label": "2: x", "detail": "b.txt", "filepath": "/dir/b.txt:1"},
+        ],
+        "done": True,
+        "more": False,
+    })])
+
+
+@async_test
+async def test_result_cache():
+    async def fail(*args):
+        raise AssertionError("unexpected search")
+
+    with setup_files() as tmp, patch.object(mod, "result_cache", mod.ResultCache()):
+        editor = FakeEditor(join(tmp, "dir/file"), tmp)
+        editor.search_backend = "native"
+        result = await do_command("ag size ..", editor)
+        eq(len(result["items"]), 4, result)
+        with patch.object(mod, "native_search", fail):
+            eq(await do_command("ag size ..", editor), result)
+
+        fileindex.update([(join(tmp, ".git", "index.lock"), fileindex.CREATED)])
+        with patch.object(mod, "native_search", fail):
+            eq(await do_command("ag size ..", editor), result)
+
+        Path(tmp, "e.txt").write_text("size: 0")
+        fileindex.update([(join(tmp, "e.txt"), fileindex.CHANGED)])
+        items = (await do_command("ag size ..", editor))["items"]
+        eq(items[-1]["label"], "1: size: 0")
+
+
+def test_ResultCache():
+    item = {"label": "x"}
+    nbytes = mod._sizeof(item)
+    cache = mod.ResultCache(max_size=2, max_bytes=nbytes * 3)
+    cache.set("a", 0, [item])
+    cache.set("b", 0, [item])
+    eq(cache.get("a", 0), [item])
+    cache.set("c", 0, [item])
+    eq(cache.get("b", 0), None)  # least recently used
+    eq(cache.get("a", 0), [item])
+    eq(cache.get("c", 1), None)  # fingerprint changed
+    eq(cache.get("c", 0), None)
+    cache.set("d", 0, [item, item])
+    eq(list(cache._items), ["a", "d"])
+    cache.set("e", 0, [item] * 3)
+    eq(list(cache._items), ["e"])  # evicted to stay within max_bytes
+    eq(cache.nbytes, nbytes * 3)
+    cache.set("f", 0, [item] * 4)
+    eq(cache.get("f", 0), None)  # too big
+    eq(list(cache._items), ["e"])
+
+
+def test_ItemCollector():
+    item = {"label": "x"}
+    collect = mod.ItemCollector(mod._sizeof(item) * 2)
+    collect(item)
+    collect(item)
+    eq(collect.items, [item, item])
+    eq(collect.nbytes, mod._sizeof(item) * 2)
+    collect(item)
+    eq(collect.items, None)  # too big to cache
+    collect(item)
+    eq(collect.items, None)
+
+
+def test_tree_fingerprint():
+    with patch.object(fileindex, "_generations", {"/work": 3}):
+        eq(mod.tree_fingerprint("/work/dir", "/work"), 3)
+        eq(mod.tree_fingerprint("/work/dir/", "/work"), 3)
+        eq(mod.tree_fingerprint("/work", "/work"), 3)
+        eq(mod.tree_fingerprint("/work/dir", "/work", ["-i", "-w"]), 3)
+        eq(mod.tree_fingerprint("/work/dir", "/work", ["--hidden"]), None)
+        eq(mod.tree_fingerprint("/work/dir", "/work", ["-iu"]), None)
+        eq(mod.tree_fingerprint("/work/.github", "/work"), None)
+    eq(mod.tree_fingerprint("/work/dir/../..", "/work"), None)
+    eq(mod.tree_fingerprint("/other", "/work"), None)
+    eq(mod.tree_fingerprint("/work", "~"), None)
+
+
+def test_count_complete_files():
+    items = [{"detail": "a"}, {"detail": "b"}, {"detail": "b"}]
+    eq(mod.count_complete_files(items), 1)
+    eq(mod.count_complete_files(items[:1]), 0)
+    eq(mod.count_complete_files([]), 0)
+
+
+@yield_test
+def test_native_search():
+    with setup_files() as tmp:
+        Path(tmp, ".hidden.txt").write_text("name: .hidden.txt")
+        Path(tmp, "binary.txt").write_bytes(b"name: binary\0")
+        Path(tmp, ".gitignore").write_text("ignored.txt\n")
+        Path(tmp, "ignored.txt").write_text("name: ignored.txt")
+        Path(tmp, "dir", "utf8.txt").write_text("name: ünïcode\n", encoding="utf-8")
+
+        @gentest
+        @async_test
+        async def test(command, items, **editor_props):
+            editor = FakeEditor(join(tmp, "dir/file"), tmp)
+            editor.search_backend = "native"
+            editor.ag_path = join(tmp, "ag")  # not installed
+            for name, val in editor_props.items():
+                setattr(editor, name, val)
+            result = await do_command(command, editor)
+            actual_items = [
+                f"{x.get('filepath', '')[len(tmp):]:<26} "
+                f"{x.get('detail', ''):<15} {x['label']}"
+                f"{(' ' + x['description']) if 'description' in x else ''}"
+                for x in result["items"]
+            ]
+            eq(actual_items, items)
+
+        yield test("ag ([bB]|size:\\ 10)", [
+            "/dir/B file:0:10:1                         1: name: dir/B file",
+            "/dir/B file:1:0:8          dir/B file      2: size: 10",
+            "/dir/b.txt:0:10:1          dir/b.txt       1: name: dir/b.txt",
+        ])
+        yield test("ag txt", [
+            "/dir/a.txt:0:12:3          dir/a.txt       1: name: dir/a.txt",
+            "/dir/b.txt:0:12:3          dir/b.txt       1: name: dir/b.txt",
+            "/e.txt:0:8:3               e.txt           1: name: e.txt",
+        ])
+        yield test("ag txt .", [
+            "/dir/./a.txt:0:12:3        a.txt           1: name: dir/a.txt",
+            "/dir/./b.txt:0:12:3        b.txt           1: name: dir/b.txt",
+        ])
+        yield test("ag dir/b ..", [
+            "/dir/../dir/B file:0:6:5   dir/B file      1: name: dir/B file",
+            "/dir/../dir/b.txt:0:6:5    dir/b.txt       1: name: dir/b.txt",
+        ])
+        yield test("ag dir/b .. -s", [
+            "/dir/../dir/b.txt:0:6:5    dir/b.txt       1: name: dir/b.txt",
+        ])
+        yield test("ag dir/B ..", [
+            "/dir/../dir/B file:0:6:5   dir/B file      1: name: dir/B file",
+        ])
+        yield test("ag n.co", [
+            "/dir/utf8.txt:0:7:4        dir/utf8.txt    1: name: ünïcode",
+        ])
+        yield test("ag a.t .. -Q", [
+            "/dir/../dir/a.txt:0:10:3   dir/a.txt       1: name: dir/a.txt",
+        ])
+        yield test("ag size .. -w", [
+            "/dir/../dir/B file:1:0:4   dir/B file      2: size: 10",
+            "/dir/../dir/a.txt:1:0:4    dir/a.txt       2: size: 9",
+            "/dir/../dir/b.txt:1:0:4    dir/b.txt       2: size: 9",
+            "/dir/../e.txt:1:0:4        e.txt           2: size: 5",
+        ])
+        yield test("ag siz .. -w", [
+            "                                            no match",
+        ])
+        yield test("ag x . --after=1", [
+            "                                            unsupported option(s): "
+            "--after=1 (see pyxt.searchBackend setting)",
+        ])
+        yield test("ag (", [
+            "                                            invalid pattern: "
+            "missing ), unterminated subpattern at position 0",
+        ])
+
+
 @yield_test
 def test_ag_completions():
     with tempdir() as tmp:
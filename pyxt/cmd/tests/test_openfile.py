@@ -1,6 +1,8 @@
+import os
 from contextlib import contextmanager
 from os.path import exists, join
 from pathlib import Path
+from unittest.mock import patch
 
 from testil import eq, tempdir
 
@@ -38,6 +40,17 @@ def test_open_file():
         yield test, "open dir/", result([
             {"label": "file.txt", "filepath": "/dir/file.txt", "offset": 9},
         ], value="open dir/")
+        yield test, "open **/", result([
+            {"label": "dir/file.txt", "filepath": "/dir/file.txt", "offset": 8},
+            {"label": "file.txt", "filepath": "/file.txt", "offset": 8},
+        ], value="open **/")
+        yield test, "open **/dfi", result([
+            {"label": "dir/file.txt", "filepath": "/dir/file.txt", "offset": 8},
+        ], value="open **/dfi")
+        yield test, "open **/file", result([
+            {"label": "file.txt", "filepath": "/file.txt", "offset": 8},
+            {"label": "dir/file.txt", "filepath": "/dir/file.txt", "offset": 8},
+        ], value="open **/file")
 
 
 @yield_test
@@ -59,7 +72,7 @@ def test_create_new_file():
 
 @contextmanager
 def fake_editor(folders=()):
-    with tempdir() as tmp:
+    with tempdir() as tmp, patch.dict(os.environ, {"XDG_CACHE_HOME": tmp}):
         base = Path(tmp) / "base"
         base.mkdir()
         (base / "file.txt").touch()
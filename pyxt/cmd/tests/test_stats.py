@@ -0,0 +1,52 @@
+from unittest.mock import patch
+
+from testil import eq
+
+from ... import stats
+from ...tests.util import async_test, do_command
+
+
+@async_test
+async def test_stats():
+    with patch.object(stats, "_stats", {}):
+        stats.set_command("ag")
+        stats.record("editor.get_text", 0.002)
+        stats.record("vscode.window.activeTextEditor", 0.001)
+        result = await do_command("stats")
+        eq(result["items"], [
+            {
+                "label": "editor.get_text",
+                "description": "n=1 total=2.0ms p50=2.0ms p95=2.0ms p99=2.0ms",
+                "detail": "ag",
+            },
+            {
+                "label": "vscode.window.activeTextEditor",
+                "description": "n=1 total=1.0ms p50=1.0ms p95=1.0ms p99=1.0ms",
+                "detail": "ag",
+            },
+        ])
+        eq(result["filter_results"], True)
+
+        result = await do_command("stats show 1")
+        eq([x["label"] for x in result["items"]], ["editor.get_text"])
+
+
+@async_test
+async def test_stats_reset():
+    class Editor:
+        async def show_message(self, message):
+            messages.append(message)
+
+    messages = []
+    with patch.object(stats, "_stats", {}):
+        stats.record("editor.get_text", 0.002)
+        eq(await do_command("stats reset", Editor()), None)
+        eq(stats.top(), [])
+        eq(messages, ["PyXT stats reset."])
+
+
+@async_test
+async def test_no_stats():
+    with patch.object(stats, "_stats", {}):
+        result = await do_command("stats")
+        eq(result["items"], [{"label": "", "description": "no stats"}])
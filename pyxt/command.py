@@ -1,6 +1,7 @@
 from .parser import CommandParser, Options
 
 REGISTRY = {}
+parser_cache = {}
 
 
 def command(
@@ -47,8 +48,32 @@ def command(
 
 
 async def create_parser(command, fields, editor):
+    """Create command parser with editor context
+
+    Callable field defaults are evaluated once per editor state: the
+    parser is reused while the editor state snapshot (active file,
+    selections, options, configuration) is unchanged, so defaults are
+    not evaluated on every keystroke. Only the most recent parser is
+    cached for each command.
+
+    A cached parser holds the editor of the request that created it,
+    which is shared with later requests. It is not reused if that
+    editor was cancelled or failed to get a property since its
+    (cancelled or failed) property values would be reused as well.
+    """
     parser = CommandParser(command, fields)
-    return await parser.with_context(editor)
+    if not parser.has_dynamic_defaults():
+        return await parser.with_context(editor)
+    state = await editor.snapshot()
+    cached = parser_cache.get(command.name)
+    if cached is not None and cached[0] is command and cached[1] == state:
+        cached_editor = cached[3]
+        if not cached_editor.failed:
+            cached_editor.shared = True
+            return cached[2]
+    parser = await parser.with_context(editor)
+    parser_cache[command.name] = (command, state, parser, editor)
+    return parser
 
 
 def set_context(args, **context):
@@ -0,0 +1,84 @@
+from difflib import SequenceMatcher
+
+
+def diff_edits(old, new, offset=0):
+    """Compute minimal edits to transform old text into new text
+
+    The common prefix and suffix are trimmed, then the remaining text
+    is compared line by line, and each changed hunk is trimmed to the
+    characters that actually differ.
+
+    :param old: Original text.
+    :param new: Replacement text.
+    :param offset: Offset of `old` in the document; added to each
+    edit range.
+    :returns: A list of `(text, (start, end))` edits with non-
+    overlapping ranges relative to the original document, in
+    document order.
+    """
+    start, old_end, _, new_end = _trim(old, new, 0, len(old), 0, len(new))
+    if start == old_end and start == new_end:
+        return []
+    old_lines = old[start:old_end].splitlines(keepends=True)
+    new_lines = new[start:new_end].splitlines(keepends=True)
+    if len(old_lines) < 2 or len(new_lines) < 2:
+        return [(new[start:new_end], (offset + start, offset + old_end))]
+    old_offsets = _line_offsets(old_lines, start)
+    new_offsets = _line_offsets(new_lines, start)
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    edits = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        a0, a1, b0, b1 = _trim(
+            old, new,
+            old_offsets[i1], old_offsets[i2],
+            new_offsets[j1], new_offsets[j2],
+        )
+        if a0 != a1 or b0 != b1:
+            edits.append((new[b0:b1], (offset + a0, offset + a1)))
+    return edits
+
+
+def _trim(old, new, a0, a1, b0, b1):
+    """Trim common prefix and suffix from old[a0:a1] and new[b0:b1]
+
+    :returns: `(a0, a1, b0, b1)`
+    """
+    # compare chunks first to avoid a Python loop over each character
+    size = CHUNK_SIZE
+    while size:
+        while min(a1 - a0, b1 - b0) >= size \
+                and old[a0:a0 + size] == new[b0:b0 + size]:
+            a0 += size
+            b0 += size
+        size //= 8
+    size = CHUNK_SIZE
+    while size:
+        while min(a1 - a0, b1 - b0) >= size \
+                and old[a1 - size:a1] == new[b1 - size:b1]:
+            a1 -= size
+            b1 -= size
+        size //= 8
+    # do not split CRLF line endings
+    if _is_crlf(old, a0) or _is_crlf(new, b0):
+        a0 -= 1
+        b0 -= 1
+    if _is_crlf(old, a1) or _is_crlf(new, b1):
+        a1 += 1
+        b1 += 1
+    return a0, a1, b0, b1
+
+
+def _is_crlf(text, index):
+    return text[index - 1:index + 1] == "\r\n"
+
+
+CHUNK_SIZE = 8 ** 4
+
+
+def _line_offsets(lines, start):
+    offsets = [start]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    return offsets
@@ -0,0 +1,126 @@
+"""Directory listing cache
+
+Listings are read with `os.scandir`, so entry types come from the
+directory entries rather than a `stat` per entry, and are reused while
+the directory modification time is unchanged. Validating a cached
+listing costs a single `stat` of the directory.
+
+A listing read within `RACY_INTERVAL` seconds of the directory
+modification time is not reused since a later change within the same
+timestamp granularity would go unnoticed.
+
+Directories on slow (e.g., network) filesystems may be polled less
+often by setting `max_age` in a user script:
+
+    from pyxt import dircache
+    dircache.cache = dircache.DirCache(max_age=2)
+"""
+import os
+import time
+from collections import OrderedDict
+
+MAX_SIZE = 64
+RACY_INTERVAL = 2
+
+
+class Listing:
+    """Names of entries in a directory
+
+    :param names: List of entry names sorted case-insensitively. The
+    same list is returned while the directory is unchanged.
+    :param dirs: Set of names of entries that are directories (or
+    symlinks to directories).
+    """
+
+    __slots__ = ("names", "dirs", "_dir_names")
+
+    def __init__(self, names, dirs):
+        self.names = names
+        self.dirs = dirs
+        self._dir_names = None
+
+    @property
+    def dir_names(self):
+        """Sorted list of directory names"""
+        if self._dir_names is None:
+            dirs = self.dirs
+            self._dir_names = [n for n in self.names if n in dirs]
+        return self._dir_names
+
+
+class DirCache:
+    """Cache of directory listings keyed by path
+
+    :param max_size: Maximum number of cached listings. The least
+    recently used listing is discarded when the cache is full.
+    :param max_age: Seconds during which a listing is used without
+    checking the directory modification time. Zero (the default)
+    checks on every lookup.
+    """
+
+    def __init__(self, max_size=MAX_SIZE, max_age=0):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._items = OrderedDict()
+
+    def listdir(self, path):
+        """Get listing of directory at path
+
+        :raises: `OSError` if the directory cannot be listed.
+        """
+        now = time.monotonic()
+        item = self._items.get(path)
+        if item is not None:
+            listing, mtime, checked = item
+            if self.max_age and now - checked < self.max_age:
+                self._items.move_to_end(path)
+                return listing
+            if os.stat(path).st_mtime_ns == mtime:
+                self._items[path] = (listing, mtime, now)
+                self._items.move_to_end(path)
+                return listing
+        listing, mtime = _read(path)
+        if mtime is None:
+            self._items.pop(path, None)
+        else:
+            self._items[path] = (listing, mtime, now)
+            self._items.move_to_end(path)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return listing
+
+    def clear(self):
+        self._items.clear()
+
+
+def _read(path):
+    """Read directory listing
+
+    :returns: A tuple `(listing, mtime)`. `mtime` is `None` if the
+    listing should not be cached.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    names = []
+    dirs = set()
+    with os.scandir(path) as entries:
+        for entry in entries:
+            names.append(entry.name)
+            try:
+                if entry.is_dir():
+                    dirs.add(entry.name)
+            except OSError:
+                pass  # broken symlink, permission denied, etc.
+    names.sort(key=str.lower)
+    if time.time_ns() - mtime < RACY_INTERVAL * 1_000_000_000:
+        mtime = None
+    elif os.stat(path).st_mtime_ns != mtime:
+        mtime = None  # changed while reading
+    return Listing(names, dirs), mtime
+
+
+cache = DirCache()
+
+
+def listdir(path):
+    """Get listing of directory at path from the shared cache"""
+    return cache.listdir(path)
@@ -1,83 +1,390 @@
+import asyncio
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass
 from os.path import dirname, expanduser, isabs
 
-from .jsproxy import EDITOR, JSProxy, VSCODE
+from .diff import diff_edits
+from .jsproxy import compile_proxy, gather, is_proxy, JSProxy, VSCODE
 from .util import cached_property
 
 
+@dataclass(frozen=True)
+class EditorState:
+    """Immutable snapshot of commonly used editor properties
+
+    Selection ranges are PyXT ranges: `(anchor, active)` offsets.
+    """
+    file_path: str = None
+    project_path: str = None
+    dirname: str = None
+    eol: str = "\n"
+    insert_spaces: bool = True
+    tab_size: int = 4
+    ag_path: str = "ag"
+    python_path: str = "python"
+    search_backend: str = "auto"
+    search_page_size: int = 200
+    selections: tuple = ()
+    version: int = None
+    uri: str = None
+
+    @property
+    def selection(self):
+        """The primary selection or `None` if there is no active editor"""
+        return self.selections[0] if self.selections else None
+
+
+class EditorStateCache:
+    """Editor state cache shared across requests
+
+    A cached state is reused while the active document URI, its version
+    and the client-side editor generation are unchanged. The generation
+    is incremented when the client reports a change that is not visible
+    in the document version: active editor, selection, editor options,
+    configuration, or workspace folders. Nothing is cached until the
+    client has reported the active editor.
+    """
+
+    def __init__(self):
+        self.active_uri = None
+        self.versions = {}
+        self.generation = 0
+        self._entry = None
+
+    def key(self):
+        if self.active_uri is None:
+            return None
+        return self.active_uri, self.versions.get(self.active_uri), self.generation
+
+    def get(self, key):
+        """Get cached state for key or `None`"""
+        if key is not None and self._entry is not None and self._entry[0] == key:
+            return self._entry[1]
+        return None
+
+    def set(self, key, state):
+        """Cache state fetched with the given key
+
+        The state is discarded if the key changed while it was being
+        fetched or if it does not describe the active document version.
+        """
+        if key is None or key != self.key():
+            return
+        if key[:2] == (state.uri, state.version):
+            self._entry = (key, state)
+
+    def set_active(self, uri):
+        self.active_uri = uri
+        self.invalidate()
+
+    def set_version(self, uri, version):
+        self.versions[uri] = version
+
+    def discard(self, uri):
+        self.versions.pop(uri, None)
+
+    def invalidate(self):
+        self.generation += 1
+        self._entry = None
+
+
+state_cache = EditorStateCache()
+
+
 class Editor:
     def __init__(self, server):
         self.server = server
         self.vscode = JSProxy(server, root=VSCODE)
-        self.editor = JSProxy(server, root=EDITOR)
+        self.shared = False
+        self._cancelled = False
+
+    def snapshot(self):
+        """Get a snapshot of commonly used editor properties
+
+        All properties are fetched from the client in a single request
+        the first time a snapshot (or any of the properties derived from
+        it) is requested. The snapshot is fetched again after this
+        editor sends an edit to the client, but it will not reflect
+        selection changes made by other means.
+
+        The snapshot may be shared with earlier requests if the client
+        has not reported any relevant changes since it was fetched (see
+        `EditorStateCache`).
+
+        :returns: An awaitable `EditorState`.
+        """
+        return self._state
+
+    def cancel(self):
+        """Cancel pending client requests made to get editor properties
+
+        Cached properties are fetched in their own tasks, which are not
+        cancelled when the command awaiting them is cancelled. Requests
+        of an editor that is `shared` with other commands (by a cached
+        parser) are not cancelled since those commands may await them.
+        """
+        self._cancelled = True
+        if self.shared:
+            return
+        for value in vars(self).values():
+            if isinstance(value, asyncio.Future) and not value.done():
+                value.cancel()
+
+    @property
+    def failed(self):
+        """True if cancelled or getting a property failed"""
+        return self._cancelled or any(
+            value.done() and (value.cancelled() or value.exception() is not None)
+            for value in vars(self).values()
+            if isinstance(value, asyncio.Future)
+        )
+
+    @cached_property
+    async def _state(self):
+        key = state_cache.key()
+        state = state_cache.get(key)
+        if state is None:
+            state = await self._fetch_state()
+            state_cache.set(key, state)
+        return state
+
+    async def _fetch_state(self):
+        text_editor = self.vscode.window.activeTextEditor
+        file_uri = text_editor.document.uri
+        config = self.vscode.workspace.getConfiguration('pyxt')
+        values = await gather(
+            file_uri.fsPath,
+            self.vscode.workspace.getWorkspaceFolder(file_uri).uri.fsPath,
+            self.vscode.workspace.workspaceFolders[0].uri.fsPath,
+            text_editor.document.eol,
+            self.vscode.EndOfLine.CRLF,
+            text_editor.options.insertSpaces,
+            text_editor.options.tabSize,
+            config.get('agPath'),
+            config.get('pythonPath'),
+            config.get('searchBackend'),
+            config.get('searchPageSize'),
+            self.selections(),
+            text_editor.document.version,
+            file_uri.toString(),
+            return_exceptions=True,
+        )
+        (
+            file_path, folder_path, first_path, eol, CRLF, insert_spaces,
+            tab_size, ag_path, python_path, search_backend, search_page_size,
+            selections, version, uri,
+        ) = values
+        for value in values:
+            # workspace folder lookup fails if there is no active file
+            if isinstance(value, Exception) and (
+                value is not folder_path or file_path is not None
+            ):
+                raise value
+        project_path = _project_path(file_path, folder_path, first_path)
+        return EditorState(
+            file_path=file_path,
+            project_path=project_path,
+            dirname=_dirname(file_path, project_path),
+            eol="\r\n" if eol == CRLF else "\n",
+            insert_spaces=insert_spaces,
+            tab_size=tab_size,
+            ag_path=ag_path or "ag",
+            python_path=python_path or "python",
+            search_backend=search_backend or "auto",
+            search_page_size=search_page_size or 200,
+            selections=tuple(tuple(sel) for sel in selections or ()),
+            version=version,
+            uri=uri,
+        )
 
     @cached_property
     async def file_path(self):
-        return await self.vscode.window.activeTextEditor.document.uri.fsPath
+        return (await self.snapshot()).file_path
 
     @cached_property
     async def project_path(self):
-        file_uri = self.vscode.window.activeTextEditor.document.uri
-        if await file_uri.fsPath is not None:
-            folder = self.vscode.workspace.getWorkspaceFolder(file_uri)
-            path = await folder.uri.fsPath
-            if path:
-                return path
-        path = await self.vscode.workspace.workspaceFolders[0].uri.fsPath
-        return path if path else expanduser("~")
+        return (await self.snapshot()).project_path
 
     @cached_property
     async def dirname(self):
-        path = await self.file_path
-        if path:
-            current_dir = dirname(path)
-            if current_dir and isabs(current_dir):
-                return current_dir
-        return await self.project_path
+        return (await self.snapshot()).dirname
 
     @cached_property
     async def ag_path(self):
-        path = self.vscode.workspace.getConfiguration('pyxt').get('agPath')
-        return await path or "ag"
+        return (await self.snapshot()).ag_path
 
     @cached_property
     async def python_path(self):
-        path = self.vscode.workspace.getConfiguration('pyxt').get('pythonPath')
-        return await path or "python"
+        return (await self.snapshot()).python_path
+
+    @cached_property
+    async def search_backend(self):
+        return (await self.snapshot()).search_backend
+
+    @cached_property
+    async def search_page_size(self):
+        return (await self.snapshot()).search_page_size
 
     @cached_property
     async def eol(self):
-        eol = await self.vscode.window.activeTextEditor.document.eol
-        CRLF = await self.vscode.EndOfLine.CRLF
-        return "\r\n" if eol == CRLF else "\n"
+        return (await self.snapshot()).eol
 
     @cached_property
     async def insert_spaces(self):
-        return await self.vscode.window.activeTextEditor.options.insertSpaces
+        return (await self.snapshot()).insert_spaces
 
     @cached_property
     async def tab_size(self):
-        return await self.vscode.window.activeTextEditor.options.tabSize
+        return (await self.snapshot()).tab_size
 
     def selection(self, range=None):
-        return self.editor.selection(range)
+        return SELECTION(self.server, range)
 
     def selections(self, ranges=None):
-        return self.editor.selections(ranges)
+        return SELECTIONS(self.server, ranges)
 
-    def get_text(self, range=None):
-        return self.editor.get_text(range)
+    async def get_text(self, range=None):
+        if not is_proxy(range):
+            text = await self._mirror_text()
+            if text is not None:
+                return text if range is None else _slice(text, range)
+        return await GET_TEXT(self.server, range)
 
-    def get_texts(self, ranges):
-        return self.editor.get_texts(ranges)
+    async def get_texts(self, ranges):
+        if not is_proxy(ranges):
+            text = await self._mirror_text()
+            if text is not None:
+                return [_slice(text, rng) for rng in ranges]
+        return await GET_TEXTS(self.server, ranges)
+
+    async def _mirror_text(self):
+        """Get active document text from the server-side document mirror
+
+        Documents are mirrored by pygls from LSP didOpen/didChange
+        notifications. `None` is returned if the active document is
+        not mirrored, if the mirror version does not match the editor
+        state, or if its text cannot be indexed with client offsets.
+        The editor state is fetched again after each edit sent by this
+        editor, so the mirror is not used until the client has reported
+        the edit (the didChange notification may arrive after the edit
+        response).
+        """
+        state = await self.snapshot()
+        if state.uri is None:
+            return None
+        document = self.server.workspace.text_documents.get(state.uri)
+        if document is None or document.version != state.version:
+            return None
+        text = document.source
+        if not text.isascii() and ASTRAL_CHAR.search(text):
+            # client offsets count UTF-16 code units
+            return None
+        return text
 
     async def set_text(self, text, range=None, select=True):
-        await self.editor.set_text(text, range, select)
+        """Replace text in range (all text by default)
+
+        Only the changed parts of the text are sent to the client if
+        the current text is available in the document mirror.
+        """
+        old_text = None
+        if not is_proxy(range):
+            old_text = await self._mirror_text()
+        if old_text is None:
+            with self._editing():
+                await SET_TEXT(self.server, text, range, select)
+            return
+        start, end = sorted(range) if range else (0, len(old_text))
+        sel = (start, start + _utf16_len(text))
+        if range and range[0] > range[1]:
+            sel = sel[::-1]
+        if not select:
+            sel = (sel[1], sel[1])
+        texts, ranges = _edits([text], [(start, end)], old_text)
+        with self._editing():
+            await SET_TEXTS(self.server, texts, ranges, sel)
 
     async def set_texts(self, texts, ranges):
-        await self.editor.set_texts(texts, ranges)
+        """Replace text in each of the given ranges
+
+        Only the changed parts of the text are sent to the client if
+        the current text is available in the document mirror.
+        """
+        old_text = None
+        if not is_proxy(ranges):
+            old_text = await self._mirror_text()
+        if old_text is None:
+            with self._editing():
+                await SET_TEXTS(self.server, texts, ranges)
+            return
+        texts, ranges = _edits(texts, ranges, old_text)
+        if texts:
+            with self._editing():
+                await SET_TEXTS(self.server, texts, ranges)
+
+    @contextmanager
+    def _editing(self):
+        """Forget editor state when an edit is sent to the client
+
+        The snapshot (and the shared cached state) describe the document
+        before the edit. The document mirror may not be updated until
+        some time after the edit is applied, so it is used again only
+        if its version matches a snapshot fetched after the edit.
+        """
+        try:
+            yield
+        finally:
+            self.__dict__.pop("_state", None)
+            state_cache.invalidate()
 
     async def show_message(self, message):
         await self.vscode.window.showInformationMessage(message)
 
     async def rename(self, path, overwrite=False):
-        await self.editor.rename(path, overwrite)
+        await RENAME(self.server, path, overwrite)
+
+
+SELECTION = compile_proxy("editor.selection")
+SELECTIONS = compile_proxy("editor.selections")
+GET_TEXT = compile_proxy("editor.get_text")
+GET_TEXTS = compile_proxy("editor.get_texts")
+SET_TEXT = compile_proxy("editor.set_text")
+SET_TEXTS = compile_proxy("editor.set_texts")
+RENAME = compile_proxy("editor.rename")
+ASTRAL_CHAR = re.compile("[\U00010000-\U0010FFFF]")
+
+
+def _edits(texts, ranges, old_text):
+    edits = []
+    for text, rng in zip(texts, ranges):
+        if rng:
+            start, end = sorted(rng)
+            start, end = max(start, 0), max(end, 0)
+            edits.extend(diff_edits(old_text[start:end], text, start))
+    return [t for t, r in edits], [r for t, r in edits]
+
+
+def _utf16_len(text):
+    if text.isascii() or not ASTRAL_CHAR.search(text):
+        return len(text)
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _slice(text, range):
+    start, end = sorted(range)
+    return text[max(start, 0):max(end, 0)]
+
+
+def _project_path(file_path, folder_path, first_path):
+    if file_path is not None and folder_path:
+        return folder_path
+    return first_path if first_path else expanduser("~")
+
+
+def _dirname(file_path, project_path):
+    if file_path:
+        current_dir = dirname(file_path)
+        if current_dir and isabs(current_dir):
+            return current_dir
+    return project_path
@@ -0,0 +1,656 @@
+"""Workspace file index
+
+An index of all files under a workspace folder is built in a background
+thread on first use (or loaded when the folder is opened if a snapshot
+was saved by a previous session) and updated incrementally as the
+client reports file changes (`workspace/didChangeWatchedFiles`).
+Directories named in `EXCLUDES` and paths matched by `.gitignore` files
+are not indexed.
+
+Indexed paths are relative to the workspace folder and always use `/`
+as separator.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from itertools import chain
+from os.path import dirname, expanduser, isdir, isfile, join
+
+from .fuzzy import FuzzyMatcher
+
+log = logging.getLogger(__name__)
+
+EXCLUDES = frozenset([
+    ".git", ".hg", ".svn", ".tox", ".venv", ".mypy_cache", ".pytest_cache",
+    "__pycache__", "node_modules",
+])
+IGNORE_FILES = frozenset([".gitignore", ".ignore", ".agignore"])
+LIMIT = 100
+SNAPSHOT_VERSION = "pyxt-fileindex-1"
+
+# file change types (see lsprotocol.types.FileChangeType)
+CREATED = 1
+CHANGED = 2
+DELETED = 3
+
+_indexes = {}
+_generations = {}
+
+
+def get_index(root):
+    """Get the file index of root directory, creating it if necessary"""
+    index = _indexes.get(root)
+    if index is None:
+        index = _indexes[root] = FileIndex(root)
+    return index
+
+
+def preload(root):
+    """Start loading the index of root if a snapshot of it was saved
+
+    The index is then ready (and reconciled with the file system in the
+    background) before it is first used. Indexes without a snapshot are
+    built on first use.
+    """
+    if root != expanduser("~") and isfile(snapshot_path(root)):
+        get_index(root).start()
+
+
+def generation(root):
+    """Get a number that is incremented when searched files change
+
+    Only changes to files that are searched by default (see
+    `is_searched`) and changes to ignore files are counted.
+
+    :param root: Absolute path of a workspace folder.
+    """
+    return _generations.setdefault(root, 0)
+
+
+def is_searched(root, path):
+    """Check if path is searched by default when searching root
+
+    Like ag, hidden paths and paths ignored by `.gitignore` files are
+    not searched. `.gitignore` rules are known if root is indexed.
+
+    :param root: Absolute path of a workspace folder.
+    :param path: Absolute path.
+    """
+    prefix = join(root, "")
+    if not path.startswith(prefix):
+        return path == root
+    rel = path[len(prefix):].replace(os.sep, "/")
+    if any(name.startswith(".") for name in rel.split("/")):
+        return False
+    index = _indexes.get(root)
+    return index is None or not index.is_ignored(path)
+
+
+def update(changes):
+    """Update file indexes and generations
+
+    :param changes: Sequence of `(path, change_type)` pairs.
+    """
+    changes = list(changes)
+    for root in _generations:
+        if any(_is_change_under(root, path) for path, change in changes):
+            _generations[root] += 1
+    for index in _indexes.values():
+        index.update(changes)
+
+
+def _is_change_under(root, path):
+    if join(root, "").startswith(join(path, "")):
+        return True  # root or one of its parents changed
+    parent, name = os.path.split(path)
+    if name in IGNORE_FILES:
+        path = parent
+    return is_searched(root, path)
+
+
+class FileIndex:
+    """Index of file paths under root
+
+    The index is loaded from a snapshot saved by a previous session if
+    possible, and then reconciled with the file system in the
+    background. Otherwise it is built by scanning the file system.
+
+    :param root: Absolute path of indexed directory.
+    :param limit: Maximum number of results returned by `find`.
+    """
+
+    def __init__(self, root, limit=LIMIT):
+        self.root = root
+        self.matcher = FuzzyMatcher(limit)
+        self._snapshot = Snapshot()
+        self._paths = []
+        self._pending = []
+        self._build = None
+        self._rescan = None
+        self._subscan = None
+        self._sort = None
+        self._version = 0
+
+    async def find(self, query):
+        """Find paths matching query (fuzzy)
+
+        :returns: A list of paths relative to root, best matches first.
+        """
+        paths = await self.paths()
+        if not query:
+            return paths[:self.matcher.limit]
+        return [paths[i] for i in self.matcher(query, paths, [])]
+
+    async def paths(self):
+        """Get sorted list of indexed paths relative to root
+
+        The index is built if necessary. The same list is returned
+        while the index is unchanged. Sorting and preparing paths for
+        fuzzy matching is done in a background thread since it may take
+        a while for large indexes.
+        """
+        self.start()
+        if not self._build.done():
+            await asyncio.shield(self._build)
+        if self._paths is not None:
+            return self._paths
+        loop = asyncio.get_event_loop()
+        version = self._version
+        if self._sort is None or self._sort[0] != version:
+            files = list(self._snapshot.files)
+            self._sort = version, loop.run_in_executor(None, self._sorted, files)
+        paths = await asyncio.shield(self._sort[1])
+        if version == self._version:
+            self._paths = paths
+        return paths
+
+    def start(self):
+        """Start building the index in the background if necessary"""
+        if self._build is None:
+            loop = asyncio.get_event_loop()
+            self._build = loop.run_in_executor(None, self._load_or_scan)
+            self._build.add_done_callback(self._scanned)
+
+    def _sorted(self, files):
+        files.sort()
+        self.matcher.prepare(files)
+        return files
+
+    def _load_or_scan(self):
+        snapshot = load_snapshot(self.root)
+        if snapshot is not None:
+            return snapshot, True
+        return self._scan(), False
+
+    def _scan(self, previous=None):
+        snapshot = scan(self.root, previous=previous)
+        try:
+            save_snapshot(self.root, snapshot)
+        except OSError:
+            log.warning("cannot save file index of %s", self.root, exc_info=True)
+        return snapshot
+
+    def _scanned(self, future):
+        is_build = future is self._build
+        if future.cancelled() or future.exception() is not None:
+            if not future.cancelled():
+                log.error("cannot index %s", self.root, exc_info=future.exception())
+            if is_build:
+                self._build = None
+                return
+        else:
+            result = future.result()
+            snapshot, loaded = result if is_build else (result, False)
+            self._snapshot = snapshot
+            self._changed()
+            if loaded:
+                self._start_rescan()
+                return
+        self._rescan = None
+        pending, self._pending = self._pending, []
+        self.update(pending)
+
+    def _start_rescan(self):
+        """Reconcile index with the file system in the background
+
+        Directories that have not changed since the last scan are not
+        listed again.
+        """
+        loop = asyncio.get_event_loop()
+        self._rescan = loop.run_in_executor(None, self._scan, self._snapshot)
+        self._rescan.add_done_callback(self._scanned)
+
+    def update(self, changes):
+        """Update index with changed files
+
+        A change to a `.gitignore` file causes the index to be
+        reconciled with the file system. Created directories are
+        scanned in the background; changes reported meanwhile are
+        applied when the scan is done. Changes to excluded and ignored
+        paths are skipped.
+
+        :param changes: Sequence of `(path, change_type)` pairs.
+        """
+        if self._build is None:
+            return  # not indexed
+        if self._is_busy():
+            self._pending.extend(changes)
+            return
+        prefix = join(self.root, "")
+        changes = list(changes)
+        for i, (path, change) in enumerate(changes):
+            if not path.startswith(prefix):
+                continue
+            rel = path[len(prefix):].replace(os.sep, "/")
+            parent, _, name = rel.rpartition("/")
+            if parent and self._is_ignored(parent, True):
+                continue
+            if name == ".gitignore":
+                self._start_rescan()
+                return
+            if change == DELETED:
+                self._remove(rel)
+            elif change == CREATED and self._add(rel, path):
+                self._pending.extend(changes[i + 1:])
+                return
+
+    def _is_busy(self):
+        return any(
+            future is not None and not future.done()
+            for future in [self._build, self._rescan, self._subscan]
+        )
+
+    def _add(self, rel, path):
+        """Add created path to the index
+
+        :returns: True if a directory scan was started.
+        """
+        is_dir = isdir(path)
+        if self._is_ignored(rel, is_dir):
+            return False
+        if is_dir:
+            loop = asyncio.get_event_loop()
+            rule_sets = self._rule_sets(rel)
+            self._subscan = loop.run_in_executor(None, scan, path, rule_sets, rel)
+            self._subscan.add_done_callback(self._scanned_dir)
+            return True
+        files = self._snapshot.files
+        if rel not in files:
+            files.add(rel)
+            self._changed()
+        return False
+
+    def _scanned_dir(self, future):
+        if future.cancelled():
+            pass
+        elif future.exception() is not None:
+            log.error("cannot index %s", self.root, exc_info=future.exception())
+        else:
+            sub = future.result()
+            snapshot = self._snapshot
+            snapshot.files.update(sub.files)
+            snapshot.dirs.update(sub.dirs)
+            snapshot.ignores.update(sub.ignores)
+            self._changed()
+        self._subscan = None
+        pending, self._pending = self._pending, []
+        self.update(pending)
+
+    def _remove(self, rel):
+        snapshot = self._snapshot
+        files = snapshot.files
+        if rel in files:
+            files.remove(rel)
+        elif rel in snapshot.dirs:
+            prefix = rel + "/"
+            files.difference_update([f for f in files if f.startswith(prefix)])
+            for items in [snapshot.dirs, snapshot.ignores]:
+                for key in [k for k in items if k == rel or k.startswith(prefix)]:
+                    del items[key]
+        else:
+            return  # not indexed
+        self._changed()
+
+    def is_ignored(self, path):
+        """Check if path is ignored by `.gitignore` files
+
+        Unlike indexing, `EXCLUDES` are not considered.
+
+        :param path: Absolute path. Paths outside of root are not
+        ignored.
+        """
+        prefix = join(self.root, "")
+        if not path.startswith(prefix):
+            return False
+        rel = path[len(prefix):].replace(os.sep, "/")
+        return self._is_ignored(rel, isdir(path), excludes=())
+
+    def _changed(self):
+        self._paths = None
+        self._version += 1
+
+    def _rule_sets(self, rel):
+        """Get ignore rule sets applicable within directory rel"""
+        ignores = self._snapshot.ignores
+        parts = rel.split("/") if rel else []
+        bases = ["/".join(parts[:i]) for i in range(len(parts) + 1)]
+        return [(base, ignores[base]) for base in bases if base in ignores]
+
+    def _is_ignored(self, rel, is_dir, excludes=EXCLUDES):
+        parts = rel.split("/")
+        for i, name in enumerate(parts, start=1):
+            parent_is_dir = is_dir if i == len(parts) else True
+            if parent_is_dir and name in excludes:
+                return True
+            path = "/".join(parts[:i])
+            rule_sets = self._rule_sets("/".join(parts[:i - 1]))
+            if is_ignored(rule_sets, path, parent_is_dir):
+                return True
+        return False
+
+
+class Snapshot:
+    """Indexed files and directories
+
+    :param files: Set of file paths.
+    :param dirs: Dict of `(mtime, gitignore_mtime)` by directory path.
+    Modification times are in nanoseconds; `gitignore_mtime` is zero if
+    the directory has no `.gitignore` file.
+    :param ignores: Dict of `IgnoreRule` lists by directory path.
+    """
+
+    __slots__ = ("files", "dirs", "ignores")
+
+    def __init__(self, files=None, dirs=None, ignores=None):
+        self.files = set() if files is None else files
+        self.dirs = {} if dirs is None else dirs
+        self.ignores = {} if ignores is None else ignores
+
+    def children(self):
+        """Get dict of `(files, dirs)` lists by parent directory path"""
+        children = {}
+        for path in self.dirs:
+            if path:
+                parent = path.rpartition("/")[0]
+                children.setdefault(parent, ([], []))[1].append(path)
+        for path in self.files:
+            parent = path.rpartition("/")[0]
+            children.setdefault(parent, ([], []))[0].append(path)
+        return children
+
+
+def scan(root, rule_sets=(), rel="", previous=None, excludes=EXCLUDES,
+         hidden=True):
+    """Walk directory tree, skipping excluded and ignored paths
+
+    Symlinked directories are not followed.
+
+    :param root: Directory path.
+    :param rule_sets: List of inherited `(base, rules)` pairs. See
+    `is_ignored`.
+    :param rel: Path of root relative to the indexed directory.
+    :param previous: `Snapshot` of a previous scan. Directories whose
+    modification times (and those of their `.gitignore` files) are
+    unchanged are not listed again.
+    :param excludes: Names of directories to skip.
+    :param hidden: Skip hidden files and directories (names beginning
+    with a dot) if false.
+    :returns: `Snapshot` with paths relative to the indexed directory.
+    """
+    files = set()
+    dirs = {}
+    ignores = {}
+    children = previous.children() if previous is not None else {}
+    base_len = len(rel)
+    stack = [(rel, list(rule_sets), previous is not None)]
+    while stack:
+        rel, rule_sets, reuse = stack.pop()
+        path = join(root, rel[base_len:].lstrip("/"))
+        gitignore = join(path, ".gitignore")
+        try:
+            # get mtime before listing so later changes are detected
+            mtimes = os.stat(path).st_mtime_ns, _mtime(gitignore)
+            if reuse:
+                old = previous.dirs.get(rel)
+                # ignore rules changed: rescan subtree
+                reuse = old is None or old[1] == mtimes[1]
+                listed = old == mtimes
+            else:
+                listed = False
+            if not listed:
+                with os.scandir(path) as it:
+                    entries = list(it)
+        except OSError:
+            continue
+        dirs[rel] = mtimes
+        rules = read_gitignore(gitignore) if mtimes[1] else []
+        if rules:
+            ignores[rel] = rules
+            rule_sets = rule_sets + [(rel, rules)]
+        if listed:
+            sub_files, sub_dirs = children.get(rel, ((), ()))
+            files.update(sub_files)
+            stack.extend((sub, rule_sets, True) for sub in sub_dirs)
+            continue
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            sub = f"{rel}/{entry.name}" if rel else entry.name
+            if is_dir and entry.name in excludes \
+                    or not hidden and entry.name.startswith(".") \
+                    or is_ignored(rule_sets, sub, is_dir):
+                continue
+            if not is_dir:
+                files.add(sub)
+            elif not entry.is_symlink():
+                stack.append((sub, rule_sets, reuse))
+    return Snapshot(files, dirs, ignores)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def snapshot_path(root):
+    """Get path of the snapshot file of the index of root"""
+    cache = os.environ.get("XDG_CACHE_HOME") or expanduser("~/.cache")
+    key = hashlib.sha1(root.encode("utf-8", "surrogateescape")).hexdigest()
+    return join(cache, "pyxt", "fileindex", key)
+
+
+def save_snapshot(root, snapshot):
+    """Save snapshot of the index of root
+
+    The file is a header line followed by a directory table (one line
+    per directory: mtime, gitignore mtime, path) and a sorted table of
+    file paths. It is replaced atomically.
+
+    :returns: True if saved, false if the snapshot contains paths that
+    cannot be saved (file names containing newlines).
+    """
+    paths = sorted(snapshot.files)
+    dirs = snapshot.dirs
+    if any("\n" in p for p in chain(paths, dirs)):
+        return False
+    path = snapshot_path(root)
+    os.makedirs(dirname(path), exist_ok=True)
+    lines = chain(
+        [f"{SNAPSHOT_VERSION}\t{root}", f"{len(dirs)}\t{len(paths)}"],
+        (f"{m}\t{g}\t{d}" for d, (m, g) in dirs.items()),
+        paths,
+    )
+    fd, tmp = tempfile.mkstemp(dir=dirname(path), prefix=".tmp-")
+    try:
+        with open(fd, "w", encoding="utf-8", errors="surrogateescape") as fh:
+            fh.write("\n".join(lines))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return True
+
+
+def load_snapshot(root):
+    """Load snapshot of the index of root saved by `save_snapshot`
+
+    `.gitignore` rules are read from the file system.
+
+    :returns: `Snapshot` or `None` if there is no valid snapshot.
+    """
+    try:
+        with open(snapshot_path(root), encoding="utf-8",
+                  errors="surrogateescape") as fh:
+            text = fh.read()
+    except OSError:
+        return None
+    lines = text.split("\n")
+    try:
+        if lines[0] != f"{SNAPSHOT_VERSION}\t{root}":
+            return None
+        ndirs, nfiles = (int(n) for n in lines[1].split("\t"))
+        dirs = {}
+        for line in lines[2:2 + ndirs]:
+            mtime, gitignore_mtime, path = line.split("\t", 2)
+            dirs[path] = (int(mtime), int(gitignore_mtime))
+        files = set(lines[2 + ndirs:])
+    except ValueError:
+        return None
+    if len(dirs) != ndirs or len(files) != nfiles:
+        return None
+    ignores = {}
+    for path, (mtime, gitignore_mtime) in dirs.items():
+        if gitignore_mtime:
+            rules = read_gitignore(join(root, path, ".gitignore"))
+            if rules:
+                ignores[path] = rules
+    return Snapshot(files, dirs, ignores)
+
+
+def is_ignored(rule_sets, path, is_dir):
+    """Check if path is ignored
+
+    :param rule_sets: List of `(base, rules)` pairs ordered from the
+    outermost directory. `base` is the path of the directory containing
+    the `.gitignore` file from which `rules` were read. The last
+    matching rule wins.
+    :param path: Path relative to the indexed directory.
+    """
+    ignored = False
+    name = path.rpartition("/")[2]
+    for base, rules in rule_sets:
+        sub = path[len(base) + 1:] if base else path
+        for rule in rules:
+            if ignored == rule.negate and rule.match(sub, name, is_dir):
+                ignored = not rule.negate
+    return ignored
+
+
+def read_gitignore(path):
+    """Read `IgnoreRule`s from file
+
+    :returns: A list, which is empty if the file does not exist.
+    """
+    try:
+        with open(path, encoding="utf-8", errors="replace") as fh:
+            lines = fh.read().splitlines()
+    except OSError:
+        return []
+    return [rule for rule in map(IgnoreRule.parse, lines) if rule is not None]
+
+
+class IgnoreRule:
+    """A `.gitignore` pattern
+
+    :param pattern: Glob pattern without leading `!` or trailing `/`.
+    :param negate: Re-include matching paths if true.
+    :param dir_only: Match directories only if true.
+    :param anchored: Match paths relative to the `.gitignore` directory
+    if true (the pattern contains a `/`), otherwise match names at any
+    depth.
+    """
+
+    __slots__ = ("pattern", "negate", "dir_only", "anchored", "regex")
+
+    def __init__(self, pattern, negate=False, dir_only=False, anchored=False):
+        self.pattern = pattern
+        self.negate = negate
+        self.dir_only = dir_only
+        self.anchored = anchored
+        self.regex = re.compile(translate(pattern))
+
+    def __repr__(self):
+        return "IgnoreRule({!r}, negate={}, dir_only={}, anchored={})".format(
+            self.pattern, self.negate, self.dir_only, self.anchored)
+
+    @classmethod
+    def parse(cls, line):
+        """Parse a line of a `.gitignore` file
+
+        :returns: `IgnoreRule` or `None` if the line is blank or a comment.
+        """
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            return None
+        negate = line.startswith("!")
+        if negate or line.startswith("\\"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if not line:
+            return None
+        return cls(line, negate, dir_only, anchored)
+
+    def match(self, path, name, is_dir):
+        """Check if path matches this rule
+
+        :param path: Path relative to the `.gitignore` directory.
+        :param name: Last component of path.
+        """
+        if self.dir_only and not is_dir:
+            return False
+        return self.regex.fullmatch(path if self.anchored else name) is not None
+
+
+def translate(pattern):
+    """Translate a gitignore glob pattern to a regular expression"""
+    parts = []
+    i = 0
+    end = len(pattern)
+    while i < end:
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[" and pattern.find("]", i + 2) > 0:
+            stop = pattern.find("]", i + 2)
+            chars = pattern[i + 1:stop].replace("\\", "\\\\")
+            if chars.startswith("!"):
+                chars = "^" + chars[1:]
+            parts.append(f"[{chars}]")
+            i = stop
+        elif char == "\\" and i + 1 < end:
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return "".join(parts)
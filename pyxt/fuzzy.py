@@ -0,0 +1,218 @@
+"""Completion matchers
+
+A matcher selects and orders the completions of a field. It is called
+with the text being completed, the list of candidate names, and the
+positions of names that the field matched by prefix (in the order the
+field would list them). It returns a list of positions of names to be
+listed as completions.
+
+The default matcher lists prefix matches only. Fuzzy matching is not
+the default because it adds many completions for short queries (e.g.,
+"a" would also list every name containing "a") to fields whose lists
+users rely on. It may be enabled in a user script (see `pyxt.userScript`
+in README.md):
+
+    from pyxt import fuzzy
+    fuzzy.matcher = fuzzy.FuzzyMatcher(limit=50)
+"""
+import re
+from bisect import bisect_right
+from itertools import accumulate, chain
+
+LIMIT = 100
+BOUNDARIES = frozenset("_-./\\ ")
+CAMEL_CASE_RE = re.compile(r"([a-z])(?=[A-Z])")
+MARK = "\x01"  # marks word starts in prepared text
+
+# scores
+MATCH = 1
+CONSECUTIVE = 6
+WORD_START = 5
+START = 8
+GAP = -1
+MAX_GAP_PENALTY = -4
+
+
+def prefix(query, names, matches):
+    """List prefix matches only"""
+    return matches
+
+
+class FuzzyMatcher:
+    """List prefix matches followed by the best fuzzy matches
+
+    A name matches fuzzily if it contains all characters of the query
+    (ignoring case) in order. Fuzzy matches are ranked in tiers:
+
+    1. name starts with query
+    2. query found at the start of a word
+    3. query found anywhere
+    4. first character of query at the start of a word
+    5. any other match
+
+    A word starts at the start of the name, after one of `BOUNDARIES`
+    or at a camelCase transition. Each tier is found with a single
+    regular expression scan over the lowercase text of all names, in
+    which word starts are marked for tiers that need them, and scanning
+    stops when `limit` matches have been found. Matches within a tier
+    are ordered by `score`.
+
+    :param limit: Maximum number of positions returned.
+    """
+
+    def __init__(self, limit=LIMIT):
+        self.limit = limit
+        self._prepared = (None, None)
+
+    def __call__(self, query, names, matches):
+        limit = self.limit
+        if not query or len(matches) >= limit:
+            return matches[:limit]
+        texts = self.prepare(names)
+        result = list(matches)
+        seen = set(matches)
+        lower = query.lower()
+        for pattern, marked in _tiers(lower):
+            text, offsets = texts[marked]
+            tier = []
+            match = pattern.search(text)
+            while match is not None:
+                i = bisect_right(offsets, match.end() - 1) - 1
+                if i not in seen:
+                    seen.add(i)
+                    tier.append(i)
+                    if len(result) + len(tier) >= limit:
+                        break
+                if i + 1 == len(offsets):
+                    break
+                # continue at the newline before the next line, which
+                # is matched by line start patterns
+                match = pattern.search(text, offsets[i + 1] - 1)
+            tier.sort(key=lambda i: -score(lower, names[i]))
+            result.extend(tier)
+            if len(result) >= limit:
+                break
+        return result
+
+    def prepare(self, names):
+        """Get lowercase texts of names
+
+        Names are joined into a single text, one name per line. The
+        result is reused while the same list of names is matched again
+        (e.g., the names of a `Choice` field). Large lists of names may
+        be prepared in advance in a background thread.
+
+        :returns: A pair of `(text, line offsets)` tuples. The second
+        has `MARK` inserted at the start of each word.
+        """
+        prepared_names, texts = self._prepared
+        if names is not prepared_names:
+            lines = [name.replace("\n", " ") for name in names]
+            # leading newline: line start is found with a literal search
+            text = "\n" + "\n".join(lines)
+            marked = "\n" + "\n".join([
+                name if name.islower() else CAMEL_CASE_RE.sub("\\1" + MARK, name)
+                for name in lines
+            ])
+            for char in BOUNDARIES | {"\n"}:
+                marked = marked.replace(char, char + MARK)
+            # offsets of lowercase text: lowercasing may change length
+            text = text.lower()
+            marked = marked.lower()
+            texts = ((text, _line_offsets(text)), (marked, _line_offsets(marked)))
+            # single assignment: prepare may run in another thread
+            self._prepared = (names, texts)
+        return texts
+
+
+def _line_offsets(text):
+    """Get offsets of lines following the leading newline of text"""
+    lines = text.split("\n")[1:-1]
+    return list(accumulate(chain([1], (len(x) + 1 for x in lines))))
+
+
+def _tiers(query):
+    """Get a list of (pattern, marked) tiers for lowercase query"""
+    word = re.escape(query)
+    # each character is followed by anything up to the first occurrence
+    # of the next character, which matches without backtracking
+    chars = [re.escape(c) for c in query]
+    gaps = [f"[^{re.escape(c)}\\n]*" for c in query[1:]]
+    subseq = "".join(chain.from_iterable(zip(chars, gaps))) + chars[-1]
+    return [(re.compile(p), marked) for p, marked in [
+        ("\n" + word, False),
+        (MARK + word, True),
+        (word, False),
+        (MARK + subseq, True),
+        (subseq, False),
+    ]]
+
+
+def score(query, name):
+    """Score a fuzzy match of query in name
+
+    Consecutive characters and characters at the start of a word
+    score higher than characters following a gap.
+
+    :param query: Lowercase query string.
+    :param name: Candidate name.
+    :returns: Match score or `None` if query is not a subsequence
+    of name (ignoring case).
+    """
+    lower = name.lower()
+    total = 0
+    prev = -1
+    for k, char in enumerate(query):
+        pos = lower.find(char, prev + 1)
+        if pos < 0:
+            return None
+        if pos != prev + 1 and not _is_word_start(name, pos):
+            pos = _word_start(query, k, name, lower, pos)
+        total += MATCH
+        if pos == 0:
+            total += START
+        elif pos == prev + 1:
+            total += CONSECUTIVE
+        else:
+            if _is_word_start(name, pos):
+                total += WORD_START
+            total += max(GAP * (pos - prev - 1), MAX_GAP_PENALTY)
+        prev = pos
+    return total
+
+
+def _word_start(query, k, name, lower, pos):
+    """Find a later occurrence of query[k] at the start of a word
+
+    A word start is preferred over a mid-word match if the rest of
+    the query can still be matched after it.
+
+    :returns: Position of the word start match or `pos`.
+    """
+    char = query[k]
+    nxt = lower.find(char, pos + 1)
+    while nxt >= 0:
+        if _is_word_start(name, nxt):
+            if _is_subsequence(query, k + 1, lower, nxt + 1):
+                return nxt
+            break
+        nxt = lower.find(char, nxt + 1)
+    return pos
+
+
+def _is_subsequence(query, k, lower, start):
+    for char in query[k:]:
+        start = lower.find(char, start) + 1
+        if not start:
+            return False
+    return True
+
+
+def _is_word_start(name, pos):
+    if pos == 0:
+        return True
+    before = name[pos - 1]
+    return before in BOUNDARIES or (before.islower() and name[pos].isupper())
+
+
+matcher = prefix
@@ -13,12 +13,12 @@ async def get_history(server, command_name, argstr=""):
     return [cmd + x for x in items if x.startswith(argstr)]
 
 
-def update_history(server, input_value, command):
+async def update_history(server, input_value, command):
     assert input_value.startswith(command.name + " "), (command.name, input_value)
     value = input_value[len(command.name) + 1:]
     if value:
         history = JSProxy(server, root=HISTORY)
-        async_do(history.update(command.name, value))
+        await async_do(history.update(command.name, value), idempotent=True)
         update_local_cache(command.name, value)
 
 
@@ -1,7 +1,13 @@
 import asyncio
 import logging
+import uuid
+from collections import deque
 from dataclasses import dataclass
 
+from lsprotocol.types import CANCEL_REQUEST, CancelParams
+
+from . import stats
+
 log = logging.getLogger(__name__)
 
 
@@ -42,16 +48,19 @@ class JSProxy:
             rep = f"{rep}{self._args}"
         return f"{self._parent}{rep}"
 
+    def _path(self):
+        """Get proxy path without call arguments"""
+        if self._name is None:
+            return self.root or type(self).__name__
+        if isinstance(self._name, int):
+            return f"{self._parent._path()}[{self._name}]"
+        return f"{self._parent._path()}.{self._name}"
+
     def _resolve(self, next_value=None):
         if self._name is not None:
             value = {"name": self._name}
             if self._args is not None:
-                def resolve(arg):
-                    if isinstance(arg, JSProxy):
-                        server, params = arg._resolve()
-                        arg = {**params, "__resolve__": True}
-                    return arg
-                value["args"] = [resolve(a) for a in self._args]
+                value["args"] = [_resolve_arg(a) for a in self._args]
             if next_value:
                 value["next"] = next_value
             return self._parent._resolve(value)
@@ -63,19 +72,291 @@ class JSProxy:
         return _get(self).__await__()
 
 
+def compile_proxy(path):
+    """Compile a function path to a reusable request template
+
+    Usage:
+
+        GET_TEXT = compile_proxy("editor.get_text")
+        text = await GET_TEXT(server, range)
+
+    Calling the template with a server and arguments returns an
+    awaitable proxy call, which is resolved by the client like a
+    `JSProxy` call, but is cheaper to create and has a flat wire
+    format: `{"root": ..., "path": [...], "args": [...]}`.
+
+    :param path: Dotted path to a function, the first element of which
+    is the root object name (`VSCODE`, `EDITOR` or `HISTORY`).
+    """
+    root, *names = path.split(".")
+    if not names:
+        raise ValueError(f"function name expected: {path!r}")
+    return ProxyTemplate(path, root, names)
+
+
+class ProxyTemplate:
+
+    __slots__ = ("path", "root", "names")
+
+    def __init__(self, path, root, names):
+        self.path = path
+        self.root = root
+        self.names = names
+
+    def __call__(self, server, *args):
+        return ProxyCall(self, server, args)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.path}>"
+
+
+class ProxyCall:
+
+    __slots__ = ("_template", "_server", "_args")
+
+    def __init__(self, template, server, args):
+        self._template = template
+        self._server = server
+        self._args = args
+
+    def __repr__(self):
+        return f"{self._template.path}{self._args}"
+
+    def _path(self):
+        return self._template.path
+
+    def _resolve(self):
+        template = self._template
+        return self._server, {
+            "root": template.root,
+            "path": template.names,
+            "args": [_resolve_arg(a) for a in self._args],
+        }
+
+    def __await__(self):
+        return _get(self).__await__()
+
+
+def is_proxy(obj):
+    """Check if obj is a `JSProxy` or compiled proxy call"""
+    return isinstance(obj, (JSProxy, ProxyCall))
+
+
+def _resolve_arg(arg):
+    if is_proxy(arg):
+        server, params = arg._resolve()
+        arg = {**params, "__resolve__": True}
+    return arg
+
+
 async def _get(proxy):
     server, params = proxy._resolve()
-    value = await server.lsp.send_request_async("pyxt.resolve", [params])
+    value = await _request(server, params, proxy._path())
+    error = _error(value)
+    if error is not None:
+        raise error
+    return value
+
+
+async def gather(*items, return_exceptions=False):
+    """Resolve proxies and other awaitables concurrently
+
+    All proxy items (`JSProxy` and compiled proxy calls) are resolved
+    with a single `pyxt.resolve` request to the client. Other awaitables
+    (coroutines, futures) are awaited concurrently with that request.
+
+    :param *items: Proxies and/or other awaitables.
+    :param return_exceptions: Return errors in the result list rather
+    than raising the first one (see `asyncio.gather`).
+    :returns: A list of resolved values in the same order as `items`.
+    """
+    proxies = [x for x in items if is_proxy(x)]
+    others = [x for x in items if not is_proxy(x)]
+    if proxies:
+        others.insert(0, _get_many(proxies))
+    values = await asyncio.gather(*others, return_exceptions=return_exceptions)
+    proxy_values = values.pop(0) if proxies else ()
+    if isinstance(proxy_values, BaseException):
+        # the request failed: it is the error of every proxy item
+        proxy_values = [proxy_values] * len(proxies)
+    proxy_values = iter(proxy_values)
+    other_values = iter(values)
+    results = []
+    for item in items:
+        if is_proxy(item):
+            value = next(proxy_values)
+            if isinstance(value, Error) and not return_exceptions:
+                raise value
+        else:
+            value = next(other_values)
+        results.append(value)
+    return results
+
+
+async def _get_many(proxies):
+    """Resolve many proxies with a single client request
+
+    :returns: A list of values. Client errors are returned as (not
+    raised) `Error` objects.
+    """
+    server = None
+    specs = []
+    for proxy in proxies:
+        proxy_server, params = proxy._resolve()
+        assert server is None or proxy_server is server, (server, proxy_server)
+        server = proxy_server
+        specs.append(params)
+    path = "batch: " + ", ".join(proxy._path() for proxy in proxies)
+    values = await _request(server, specs, path)
+    error = _error(values)
+    if error is not None:
+        raise error
+    if not isinstance(values, list) or len(values) != len(specs):
+        raise Error(f"unexpected batch result: {values!r}")
+    return [_error(value) or value for value in values]
+
+
+async def _request(server, params, path):
+    """Send pyxt.resolve request to the client
+
+    The client request is cancelled if the awaiting task is cancelled.
+    """
+    msg_id = str(uuid.uuid4())
+    with stats.timer(path):
+        try:
+            return await server.lsp.send_request_async(
+                "pyxt.resolve", [params], msg_id=msg_id)
+        except asyncio.CancelledError:
+            _cancel_request(server.lsp, msg_id)
+            raise
+
+
+def _cancel_request(lsp, msg_id):
+    _forget_request(lsp, msg_id)
+    lsp.notify(CANCEL_REQUEST, CancelParams(id=msg_id))
+
+
+def _forget_request(lsp, msg_id):
+    """Forget a pending request so its (late) response is ignored
+
+    HACK depends on private attributes of pygls 1.3 `JsonRPCProtocol`.
+    Without its `_request_futures` entry the response is logged as a
+    response to an unknown message rather than setting the result of a
+    cancelled future, which raises InvalidStateError in the message
+    handler. `_result_types` entries are only removed when a successful
+    response is deserialized, with `_result_types.pop(msg_id)` (no
+    default), so the entry is removed here and the mapping is replaced
+    with one that tolerates missing keys. The pygls version is pinned
+    in requirements.in and test_cancel_request_with_pygls_protocol
+    fails if these attributes change.
+    """
+    lsp._request_futures.pop(msg_id, None)
+    if not isinstance(lsp._result_types, _ResultTypes):
+        lsp._result_types = _ResultTypes(lsp._result_types)
+    lsp._result_types.pop(msg_id, None)
+
+
+class _ResultTypes(dict):
+
+    def pop(self, key, default=None):
+        return super().pop(key, default)
+
+
+def _error(value):
     if isinstance(value, list) and len(value) == 3 and value[0] == "__error__":
         message = value[1] or "unknown error"
         stack = value[2] or message
         log.error("Unhandled client error: %s", stack)
-        raise Error(message)
-    return value
+        return Error(message)
+    return None
+
+
+async def async_do(proxy, idempotent=False):
+    """Resolve proxy in the background, ignoring its value
+
+    See `OutboundQueue.put`.
+    """
+    await outbound.put(proxy, idempotent)
+
+
+MAX_PENDING = 100
+
+
+class OutboundQueue:
+    """Background queue for fire-and-forget client requests
+
+    Pending requests are sent in batches (see `gather`) with at most
+    one batch in flight at a time. Requests queued while a batch is in
+    flight are sent in the next batch, so a slow client causes batches
+    to grow rather than requests to pile up as concurrent tasks. When
+    the queue is full `put` waits until the next batch is taken from
+    the queue, so a slow client slows down its producers rather than
+    losing requests. Errors are logged.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING):
+        self.max_pending = max_pending
+        self.pending = deque()
+        self._task = None
+        self._space = None
+
+    async def put(self, proxy, idempotent=False):
+        """Queue proxy to be resolved in the background
+
+        Wait for space if the queue is full.
+
+        :param idempotent: If true, the request is coalesced with the
+        most recently queued request if both have the same target and
+        arguments. Only requests for which sending twice in a row has
+        the same effect as sending once may be coalesced.
+        """
+        if idempotent and self.pending and str(self.pending[-1]) == str(proxy):
+            return
+        while len(self.pending) >= self.max_pending:
+            if self._space is None:
+                self._space = asyncio.Event()
+            await self._space.wait()
+        self.pending.append(proxy)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush())
+
+    async def join(self):
+        """Wait until all pending requests have been sent"""
+        while self._task is not None and not self._task.done():
+            await asyncio.shield(self._task)
+
+    async def _flush(self):
+        while self.pending:
+            batch = self._next_batch()
+            space, self._space = self._space, None
+            if space is not None:
+                space.set()
+            try:
+                values = await _get_many(batch)
+            except Exception:
+                log.exception("Outbound batch failed: %s", batch)
+                continue
+            for proxy, value in zip(batch, values):
+                if isinstance(value, Error):
+                    log.error("Outbound request failed: %s: %s", proxy, value)
+
+    def _next_batch(self):
+        """Get pending proxies for the next batch
+
+        A batch is sent to a single server.
+        """
+        batch = [self.pending.popleft()]
+        server = _server(batch[0])
+        while self.pending and _server(self.pending[0]) is server:
+            batch.append(self.pending.popleft())
+        return batch
+
+
+def _server(proxy):
+    return proxy._resolve()[0]
 
 
-def async_do(proxy):
-    return asyncio.create_task(_get(proxy))
+outbound = OutboundQueue()
 
 
 class Error(Exception):
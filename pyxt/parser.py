@@ -44,9 +44,14 @@ Command parser specification:
 import asyncio
 import os
 import re
+from copy import copy
+from functools import partial
 from inspect import iscoroutinefunction, signature, Parameter
 from itertools import chain
+from operator import attrgetter
 
+from . import dircache, fuzzy
+from .prefix import IndexCache, PrefixIndex
 from .util import user_path
 
 
@@ -59,18 +64,54 @@ class CommandParser:
     def __init__(self, command, argspec):
         self.command = command
         self.argspec = argspec
+        self.options_type = options_type(field.name for field in argspec)
+        self._tokens = None
         # TODO assert no duplicate arg names
 
     def default_options(self):
-        return Options(**{field.name: field.default for field in self.argspec})
+        return self.options_type(
+            **{field.name: field.default for field in self.argspec})
+
+    def has_dynamic_defaults(self):
+        """Check if `with_context` evaluates callable defaults"""
+        return any(field.has_dynamic_default() for field in self.argspec)
 
     async def with_context(self, editor):
         """Get a new command parser with the given context
 
         See ``Field.with_context`` for argument specification.
+
+        Field contexts are resolved concurrently. A callable default may
+        declare dependencies on other fields' contextual defaults with
+        ``depends_on``, in which case it is called after those defaults
+        have been resolved.
         """
-        argspec = [await arg.with_context(editor) for arg in self.argspec]
-        return CommandParser(self.command, argspec)
+        fields = {field.name: field for field in self.argspec}
+        tasks = {}
+
+        def schedule(field, dependents=()):
+            if field.name in dependents:
+                chain = " -> ".join(dependents + (field.name,))
+                raise ValueError(f"circular field dependency: {chain}")
+            if field.name not in tasks:
+                names = _dependencies(field)
+                unknown = [name for name in names if name not in fields]
+                if unknown:
+                    raise ValueError(f"{field.name} depends on unknown "
+                                     f"field(s): {', '.join(unknown)}")
+                dependents += (field.name,)
+                deps = [schedule(fields[name], dependents) for name in names]
+                tasks[field.name] = asyncio.ensure_future(
+                    _with_context(field, editor, names, deps))
+            return tasks[field.name]
+
+        try:
+            argspec = await asyncio.gather(*[schedule(f) for f in self.argspec])
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        return CommandParser(self.command, list(argspec))
 
     async def match(self, text, index=0):
         """Check if first argument can consume text at index
@@ -93,11 +134,25 @@ class CommandParser:
         :yields: A sequence of ``Arg`` objects. If there is leftover
         text after all arguments have been parsed the last generated
         arg will contain the remaining text with ``field = None``.
+
+        Args from the previous tokenization are reused (not consumed
+        again) if the text they consumed is unchanged. This makes
+        tokenizing a command string that is being typed incrementally
+        cheaper.
         """
         if args is None:
-            args = Options()
-        for field in self.argspec:
-            arg = await Arg(field, text, index, args)
+            args = self.options_type()
+        reusable = self._reusable_args(text, index)
+        tokens = []
+        self._tokens = (text, index, tokens)
+        for i, field in enumerate(self.argspec):
+            if i < len(reusable):
+                arg = copy(reusable[i])
+                arg.text = text
+                arg.args = args
+            else:
+                arg = await Arg(field, text, index, args)
+            tokens.append(arg)
             if not arg.skipped:
                 yield arg
                 if not arg.errors:
@@ -108,6 +163,38 @@ class CommandParser:
         if index < len(text):
             yield await Arg(None, text, index, args)
 
+    def _reusable_args(self, text, index):
+        """Get leading args of the previous tokenization that can be reused
+
+        An arg can be reused if it was parsed without errors and the
+        text it consumed, plus one character of lookahead, is unchanged.
+        """
+        if self._tokens is None:
+            return []
+        prev_text, prev_index, prev_args = self._tokens
+        if prev_index != index:
+            return []
+        limit = len(os.path.commonprefix([prev_text, text]))
+        reusable = []
+        for arg in prev_args:
+            if arg.errors or arg.end >= limit:
+                break
+            reusable.append(arg)
+        return reusable
+
+    async def analyze(self, text, index=0):
+        """Tokenize the given text for parsing, completions, and placeholder
+
+        :param text: Argument string.
+        :param index: Start parsing at this index in text.
+        :returns: An `Analysis` object, which can be used to parse
+        arguments and get completions and placeholder without
+        tokenizing the text again.
+        """
+        args = self.options_type()
+        tokens = [arg async for arg in self.tokenize(text, index, args)]
+        return Analysis(self, text, args, tokens)
+
     async def parse(self, text, index=0):
         """Parse arguments from the given text
 
@@ -116,23 +203,7 @@ class CommandParser:
         :raises: `ArgumentError` if the text string is invalid.
         :returns: `Options` object with argument values as attributes.
         """
-        args = Options()
-        errors = []
-        async for arg in self.tokenize(text, index, args):
-            if arg.field is None:
-                if errors:
-                    break
-                msg = 'unexpected argument(s): ' + str(arg)
-                raise ArgumentError(msg, args, [], arg.start)
-            if not arg.errors:
-                if errors:
-                    del errors[:]
-            else:
-                errors.extend(arg.errors)
-        if errors:
-            msg = 'invalid arguments: {}'.format(text)
-            raise ArgumentError(msg, args, errors)
-        return Options(**{name: arg.value for name, arg in args})
+        return await (await self.analyze(text, index)).parse()
 
     async def get_placeholder(self, text, index=0):
         """Get placeholder string to follow the given command text
@@ -143,22 +214,7 @@ class CommandParser:
         `hints` is a string of placeholder text, which can be used
         as a hint about remaining arguments to be entered.
         """
-        args = []
-        hints = []
-        async for arg in self.tokenize(text, index):
-            if arg.field is None or arg.errors:
-                break
-            value, hint = await arg.get_placeholder()
-            if value:
-                assert not hints, (text, hints, arg)
-                args.append(value)
-            if hint is None:
-                break
-            if hint:
-                hints.append(hint)
-            elif hints:
-                raise NotImplementedError
-        return " ".join(args), " ".join(hints)
+        return await (await self.analyze(text, index)).get_placeholder()
 
     async def get_completions(self, text, index=0):
         """Get completions for the given command text
@@ -167,14 +223,7 @@ class CommandParser:
         :param index: Index in ``text`` to start parsing.
         :returns: A list of possible values to complete the command.
         """
-        async for arg in self.tokenize(text, index):
-            if arg.field is None:
-                return []
-            if arg.could_consume_more:
-                is_last_arg = arg.field is self.argspec[-1]
-                # TODO what if arg has errors? is raw reliable?
-                return await arg.get_completions(is_last_arg)
-        return []
+        return await (await self.analyze(text, index)).get_completions()
 
     def get_help(self, text):
         raise NotImplementedError
@@ -198,6 +247,123 @@ class CommandParser:
         return " ".join(args).rstrip(" ") if strip else " ".join(args)
 
 
+def depends_on(*names):
+    """Declare that a callable field default depends on other fields
+
+    Usage:
+
+        @depends_on("path")
+        async def default_pattern(editor, path):
+            ...
+
+        CommandParser(command, [
+            File("path", default=default_path),
+            Regex("pattern", default=default_pattern),
+        ])
+
+    The decorated default will be called with the contextual default
+    values of the named fields as keyword arguments.
+    """
+    def decorator(func):
+        func.depends_on = names
+        return func
+    return decorator
+
+
+def _dependencies(field):
+    default = getattr(field, "kwargs", {}).get("default")
+    return getattr(default, "depends_on", ()) if callable(default) else ()
+
+
+async def _with_context(field, editor, names, deps):
+    if names:
+        values = await asyncio.gather(*deps)
+        kwargs = {name: dep.default for name, dep in zip(names, values)}
+        field = copy(field)
+        default = field.kwargs["default"]
+        field.kwargs = {**field.kwargs, "default": partial(default, **kwargs)}
+    return await field.with_context(editor)
+
+
+class Analysis:
+    """Tokenized command string
+
+    See `CommandParser.analyze`.
+
+    :param parser: The `CommandParser` that tokenized the text.
+    :param text: Argument string.
+    :param args: `Options` object with parsed `Arg`s as attributes.
+    :param tokens: List of `Arg`s generated by `CommandParser.tokenize`.
+    """
+
+    def __init__(self, parser, text, args, tokens):
+        self.parser = parser
+        self.text = text
+        self.args = args
+        self.tokens = tokens
+
+    async def parse(self):
+        """Get parsed argument values
+
+        :raises: `ArgumentError` if the text string is invalid.
+        :returns: `Options` object with argument values as attributes.
+        """
+        args = self.args
+        errors = []
+        for arg in self.tokens:
+            if arg.field is None:
+                if errors:
+                    break
+                msg = 'unexpected argument(s): ' + str(arg)
+                raise ArgumentError(msg, args, [], arg.start)
+            if not arg.errors:
+                if errors:
+                    del errors[:]
+            else:
+                errors.extend(arg.errors)
+        if errors:
+            msg = 'invalid arguments: {}'.format(self.text)
+            raise ArgumentError(msg, args, errors)
+        values = {name: arg.value for name, arg in args}
+        return self.parser.options_type(**values)
+
+    async def get_placeholder(self):
+        """Get placeholder string to follow the command text
+
+        See `CommandParser.get_placeholder`.
+        """
+        args = []
+        hints = []
+        for arg in self.tokens:
+            if arg.field is None or arg.errors:
+                break
+            value, hint = await arg.get_placeholder()
+            if value:
+                assert not hints, (self.text, hints, arg)
+                args.append(value)
+            if hint is None:
+                break
+            if hint:
+                hints.append(hint)
+            elif hints:
+                raise NotImplementedError
+        return " ".join(args), " ".join(hints)
+
+    async def get_completions(self):
+        """Get completions for the command text
+
+        See `CommandParser.get_completions`.
+        """
+        for arg in self.tokens:
+            if arg.field is None:
+                return []
+            if arg.could_consume_more:
+                is_last_arg = arg.field is self.parser.argspec[-1]
+                # TODO what if arg has errors? is raw reliable?
+                return await arg.get_completions(is_last_arg)
+        return []
+
+
 class Arg(object):
     """An argument parsed from a command string
 
@@ -218,6 +384,9 @@ class Arg(object):
     It is always safe to await a new arg, even if not strictly necessary.
     """
 
+    __slots__ = (
+        "field", "text", "start", "end", "value", "skipped", "errors", "args")
+
     def __init__(self, field, text, index, args):
         self.field = field
         self.text = text
@@ -232,29 +401,36 @@ class Arg(object):
         elif self.start > len(text):
             value = field.default
             index = start
+        elif field.is_sync:
+            try:
+                value, index = field.consume_sync(text, start)
+            except (ParseError, ArgumentError) as err:
+                value, index = self._consume_failed(field, err)
         else:
             return  # await required for full initialization
         self._end_init(field, index, value)
 
     def __await__(self):
-        return self._async_init(self.field, self.text, self.start).__await__()
-
-    async def _async_init(self, field, text, start):
         if not hasattr(self, "end"):
-            try:
-                value, index = await field.consume(text, start)
-            except ParseError as err:
-                self.errors.append(err)
-                value = field.default
-                index = err.parse_index
-            except ArgumentError as err:
-                assert err.errors, "unexpected {!r}".format(err)
-                self.errors.extend(err.errors)
-                value = field.default
-                index = err.errors[-1].parse_index
-            self._end_init(field, index, value)
+            yield from self._async_init(
+                self.field, self.text, self.start).__await__()
         return self
 
+    async def _async_init(self, field, text, start):
+        try:
+            value, index = await field.consume(text, start)
+        except (ParseError, ArgumentError) as err:
+            value, index = self._consume_failed(field, err)
+        self._end_init(field, index, value)
+
+    def _consume_failed(self, field, err):
+        if isinstance(err, ParseError):
+            self.errors.append(err)
+            return field.default, err.parse_index
+        assert err.errors, "unexpected {!r}".format(err)
+        self.errors.extend(err.errors)
+        return field.default, err.errors[-1].parse_index
+
     def _end_init(self, field, index, value):
         self.end = index
         if field is not None:
@@ -424,6 +600,10 @@ class Field(object):
         )
         return '{}({})'.format(type(self).__name__, ', '.join(args))
 
+    def has_dynamic_default(self):
+        """Check if `with_context` evaluates a callable default"""
+        return callable(self.kwargs.get("default"))
+
     async def with_context(self, editor, **kwargs):
         """Return a Field instance with editor context
 
@@ -455,8 +635,26 @@ class Field(object):
             but the presence of any other character would extend the
             consumed token.
         """
+        return self.consume_sync(text, index)
+
+    def consume_sync(self, text, index):
+        """Consume argument value from text without awaiting
+
+        Fields whose parsing is pure computation (no I/O) should
+        implement this rather than overriding `consume`. It is used by
+        `Arg` to avoid coroutine overhead while tokenizing. See
+        `consume` for parameters and return value.
+        """
         raise NotImplementedError("abstract method")
 
+    @property
+    def is_sync(self):
+        """True if this field can be consumed with `consume_sync`"""
+        cls = type(self)
+        if cls.consume is not Field.consume:
+            return False  # async consume override
+        return cls.consume_sync is not Field.consume_sync
+
     def value_of(self, consumed, arg):
         """Convert consumed result to argument value
 
@@ -548,14 +746,10 @@ class Choice(Field):
                 if name in map:
                     raise ValueError("ambiguous name: %r" % (name,))
                 map[name] = value
-                for i in range(1, len(name)):
-                    key = name[:i]
-                    if key in names or key in alts:
-                        raise ValueError("ambiguous name: %r" % (key,))
-                    if key in map:
-                        map.pop(key)
-                    else:
-                        map[key] = value
+        self.index = PrefixIndex(names + alts)
+        for name in self.index.names:
+            if len(self.index.find(name)) > 1:
+                raise ValueError("ambiguous name: %r" % (name,))
         if "default" in kw:
             default = kw.pop("default")
             if iscoroutinefunction(default):
@@ -581,7 +775,7 @@ class Choice(Field):
                     for name, value in sorted(self.kwargs.items()))
         return '{}({})'.format(type(self).__name__, ', '.join(args))
 
-    async def consume(self, text, index):
+    def consume_sync(self, text, index):
         """Consume a single choice name starting at index
 
         The token at index may be a complete choice name or a prefix
@@ -595,12 +789,11 @@ class Choice(Field):
             return self.default, end
         if token in self.mapping:
             return self.mapping[token], end
-        names = ', '.join(
-            n for n in chain(self.names, self.alternates)
-            if n.startswith(token)
-        )
-        if names:
-            msg = '{!r} is ambiguous: {}'.format(token, names)
+        found = [self.index.names[i] for i in self.index.find(token)]
+        if len(found) == 1:
+            return self.mapping[found[0]], end
+        if found:
+            msg = '{!r} is ambiguous: {}'.format(token, ', '.join(found))
         else:
             end = index + len(token)
             names = ', '.join(self.names)
@@ -612,16 +805,27 @@ class Choice(Field):
             if arg.defaulted:
                 return str(self), ""
             return "", str(self)
-        names = await arg.get_completions()
-        if len(names) == 1:
-            return names[0], ""
+        names = self.index.names
+        found = self._prefix_matches(str(arg))
+        if len(found) == 1:
+            return names[found[0]], ""
         return "", None
 
     async def get_completions(self, arg):
-        """List choice names that complete token"""
+        """List choice names that complete token
+
+        See `pyxt.fuzzy` for how completions are matched.
+        """
         token = str(arg)
-        names = [n for n in self.names if n.startswith(token)]
-        return names or [n for n in self.alternates if n.startswith(token)]
+        names = self.index.names
+        found = fuzzy.matcher(token, names, self._prefix_matches(token))
+        return [names[i] for i in found]
+
+    def _prefix_matches(self, token):
+        """Get index positions of names, or else alternates, matching token"""
+        found = self.index.find(token)
+        count = len(self.names)
+        return [i for i in found if i < count] or found
 
     async def arg_string(self, value):
         if value == self.default:
@@ -634,7 +838,7 @@ class Choice(Field):
 
 class Int(Field):
 
-    async def consume(self, text, index):
+    def consume_sync(self, text, index):
         """Consume an integer value
 
         :returns: (<int or default value>, <index>)
@@ -668,7 +872,7 @@ class Float(Int):
     """A float argument
     """
 
-    async def consume(self, text, index):
+    def consume_sync(self, text, index):
         """Consume a float value
 
         :returns: (<float or default value>, <index>)
@@ -714,7 +918,7 @@ class String(Field):
     }
     DELIMITERS = '"\''
 
-    async def consume(self, text, index):
+    def consume_sync(self, text, index):
         """Consume a string value
 
         :returns: (<string or default value>, <index>)
@@ -786,7 +990,7 @@ class String(Field):
 
 class UnlimitedString(String):
 
-    async def consume(self, text, index):
+    def consume_sync(self, text, index):
         """Consume string value to the end of text
 
         :returns: (<string or default value>, <index>)
@@ -879,15 +1083,15 @@ class File(String):
         return os.path.join(basepath, path), stop
 
     async def get_completions(self, arg):
-        from os.path import exists, expanduser, isabs, isdir, join, realpath, sep, split
+        from os.path import expanduser, isabs, isdir, join, realpath, sep, split
         if arg.start >= len(arg.text):
             token = ""
         else:
             token = (await super().consume(arg.text, arg.start))[0] or ""
         if token == '~':
-            return [CompleteWord('~/', (lambda:''))]
+            return [CompleteWord('~/', _no_delimiter)]
         if token == '...' and await self.project_path:
-            return [CompleteWord('.../', (lambda:''))]
+            return [CompleteWord('.../', _no_delimiter)]
         if token.startswith('~'):
             path = expanduser(token)
         elif token.startswith('.../'):
@@ -904,7 +1108,9 @@ class File(String):
             else:
                 path = join(realpath(await self.path), path)
         root, name = split(path)
-        if not exists(root):
+        try:
+            listing = dircache.listdir(root)
+        except OSError:
             return []
         if name == token:
             start = 0
@@ -916,15 +1122,10 @@ class File(String):
                 token_dir = token
             start = sum(2 if c == ' ' else 1 for c in token_dir)
 
-        def delim(word):
-            def escape(word):
-                return word.replace(' ', '\\ ')
-
-            def get_delimiter():
-                return "" if dirsep else " "
-
-            dirsep = sep if self.directory or isdir(join(root, word)) else ""
-            return CompleteWord(word + dirsep, get_delimiter, start, escape)
+        def delim(word, is_dir=False):
+            if is_dir or self.directory or word in listing.dirs:
+                return CompleteWord(word + sep, _no_delimiter, start, _escape)
+            return CompleteWord(word, None, start, _escape)
 
         if not name:
             def match(n):
@@ -939,15 +1140,14 @@ class File(String):
             def match(n):
                 return n.startswith(name)
 
-        if self.directory:
-            names = next(os.walk(root))[1]
-        else:
-            names = os.listdir(root)
-        names = [delim(n) for n in sorted(names, key=str.lower) if match(n)]
-        if isdir(path) and (name == ".." or name in names):
+        names = listing.dir_names if self.directory else listing.names
+        found = fuzzy.matcher(
+            name, names, [i for i, n in enumerate(names) if match(n)])
+        names = [delim(names[i]) for i in found]
+        if (name == ".." or name in names) and isdir(path):
             if name in names:
                 names.remove(name)
-            names.append(delim(name))
+            names.append(delim(name, True))
         return CompletionsList(names, title=user_path(root))
 
     async def get_placeholder(self, arg):
@@ -976,7 +1176,8 @@ class File(String):
 
 class DynamicList(String):
 
-    def __init__(self, name, get_items, name_attribute, default=None, _editor=None):
+    def __init__(self, name, get_items, name_attribute, default=None,
+                 _editor=None, _index_cache=None):
         self.args = [name]
         self.kwargs = {
             "get_items": get_items,
@@ -986,13 +1187,18 @@ class DynamicList(String):
         self.get_items = get_items
         self.name_attribute = name_attribute
         self.editor = _editor
+        # shared by contextual copies of this field
+        self.index_cache = (
+            IndexCache(fold=True) if _index_cache is None else _index_cache)
         super().__init__(name, default=default)
 
     async def with_context(self, editor):
-        field = await super().with_context(editor, _editor=editor)
+        field = await super().with_context(
+            editor, _editor=editor, _index_cache=self.index_cache)
         if not hasattr(self, "editor") or field.editor is not None:
             return field
-        return type(self)(*self.args, _editor=editor, **self.kwargs)
+        return type(self)(
+            *self.args, _editor=editor, _index_cache=self.index_cache, **self.kwargs)
 
     def iteritems(self):
         if isinstance(self.name_attribute, str):
@@ -1002,27 +1208,38 @@ class DynamicList(String):
             nameof = self.name_attribute
         return ((nameof(item), item) for item in self.get_items(self.editor))
 
+    def _index_items(self):
+        """Get (prefix index, items) for the current list of items
+
+        The index is rebuilt only when item names change.
+        """
+        if isinstance(self.name_attribute, str):
+            nameof = attrgetter(self.name_attribute)
+        else:
+            nameof = self.name_attribute
+        items = list(self.get_items(self.editor))
+        return self.index_cache.get(list(map(nameof, items))), items
+
     async def consume(self, text, index):
         token, end = await super().consume(text, index)
         if token is self.default:
             return token, end
-        items = list(self.iteritems())
+        prefixes, items = self._index_items()
         if isinstance(token, str):
-            ltok = str(token).lower()
-            comps = [(name, item)
-                     for name, item in items
-                     if name.lower().startswith(ltok)]
-            if comps:
-                return comps[0][1], end
+            found = prefixes.first(token)
+            if found is not None:
+                return items[found], end
         end = index + len(token)
-        names = ', '.join(name for name, item in items)
+        names = ', '.join(prefixes.names)
         msg = '{!r} does not match any of: {}'.format(token, names)
         raise ParseError(msg, self, index, end)
 
     async def get_completions(self, arg, escape=lambda n: n.replace(" ", "\\ ")):
-        token = str(arg).lower()
-        names = (name for name, item in self.iteritems())
-        return [escape(n) for n in names if n.lower().startswith(token)]
+        token = str(arg)
+        prefixes, items = self._index_items()
+        names = prefixes.names
+        found = fuzzy.matcher(token, names, prefixes.find(token))
+        return [escape(names[i]) for i in found]
 
     async def get_placeholder(self, arg):
         if not arg:
@@ -1033,10 +1250,10 @@ class DynamicList(String):
             default = str(self.default) if self.default is not None else ""
             hint = default if default else str(self)
             return "", hint
-        token = str(arg)
-        comps = await self.get_completions(token, lambda n: n)
-        if comps:
-            return comps[0], ""
+        prefixes, items = self._index_items()
+        found = prefixes.first(str(arg))
+        if found is not None:
+            return prefixes.names[found], ""
         return "", None
 
 
@@ -1109,7 +1326,7 @@ class Regex(Field):
             default = RegexPattern(default, flags)
         super(Regex, self).__init__(name, default)
 
-    async def consume(self, text, index, _default=None):
+    def consume_sync(self, text, index, _default=None):
         """Consume regular expression and optional replacement string and flags
 
         :returns: (<value>, <index>) where value is one of the following:
@@ -1335,11 +1552,20 @@ class VarArgs(Field):
             return "{} ...".format(self.field.name)
         return self.placeholder
 
+    def has_dynamic_default(self):
+        return self.field.has_dynamic_default()
+
     async def with_context(self, *args, **kw):
         field = await self.field.with_context(*args, **kw)
         return VarArgs(self.name, field, **self.kwargs)
 
+    @property
+    def is_sync(self):
+        return self.field.is_sync
+
     async def consume(self, text, index):
+        if self.field.is_sync:
+            return self.consume_sync(text, index)
         values = []
         if index >= len(text):
             value, index = await self.field.consume(text, index)
@@ -1348,10 +1574,25 @@ class VarArgs(Field):
             while index < len(text):
                 value, index = await self.field.consume(text, index)
                 values.append(value)
+        return self._check_count(values), index
+
+    def consume_sync(self, text, index):
+        consume = self.field.consume_sync
+        values = []
+        if index >= len(text):
+            value, index = consume(text, index)
+            values.append(value)
+        else:
+            while index < len(text):
+                value, index = consume(text, index)
+                values.append(value)
+        return self._check_count(values), index
+
+    def _check_count(self, values):
         if len(values) < self.min:
             raise Error("not enough arguments (found {}, expected {})".format(
                         len(values), self.min))
-        return values, index
+        return values
 
     async def get_placeholder(self, arg):
         text = arg.text
@@ -1417,10 +1658,17 @@ class SubParser(Field):
         super(SubParser, self).__init__(name)
         self.subargs = {p.name: p for p in subargs}
 
+    def has_dynamic_default(self):
+        return any(
+            sub.parser.has_dynamic_defaults() for sub in self.subargs.values()
+        )
+
     async def with_context(self, editor):
-        subs = [await a.with_context(editor)
-                for a in self.args[1:]
-                if a.is_enabled(editor)]
+        subs = await asyncio.gather(*[
+            a.with_context(editor)
+            for a in self.args[1:]
+            if a.is_enabled(editor)
+        ])
         return SubParser(self.name, *subs)
 
     async def consume(self, text, index):
@@ -1537,7 +1785,7 @@ class SubArgs(object):
         return sub
 
     async def parse(self, text, index):
-        args = Options()
+        args = self.parser.options_type()
         errors = []
         async for arg in self.parser.tokenize(text, index, args):
             if arg.field is None:
@@ -1552,7 +1800,8 @@ class SubArgs(object):
         if errors:
             msg = 'invalid arguments: {}'.format(text)
             raise ArgumentError(msg, args, errors, index)
-        return Options(**{name: arg.value for name, arg in args}), index
+        values = {name: arg.value for name, arg in args}
+        return self.parser.options_type(**values), index
 
     async def get_placeholder(self, arg):
         if arg.defaulted:
@@ -1586,13 +1835,23 @@ class Conditional(Field):
         self.field = field
         self.editor = editor
 
+    def has_dynamic_default(self):
+        return self.field.has_dynamic_default()
+
     async def with_context(self, editor):
         field = await self.field.with_context(editor)
         return type(self)(self.is_enabled, field, editor, default=self.default)
 
+    @property
+    def is_sync(self):
+        return self.field.is_sync
+
     async def consume(self, text, index):
         return await self.field.consume(text, index)
 
+    def consume_sync(self, text, index):
+        return self.field.consume_sync(text, index)
+
     def value_of(self, consumed, arg):
         if not self.is_enabled(arg):
             raise SkipField(self.default)
@@ -1617,6 +1876,7 @@ class Options(object):
     """
 
     # DEFAULTS = <dict of defaults> # optional attribute for subclasses
+    _slots = ()
 
     def __init__(self, **opts):
         if hasattr(self, "DEFAULTS"):
@@ -1633,10 +1893,13 @@ class Options(object):
         return not self.__eq__(other)
 
     def __iter__(self):
-        obj = Options().__dict__
-        return ((k, v)
-            for k, v in self.__dict__.items()
-            if k not in obj and "__" not in k)
+        items = self.__dict__.items()
+        if self._slots:
+            items = chain(self._slot_items(), items)
+        return ((k, v) for k, v in items if "__" not in k)
+
+    def _slot_items(self):
+        return [(k, getattr(self, k)) for k in self._slots if hasattr(self, k)]
 
     def __len__(self):
         return len(list(self.__iter__()))
@@ -1651,24 +1914,65 @@ class Options(object):
         return '{}({})'.format(type(self).__name__, ', '.join(vars))
 
 
+_option_types = {}
+
+
+def options_type(names):
+    """Get an `Options` type with a fixed layout for the given names
+
+    Named option values are stored in slots rather than the instance
+    `__dict__`, which is only created if other attributes are set.
+    Types are cached by names, so all parsers with the same argument
+    names share a type.
+    """
+    names = tuple(names)
+    try:
+        return _option_types[names]
+    except KeyError:
+        pass
+    slots = tuple(dict.fromkeys(n for n in names if "__" not in n))
+    attrs = {"__slots__": slots, "_slots": slots}
+    cls = _option_types[names] = type(Options.__name__, (Options,), attrs)
+    return cls
+
+
+def _space():
+    return " "
+
+
+def _no_delimiter():
+    return ""
+
+
+def _no_escape(value):
+    return value
+
+
+def _escape(word):
+    return word.replace(' ', '\\ ')
+
+
 class CompleteWord(str):
 
+    # defaults are class attributes so they do not occupy instance __dict__
+    get_delimiter = staticmethod(_space)
+    escape = staticmethod(_no_escape)
+    start = None
+
     def __new__(cls, _value="", get_delimiter=None, start=None, escape=None, **kw):
         obj = super(CompleteWord, cls).__new__(cls, _value)
         if isinstance(_value, CompleteWord):
-            if get_delimiter is None:
-                get_delimiter = _value.get_delimiter
-            if start is None:
-                start = _value.start
-            if escape is None:
-                escape = _value.escape
             for key, value in _value.__dict__.items():
                 if not key.startswith("_") and key not in kw:
                     setattr(obj, key, value)
-        obj.get_delimiter = get_delimiter or (lambda: " ")
-        obj.start = start
-        obj.escape = escape or (lambda v: v)
-        obj.__dict__.update(kw)
+        if get_delimiter is not None:
+            obj.get_delimiter = get_delimiter
+        if start is not None:
+            obj.start = start
+        if escape is not None:
+            obj.escape = escape
+        if kw:
+            obj.__dict__.update(kw)
         return obj
 
     def complete(self):
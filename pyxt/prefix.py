@@ -0,0 +1,75 @@
+from bisect import bisect_left
+
+
+class PrefixIndex:
+    """Index of names for prefix lookup
+
+    Names are kept in sorted order so all names beginning with a
+    given prefix form a contiguous run, which is located by binary
+    search. A lookup costs O(log n) plus the number of matches rather
+    than a scan of all names.
+
+    :param names: Sequence of names.
+    :param fold: Match prefixes case-insensitively if true.
+    """
+
+    __slots__ = ("names", "fold", "_keys", "_order")
+
+    def __init__(self, names, fold=False):
+        self.names = names = list(names)
+        self.fold = fold
+        keys = [n.lower() for n in names] if fold else names
+        self._order = sorted(range(len(names)), key=keys.__getitem__)
+        self._keys = [keys[i] for i in self._order]
+
+    def __len__(self):
+        return len(self.names)
+
+    def find(self, prefix):
+        """Get positions of names beginning with prefix
+
+        :returns: A list of indices into `names` in ascending order.
+        """
+        return sorted(self._matches(prefix))
+
+    def first(self, prefix):
+        """Get position of the first name beginning with prefix
+
+        :returns: Index into `names` or `None` if there is no match.
+        """
+        return min(self._matches(prefix), default=None)
+
+    def _matches(self, prefix):
+        if self.fold:
+            prefix = prefix.lower()
+        keys = self._keys
+        if not prefix:
+            return self._order
+        lo = hi = bisect_left(keys, prefix)
+        end = len(keys)
+        while hi < end and keys[hi].startswith(prefix):
+            hi += 1
+        return self._order[lo:hi]
+
+
+class IndexCache:
+    """Reuse a prefix index while the indexed names are unchanged
+
+    :param fold: See `PrefixIndex`.
+    """
+
+    __slots__ = ("fold", "_index")
+
+    def __init__(self, fold=False):
+        self.fold = fold
+        self._index = None
+
+    def get(self, names):
+        """Get prefix index for names
+
+        :param names: List of names.
+        """
+        index = self._index
+        if index is None or index.names != names:
+            index = self._index = PrefixIndex(names, self.fold)
+        return index
@@ -0,0 +1,176 @@
+"""Native file search
+
+Search files under a directory for lines matching a regular expression
+without an external program. Files are listed with `fileindex.scan`
+(selecting files like ag; see `search`), memory-mapped, and skipped
+without running the regular expression if they do not contain a literal
+string required by every match. Large searches are distributed across a
+process pool.
+"""
+import asyncio
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from .fileindex import scan
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+BINARY_CHECK_SIZE = 8192
+MIN_POOL_FILES = 500  # search fewer files in a thread
+MAX_FILE_SIZE = 100 * 1024 * 1024
+
+_pool = None
+
+
+async def search(root, pattern, flags=0, pool=None):
+    """Search files under root for lines matching pattern
+
+    Like ag, hidden files and directories (names beginning with a dot),
+    paths ignored by `.gitignore` files and binary files are skipped.
+    Unlike ag, `.ignore` files, `.hgignore` files and global git
+    excludes are not read. Files are searched in sorted order.
+
+    :param root: Directory path.
+    :param pattern: Regular expression string.
+    :param flags: Regular expression flags (`re.IGNORECASE`, etc.).
+    :param pool: Use a process pool if true, a thread if false, or
+    decide based on the number of files if `None` (the default).
+    :yields: Tuples `(relpath, line_number, start, length, text)` with
+    the first match on each matching line. `line_number` is 1-based;
+    `start` and `length` are the character offset and length of the
+    match within `text`, the line without its line terminator.
+    """
+    re.compile(pattern, flags)  # raise re.error for invalid pattern
+    loop = asyncio.get_event_loop()
+    files = await loop.run_in_executor(None, _list_files, root)
+    if pool is None:
+        pool = len(files) >= MIN_POOL_FILES
+    if pool:
+        executor = _get_pool()
+        size = max(len(files) // ((os.cpu_count() or 1) * 8), 1)
+    else:
+        executor = None
+        size = max(len(files), 1)
+    futures = [
+        loop.run_in_executor(
+            executor, search_files, root, files[i:i + size], pattern, flags)
+        for i in range(0, len(files), size)
+    ]
+    try:
+        for future in futures:
+            for match in await future:
+                yield match
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _list_files(root):
+    return sorted(scan(root, excludes=(), hidden=False).files)
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn: forking a process with running threads is unsafe
+        _pool = ProcessPoolExecutor(mp_context=get_context("spawn"))
+    return _pool
+
+
+def search_files(root, paths, pattern, flags=0):
+    """Search files for lines matching pattern
+
+    This function is executed in a worker process or thread.
+
+    :param paths: List of file paths relative to root.
+    :returns: A list of tuples. See `search`.
+    """
+    regex = re.compile(pattern, flags | re.MULTILINE)
+    literal = required_literal(pattern, flags)
+    if literal is not None:
+        literal = literal.encode("utf-8")
+    results = []
+    for path in paths:
+        try:
+            text = _read(os.path.join(root, path), literal)
+        except (OSError, ValueError):
+            continue  # unreadable, empty or vanished file
+        if text is not None:
+            results.extend(_search_text(path, text, regex))
+    return results
+
+
+def _read(path, literal):
+    """Read text file if it contains literal
+
+    The file is memory-mapped so files that do not contain the literal
+    are checked without copying their content.
+
+    :returns: File content or `None` if the file is binary, too large
+    or does not contain literal.
+    """
+    with open(path, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size > MAX_FILE_SIZE:
+            return None
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data.find(b"\0", 0, BINARY_CHECK_SIZE) >= 0:
+                return None
+            if literal is not None and data.find(literal) < 0:
+                return None
+            return str(data, "utf-8", "replace")
+
+
+def _search_text(path, text, regex):
+    line_number = 1
+    counted = 0
+    match = regex.search(text)
+    while match is not None:
+        start = text.rfind("\n", 0, match.start()) + 1
+        end = text.find("\n", match.start())
+        if end < 0:
+            end = len(text)
+        line_number += text.count("\n", counted, start)
+        counted = start
+        line = text[start:end]
+        length = min(match.end(), end) - match.start()
+        yield path, line_number, match.start() - start, length, line.rstrip("\r")
+        if end >= len(text):
+            break
+        match = regex.search(text, end + 1)
+
+
+def required_literal(pattern, flags=0):
+    """Get a literal string contained in every match of pattern
+
+    :returns: The longest literal found in the top-level sequence of
+    the pattern or `None` if there is no such literal or the pattern is
+    case-insensitive.
+    """
+    if flags & re.IGNORECASE:
+        return None
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return None
+    state = getattr(parsed, "state", None) or parsed.pattern  # Python < 3.11
+    if state.flags & re.IGNORECASE:
+        return None  # inline (?i) flag
+    best = ""
+    run = []
+    for op, value in list(parsed) + [(None, None)]:
+        if op is sre_constants.LITERAL:
+            run.append(chr(value))
+            continue
+        literal = "".join(run)
+        if len(literal) > len(best):
+            best = literal
+        run = []
+    return best or None
@@ -1,7 +1,20 @@
 import logging
+from asyncio import CancelledError
+from contextlib import contextmanager
+
+from lsprotocol.types import (
+    INITIALIZED,
+    TEXT_DOCUMENT_DID_CHANGE,
+    TEXT_DOCUMENT_DID_CLOSE,
+    TEXT_DOCUMENT_DID_OPEN,
+    WORKSPACE_DID_CHANGE_CONFIGURATION,
+    WORKSPACE_DID_CHANGE_WATCHED_FILES,
+    WORKSPACE_DID_CHANGE_WORKSPACE_FOLDERS,
+)
+from pygls.uris import to_fs_path
 
-from . import __version__, command as cmd
-from .editor import Editor
+from . import __version__, command as cmd, fileindex, stats, streams
+from .editor import Editor, state_cache
 from .history import get_history, should_update_history, update_history
 from .results import error, handle_cancel, result
 from .types import PyXTServer
@@ -16,6 +29,7 @@ from .cmd import (  # noqa: F401
     python,
     rename,
     replace,
+    stats as stats_command,
 )
 from . import custom
 
@@ -39,22 +53,28 @@ async def do_command(server: PyXTServer, params):
     command, argstr = parse_command(input_value)
     if not command:
         return error(f"Unknown command: {argstr!r}")
+    stats.set_command(command.name)
     editor = Editor(server)
-    parser = await command.create_parser(editor)
-    try:
-        args = await parser.parse(argstr)
-        cmd.set_context(args, input_value=input_value, parser=parser)
-        result = await command(editor, args)
-        if should_update_history(input_value, command, result):
-            update_history(server, input_value, command)
-        return result
-    except cmd.Incomplete as err:
-        value += err.addchars
-        argstr += err.addchars
-    except Exception as err:
-        log.exception("command error")
-        return error(str(err))
-    return await _get_completions(server, command, parser, value, argstr)
+    with cancel_editor_requests(editor):
+        parser = await command.create_parser(editor)
+        try:
+            analysis = await parser.analyze(argstr)
+            args = await analysis.parse()
+            cmd.set_context(args, input_value=input_value, parser=parser)
+            result = await command(editor, args)
+            if should_update_history(input_value, command, result):
+                await update_history(server, input_value, command)
+            return result
+        except cmd.Incomplete as err:
+            if err.addchars:
+                value += err.addchars
+                argstr += err.addchars
+                analysis = None
+        except Exception as err:
+            log.exception("command error")
+            return error(str(err))
+        return await _get_completions(
+            server, command, parser, value, argstr, analysis)
 
 
 @pyxt_command
@@ -68,9 +88,83 @@ async def get_completions(server: PyXTServer, params):
         command = None
     if not command:
         return command_completions(argstr)
+    stats.set_command(f"{command.name} (completions)")
     editor = Editor(server)
-    parser = await command.create_parser(editor)
-    return await _get_completions(server, command, parser, input_value, argstr)
+    with cancel_editor_requests(editor):
+        parser = await command.create_parser(editor)
+        return await _get_completions(server, command, parser, input_value, argstr)
+
+
+@contextmanager
+def cancel_editor_requests(editor):
+    """Cancel editor requests if the command is cancelled"""
+    try:
+        yield
+    except CancelledError:
+        editor.cancel()
+        raise
+
+
+@pyxt_server.feature(INITIALIZED)
+def initialized(server: PyXTServer, params):
+    preload_file_indexes(server.workspace.folders.values())
+
+
+def preload_file_indexes(folders):
+    """Load saved file indexes of workspace folders in the background"""
+    for folder in folders:
+        fileindex.preload(to_fs_path(folder.uri))
+
+
+@pyxt_server.feature(TEXT_DOCUMENT_DID_OPEN)
+def did_open(server: PyXTServer, params):
+    doc = params.text_document
+    state_cache.set_version(doc.uri, doc.version)
+
+
+@pyxt_server.feature(TEXT_DOCUMENT_DID_CHANGE)
+def did_change(server: PyXTServer, params):
+    doc = params.text_document
+    state_cache.set_version(doc.uri, doc.version)
+
+
+@pyxt_server.feature(TEXT_DOCUMENT_DID_CLOSE)
+def did_close(server: PyXTServer, params):
+    state_cache.discard(params.text_document.uri)
+
+
+@pyxt_server.feature(WORKSPACE_DID_CHANGE_CONFIGURATION)
+def did_change_configuration(server: PyXTServer, params):
+    state_cache.invalidate()
+
+
+@pyxt_server.feature(WORKSPACE_DID_CHANGE_WORKSPACE_FOLDERS)
+def did_change_workspace_folders(server: PyXTServer, params):
+    state_cache.invalidate()
+    preload_file_indexes(params.event.added)
+
+
+@pyxt_server.feature(WORKSPACE_DID_CHANGE_WATCHED_FILES)
+def did_change_watched_files(server: PyXTServer, params):
+    fileindex.update([(to_fs_path(c.uri), c.type) for c in params.changes])
+
+
+@pyxt_server.feature("pyxt.didChangeEditor")
+def did_change_editor(server: PyXTServer, params):
+    """Active editor, selection or editor options changed"""
+    state_cache.set_active(params.uri)
+
+
+@pyxt_server.feature("pyxt.loadResults")
+def load_results(server: PyXTServer, params):
+    """Load more items into result quick pick"""
+    streams.load(params.id)
+
+
+@pyxt_server.feature("pyxt.cancelResults")
+def cancel_results(server: PyXTServer, params):
+    """Result quick pick was closed before all items were received"""
+    streams.cancel(params.id)
 
 
 def parse_command(input_value):
@@ -88,9 +182,13 @@ def parse_command(input_value):
     return None, name
 
 
-async def _get_completions(server, command, parser, input_value, argstr):
+async def _get_completions(
+    server, command, parser, input_value, argstr, analysis=None
+):
     try:
-        items = await parser.get_completions(argstr)
+        if analysis is None:
+            analysis = await parser.analyze(argstr)
+        items = await analysis.get_completions()
         has_space_after_command = argstr or input_value.endswith(" ")
         if not has_space_after_command:
             input_value += " "
@@ -100,7 +198,7 @@ async def _get_completions(server, command, parser, input_value, argstr):
             items = await get_history_items(server, command.name, argstr) + items
         options = {}
         if command.has_placeholder_item:
-            args, hint = await parser.get_placeholder(argstr)
+            args, hint = await analysis.get_placeholder()
             if hint:
                 options["placeholder"] = hint
             if args or hint:
@@ -110,7 +208,7 @@ async def _get_completions(server, command, parser, input_value, argstr):
                     "offset": 0,
                 })
         elif not argstr:
-            args, hint = await parser.get_placeholder(argstr)
+            args, hint = await analysis.get_placeholder()
             if hint:
                 options["placeholder"] = input_value + hint
         return result(items, input_value, **options)
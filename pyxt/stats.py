@@ -0,0 +1,70 @@
+"""Client round trip statistics
+
+Latency of each request sent to the client is recorded by proxy path
+(call arguments omitted) and attributed to the command that was being
+executed or completed when the request was made.
+"""
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+MAX_SAMPLES = 1000
+current_command = ContextVar("current_command", default=None)
+_stats = {}
+
+
+class Stat:
+    """Round trip count, total time and recent latency samples"""
+
+    def __init__(self, command, path):
+        self.command = command
+        self.path = path
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+
+    def percentile(self, percent):
+        """Get latency percentile (nearest rank) of recent samples"""
+        if not self.samples:
+            return None
+        samples = sorted(self.samples)
+        rank = max(int(round(percent / 100 * len(samples))), 1)
+        return samples[rank - 1]
+
+
+def set_command(name):
+    """Attribute round trips in the current context to the named command"""
+    current_command.set(name)
+
+
+def record(path, seconds):
+    key = (current_command.get(), path)
+    stat = _stats.get(key)
+    if stat is None:
+        stat = _stats[key] = Stat(*key)
+    stat.add(seconds)
+
+
+@contextmanager
+def timer(path):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(path, time.perf_counter() - start)
+
+
+def top(limit=None):
+    """Get stats ordered by total time, most expensive first"""
+    stats = sorted(_stats.values(), key=lambda s: s.total, reverse=True)
+    return stats[:limit] if limit else stats
+
+
+def reset():
+    _stats.clear()
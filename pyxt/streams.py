@@ -0,0 +1,201 @@
+"""Stream result items to the client while they are being produced
+
+A command that may take a long time to produce all of its items returns
+a result with the items produced so far and a `stream` id. Remaining
+items are sent in batches with `pyxt.results` notifications:
+
+    {"id": <stream id>, "items": [...], "done": <bool>, "more": <bool>}
+
+Items are sent in pages. When a page is full and more items are
+available the batch has `"more": true`, and no more items are sent
+until the client requests the next page with a `pyxt.loadResults`
+notification. Meanwhile unsent items are held in a bounded buffer, and
+the producer is paused while the buffer is full.
+
+The client appends each batch to the open quick pick, and sends a
+`pyxt.cancelResults` notification with the stream id if the quick pick
+is closed before the final (`"done": true`) batch is received.
+"""
+import asyncio
+import logging
+from itertools import count
+
+log = logging.getLogger(__name__)
+
+STREAM_DELAY = 0.05  # seconds to wait for all items before streaming
+BATCH_INTERVAL = 0.05  # seconds between batches
+POLL_INTERVAL = 0.01
+RESULTS = "pyxt.results"
+
+_ids = count(1)
+_streams = {}
+
+
+class ResultStream:
+    """Items produced by a background task
+
+    The producer adds items with `put()` and should `await drain()`
+    after each item to pause while the buffer is full.
+
+    :param page_size: Number of items sent to the client per page. At
+    most one more than this number of unsent items are buffered. Pages
+    are not limited by default.
+    :param ready: Function returning the number of leading buffered
+    items that are ready to be sent to the client. Trailing items are
+    held back until the task produces more items or completes. All
+    items are ready by default.
+    :param finish: Function called with each batch of items before it
+    is sent to the client.
+    :param keep: Function called with each item put in the stream
+    (e.g., to keep items for caching).
+    """
+
+    def __init__(self, page_size=None, ready=len, finish=None, keep=None):
+        self.id = str(next(_ids))
+        self.items = []
+        self.keep = keep
+        self.count = 0
+        self.page_size = page_size
+        self.quota = page_size
+        self.ready = ready
+        self.finish = finish
+        self.task = None
+        self.sender = None
+        self._space = asyncio.Event()
+        self._load = asyncio.Event()
+
+    def run(self, produce):
+        """Run producer coroutine in a background task"""
+        self.task = asyncio.ensure_future(produce)
+
+    def put(self, item):
+        self.items.append(item)
+        self.count += 1
+        if self.keep is not None:
+            self.keep(item)
+
+    async def drain(self):
+        """Wait until the buffer is not full"""
+        while self.is_full():
+            self._space.clear()
+            await self._space.wait()
+
+    def is_full(self):
+        return self.page_size is not None and len(self.items) > self.page_size
+
+    @property
+    def more(self):
+        """True if the current page is full and more items are buffered"""
+        return self.quota == 0 and bool(self.items)
+
+    async def wait(self, delay=None):
+        """Wait for the task to complete or produce items ready to send
+
+        The task is cancelled if the waiting coroutine is cancelled.
+
+        :param delay: Seconds to wait for the task to complete before
+        streaming items. Defaults to `STREAM_DELAY`. Waiting stops
+        early if the buffer is full.
+        :returns: True if the task is done and all of its items fit on
+        the first page, false if items should be streamed.
+        """
+        if delay is None:
+            delay = STREAM_DELAY
+        loop = asyncio.get_event_loop()
+        end = loop.time() + delay
+        try:
+            while not (self.task.done() or self.is_full()):
+                timeout = end - loop.time()
+                if timeout <= 0 and self.ready(self.items):
+                    break
+                timeout = min(max(timeout, 0), POLL_INTERVAL)
+                await asyncio.wait({self.task}, timeout=timeout)
+        except asyncio.CancelledError:
+            self.task.cancel()
+            raise
+        if not self.task.done():
+            return False
+        return self.page_size is None or len(self.items) <= self.page_size
+
+    def take(self):
+        """Remove and return the next batch of items to send
+
+        The batch is limited to the number of items remaining on the
+        current page.
+        """
+        if self.task.done() or self.is_full():
+            end = len(self.items)
+        else:
+            end = self.ready(self.items)
+        if self.quota is not None:
+            end = min(end, self.quota)
+            self.quota -= end
+        batch = self.items[:end]
+        del self.items[:end]
+        if not self.is_full():
+            self._space.set()
+        if self.finish is not None:
+            self.finish(batch)
+        return batch
+
+    def start(self, server):
+        """Send remaining items to the client in the background"""
+        _streams[self.id] = self
+        self.sender = asyncio.ensure_future(self._send_batches(server))
+
+    async def _send_batches(self, server):
+        try:
+            while True:
+                if self.more:
+                    self._load.clear()
+                    await self._load.wait()
+                else:
+                    await asyncio.wait({self.task}, timeout=BATCH_INTERVAL)
+                if self.task.cancelled():
+                    return
+                batch = self.take()
+                done = self.task.done() and not self.items
+                if done:
+                    batch.extend(self._error_items())
+                if batch or done or self.more:
+                    self._notify(server, batch, done)
+                if done:
+                    return
+        finally:
+            _streams.pop(self.id, None)
+
+    def _error_items(self):
+        err = self.task.exception()
+        if err is None:
+            return []
+        log.warning("result stream error", exc_info=err)
+        return [{"label": "", "description": str(err)}]
+
+    def _notify(self, server, items, done):
+        params = {"id": self.id, "items": items, "done": done, "more": self.more}
+        server.send_notification(RESULTS, params)
+
+    def load(self):
+        """Send the next page of items"""
+        if self.quota is not None:
+            self.quota += self.page_size
+            self._load.set()
+
+    def cancel(self):
+        self.task.cancel()
+        if self.sender is not None:
+            self.sender.cancel()
+
+
+def load(stream_id):
+    """Load the next page of items if result stream is active"""
+    stream = _streams.get(stream_id)
+    if stream is not None:
+        stream.load()
+
+
+def cancel(stream_id):
+    """Cancel result stream if it is active"""
+    stream = _streams.pop(stream_id, None)
+    if stream is not None:
+        stream.cancel()
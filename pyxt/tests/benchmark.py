@@ -0,0 +1,353 @@
+"""Command parser benchmarks
+
+Time `CommandParser` operations for every registered command across a
+corpus of command strings. Commands are parsed offline with a fake
+editor; nothing is sent to a client.
+
+Usage:
+
+    python -m pyxt.tests.benchmark                      # print timings
+    python -m pyxt.tests.benchmark --save base.json     # save baseline
+    python -m pyxt.tests.benchmark --compare base.json  # compare
+    python -m pyxt.tests.benchmark --memory             # allocations
+    python -m pyxt.tests.benchmark --search             # ag vs native
+
+The comparison exits with status 1 if any benchmark is slower than the
+baseline by more than the threshold (see `--threshold`).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from tempfile import TemporaryDirectory
+from os.path import dirname, join
+
+from .. import command as cmd
+from .. import search as native
+from .. import server  # noqa: F401 register commands
+from ..cmd.ag import DEFAULT_OPTIONS, is_ag_installed
+from ..parser import ArgumentError, CommandParser
+from .util import FakeEditor
+
+ROOT = dirname(dirname(dirname(__file__)))
+LONG_PATH = "/".join(["very-long-directory-name"] * 40) + "/file.py"
+MANY_OPTIONS = " ".join(f"--option-{i}" for i in range(100))
+GENERIC = ["", " ", "x", "x " * 50]
+CORPUS = {
+    "ag": [
+        "",
+        "needle",
+        "'needle in' ~/src/project",
+        "/def (\\w+)\\(self/ . -i --python",
+        "'it\\'s \\'quoted\\' \\\\' ...",
+        "'" + "\\'" * 200 + "'",
+        "/" + "a\\/" * 200 + "/i",
+        "needle " + LONG_PATH,
+        "needle . " + MANY_OPTIONS,
+        "needle . " + "-i " * 200,
+    ],
+    "argwrap": GENERIC,
+    "history": ["", "r", "redo", "redo a", "clear isort"],
+    "isort": ["", "pkg", "pkg,other sel", "a," * 100],
+    "open": [
+        "",
+        "pyxt/",
+        "pyxt/tests/test_pa",
+        "~/",
+        ".../pyxt/cmd/",
+        LONG_PATH,
+        "dir\\ with\\ spaces/" * 20,
+    ],
+    "python": [
+        "",
+        "python3",
+        "python3 all",
+        "python3 selection -m pdb",
+        "python3 all " + MANY_OPTIONS,
+    ],
+    "rename": ["", "new_name.py", LONG_PATH, "README.md ", "README.md o"],
+    "replace": [
+        "",
+        "/a/b/",
+        "/(\\w+)=(\\w+)/\\2=\\1/ all regex",
+        "/" + "a\\/" * 200 + "/b/",
+        ":x:y: selection word",
+    ],
+    "stats": ["", "show", "show 5", "reset"],
+}
+OPERATIONS = ["parse", "get_completions", "get_placeholder", "arg_string", "typing"]
+TYPED_CHARS = 20  # number of trailing characters typed in "typing" benchmarks
+DIRECTORY_SIZE = 500  # number of files listed in "memory" benchmark
+SEARCH_TREE_SIZE = 20000  # number of files in "search" benchmark tree
+SEARCH_PATTERNS = ["needle", "def \\w+_needle\\(", "[a-z]+_[0-9]{4}_x"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("commands", nargs="*", help="Commands to benchmark.")
+    parser.add_argument("--save", metavar="PATH", help="Save results as baseline.")
+    parser.add_argument("--compare", metavar="PATH", help="Compare with baseline.")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1,
+        help="Relative slowdown considered a regression (default: 0.1).",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="Number of timing runs; the fastest is reported (default: 3).",
+    )
+    parser.add_argument(
+        "--number", type=int, default=10,
+        help="Number of iterations per timing run (default: 10).",
+    )
+    parser.add_argument(
+        "--memory", action="store_true",
+        help="Measure memory allocated by directory completions.",
+    )
+    parser.add_argument(
+        "--search", action="store_true",
+        help="Compare ag with native search on a synthetic tree.",
+    )
+    parser.add_argument(
+        "--ag-path", default="ag", help="ag executable for --search (default: ag).",
+    )
+    args = parser.parse_args()
+    if args.memory:
+        stats = asyncio.run(memory())
+        print("\n".join(f"{v:>12,} {k}" for k, v in stats.items()))
+        return
+    if args.search:
+        if not is_ag_installed(args.ag_path):
+            print(f"{args.ag_path} not found: timing native search only")
+        results = asyncio.run(search(repeat=args.repeat, ag_path=args.ag_path))
+        print("\n".join(report(results)))
+        return
+    results = asyncio.run(run(args.commands, args.repeat, args.number))
+    if args.save:
+        save(args.save, results)
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)["results"]
+        if args.commands:
+            baseline = {k: v for k, v in baseline.items() if k in results}
+        lines, regressions = compare(baseline, results, args.threshold)
+        print("\n".join(lines))
+        sys.exit(1 if regressions else 0)
+    print("\n".join(report(results)))
+
+
+async def run(names=None, repeat=3, number=10):
+    """Run benchmarks
+
+    :param names: Optional list of command names to benchmark.
+    Defaults to all registered commands.
+    :returns: A dict `{"<operation> <input>": <seconds per call>}`.
+    """
+    editor = FakeEditor(join(ROOT, "pyxt", "parser.py"), ROOT, text="x = 1\n")
+    results = {}
+    for name in sorted(names or cmd.REGISTRY):
+        command = cmd.REGISTRY[name]
+        parser = await command.create_parser(editor)
+        for argstr in CORPUS.get(name, GENERIC):
+            input_value = f"{name} {argstr}"
+            for op in OPERATIONS:
+                func = await _operation(op, parser, argstr)
+                if func is not None:
+                    key = f"{op} {input_value!r}"
+                    results[key] = await timeit(func, repeat, number)
+    return results
+
+
+async def _operation(op, parser, argstr):
+    def fresh():
+        # do not reuse args from a previous tokenization
+        return CommandParser(parser.command, parser.argspec)
+
+    if op == "typing":
+        # get completions after each keystroke
+        async def func():
+            typer = fresh()
+            for i in range(max(len(argstr) - TYPED_CHARS, 0), len(argstr) + 1):
+                await typer.get_completions(argstr[:i])
+        return func
+    if op == "arg_string":
+        try:
+            options = await fresh().parse(argstr)
+            await parser.arg_string(options)
+        except Exception:
+            return None  # not parseable or not reversible
+        return lambda: parser.arg_string(options)
+    if op == "parse":
+        async def func():
+            try:
+                await fresh().parse(argstr)
+            except ArgumentError:
+                pass
+        return func
+    return lambda: getattr(fresh(), op)(argstr)
+
+
+async def memory(size=DIRECTORY_SIZE):
+    """Measure memory allocated by completions for a large directory
+
+    Completions are listed and itemized (see `server.itemize`) for a
+    directory containing `size` files.
+
+    :returns: A dict with the number of bytes and blocks allocated
+    for (and retained by) the completion items, and the peak number
+    of bytes allocated while they were being created.
+    """
+    with TemporaryDirectory() as tmp:
+        for i in range(size):
+            open(join(tmp, f"file-{i:03}.py"), "w").close()
+        editor = FakeEditor(join(tmp, "file-000.py"), tmp)
+        parser = await cmd.REGISTRY["open"].create_parser(editor)
+        argstr = tmp + "/"
+        await CommandParser(parser.command, parser.argspec).parse(argstr)
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            words = await parser.get_completions(argstr)
+            items = [server.itemize(word, 0) for word in words]
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+    assert len(items) == size, len(items)
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    diff = after.filter_traces(ignore).compare_to(before, "filename")
+    return {
+        "bytes": sum(stat.size_diff for stat in diff),
+        "blocks": sum(stat.count_diff for stat in diff),
+        "peak bytes": peak,
+    }
+
+
+async def search(
+    size=SEARCH_TREE_SIZE, patterns=SEARCH_PATTERNS, repeat=3, ag_path="ag"
+):
+    """Time searches of a synthetic tree with ag and native backends
+
+    The tree contains `size` source-like files in nested directories.
+    Few files contain matches, as is typical of searches in large trees.
+    ag is run with the options used by the `ag` command, and is skipped
+    if it is not installed.
+
+    :returns: A dict `{"<backend> <pattern>": <seconds per search>}`.
+    """
+    async def run_native(pattern, pool):
+        return [m async for m in native.search(tmp, pattern, pool=pool)]
+
+    async def run_ag(pattern):
+        proc = await asyncio.create_subprocess_exec(
+            ag_path, pattern, *DEFAULT_OPTIONS, cwd=tmp,
+            stdout=asyncio.subprocess.PIPE)
+        await proc.communicate()
+
+    results = {}
+    with TemporaryDirectory() as tmp:
+        _make_tree(tmp, size)
+        for pattern in patterns:
+            funcs = {
+                "native thread": lambda: run_native(pattern, False),
+                "native pool": lambda: run_native(pattern, True),
+            }
+            if is_ag_installed(ag_path):
+                funcs["ag"] = lambda: run_ag(pattern)
+            for name, func in funcs.items():
+                await func()  # warm up file system cache and process pool
+                results[f"{name} {pattern!r}"] = await timeit(func, repeat, 1)
+    return results
+
+
+def _make_tree(root, size, lines=100):
+    rand = random.Random(size)
+    words = ["alpha", "beta", "gamma", "delta", "value", "result", "item"]
+    for i in range(size):
+        path = join(root, f"pkg{i % 20}", f"mod{i % 200}", f"file_{i}.py")
+        os.makedirs(dirname(path), exist_ok=True)
+        body = [
+            f"def {rand.choice(words)}_{n}(self, {rand.choice(words)}):"
+            f"  # {rand.choice(words)}_{rand.randrange(10000):04}"
+            for n in range(lines)
+        ]
+        if i % 1000 == 0:
+            body[rand.randrange(lines)] = "def find_needle(self):"
+        with open(path, "w") as fh:
+            fh.write("\n".join(body))
+
+
+async def timeit(func, repeat, number):
+    """Get fastest time per call (seconds) of `repeat` runs"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            await func()
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def save(path, results):
+    data = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(path, "w") as fh:
+        json.dump(data, fh, indent=1, sort_keys=True)
+
+
+def report(results):
+    return [f"{_us(value):>12} {_short(key)}" for key, value in results.items()]
+
+
+def compare(baseline, results, threshold=0.1, noise=1e-6):
+    """Compare results with baseline
+
+    Differences less than `noise` seconds are not reported as
+    regressions regardless of their relative size.
+
+    :returns: A tuple `(lines, regressions)`: report lines and a list of
+    keys of benchmarks that are slower than the baseline.
+    """
+    lines = []
+    regressions = []
+    for key, value in results.items():
+        base = baseline.get(key)
+        if base is None:
+            lines.append(f"{'new':>8} {_us(value):>12} {_short(key)}")
+            continue
+        change = (value - base) / base if base else 0
+        flag = ""
+        if change > threshold and value - base > noise:
+            regressions.append(key)
+            flag = " REGRESSION"
+        lines.append(f"{change:>+8.1%} {_us(value):>12} {_short(key)}{flag}")
+    for key in baseline.keys() - results.keys():
+        lines.append(f"{'missing':>8} {'':>12} {_short(key)}")
+    faster = sum(1 for k in results if k in baseline and results[k] < baseline[k])
+    lines.append(
+        f"{len(results)} benchmarks: {faster} faster, "
+        f"{len(regressions)} regressions (threshold {threshold:.0%})"
+    )
+    return lines, regressions
+
+
+def _us(seconds):
+    return f"{seconds * 1e6:.1f}us"
+
+
+def _short(key, width=100):
+    return key if len(key) <= width else key[:width - 3] + "..."
+
+
+if __name__ == "__main__":
+    main()
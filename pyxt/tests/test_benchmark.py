@@ -0,0 +1,61 @@
+import os
+from os.path import join
+
+from testil import eq, tempdir
+
+from . import benchmark as mod
+from ..tests.util import async_test
+
+
+@async_test
+async def test_run():
+    results = await mod.run(["stats"], repeat=1, number=1)
+    eq(sorted(k for k in results if "'stats show 5'" in k), [
+        "arg_string 'stats show 5'",
+        "get_completions 'stats show 5'",
+        "get_placeholder 'stats show 5'",
+        "parse 'stats show 5'",
+        "typing 'stats show 5'",
+    ])
+    assert all(v > 0 for v in results.values()), results
+
+
+@async_test
+async def test_memory():
+    stats = await mod.memory(size=10)
+    eq(set(stats), {"bytes", "blocks", "peak bytes"})
+    assert all(v > 0 for v in stats.values()), stats
+
+
+@async_test
+async def test_search():
+    results = await mod.search(size=10, patterns=["needle"], repeat=1)
+    assert {"native thread 'needle'", "native pool 'needle'"} <= set(results)
+    assert all(v > 0 for v in results.values()), results
+
+
+@async_test
+async def test_search_with_ag():
+    with tempdir() as tmp:
+        ag_path = join(tmp, "ag")
+        with open(ag_path, "w") as fh:
+            fh.write("#!/bin/sh\n")
+        os.chmod(ag_path, 0o755)
+        results = await mod.search(
+            size=10, patterns=["needle"], repeat=1, ag_path=ag_path)
+    assert "ag 'needle'" in results, results
+
+
+def test_compare():
+    baseline = {"a": 1e-3, "b": 1e-3, "c": 1e-7, "d": 1e-3}
+    results = {"a": 0.9e-3, "b": 1.2e-3, "c": 2e-7, "e": 1e-3}
+    lines, regressions = mod.compare(baseline, results)
+    eq(regressions, ["b"])
+    eq(lines, [
+        "  -10.0%      900.0us a",
+        "  +20.0%     1200.0us b REGRESSION",
+        " +100.0%        0.2us c",
+        "     new     1000.0us e",
+        " missing              d",
+        "4 benchmarks: 1 faster, 1 regressions (threshold 10%)",
+    ])
@@ -0,0 +1,58 @@
+from testil import eq
+
+from ..diff import diff_edits
+from ..tests.util import gentest, yield_test
+
+
+@yield_test
+def test_diff_edits():
+    @gentest
+    def test(old, new, expect, offset=0):
+        edits = diff_edits(old, new, offset)
+        eq(edits, expect)
+        eq(apply(old, edits, offset), new)
+
+    yield test("abc", "abc", [])
+    yield test("", "", [])
+    yield test("", "abc", [("abc", (0, 0))])
+    yield test("abc", "", [("", (0, 3))])
+    yield test("abc", "axc", [("x", (1, 2))])
+    yield test("abc", "axc", [("x", (11, 12))], offset=10)
+    yield test("abc", "abxc", [("x", (2, 2))])
+    yield test("abc", "ac", [("", (1, 2))])
+    yield test(
+        "a = 1\nb = 2\nc = 3\nd = 4\n",
+        "a = 1\nb = 20\nc = 3\nd = 40\n",
+        [("0", (11, 11)), ("0", (23, 23))],
+    )
+    yield test(
+        "import b\nimport a\nx = 1\nimport d\nimport c\n",
+        "import a\nimport b\nx = 1\nimport c\nimport d\n",
+        [
+            ("a\nimport b", (7, 17)),
+            ("c\nimport d", (31, 41)),
+        ],
+    )
+    yield test(
+        "a\r\nb\r\nc\r\n",
+        "a\r\nb\r\n\r\nc\r\n",
+        [("\r\n", (6, 6))],
+    )
+    yield test("a\r\nb", "a\r\rb", [("\r\r", (1, 3))])
+    yield test("x\nline\ny\n", "x\nnew\nlines\ny\n", [
+        ("new\nlines", (2, 6)),
+    ])
+
+
+def test_large_text_with_small_change():
+    old = "".join(f"line {i}\n" for i in range(100_000))
+    new = old.replace("line 500\n", "line 500!\n")
+    edits = diff_edits(old, new)
+    eq(edits, [("!", (old.index("line 500\n") + 8,) * 2)])
+    eq(apply(old, edits), new)
+
+
+def apply(text, edits, offset=0):
+    for value, (start, end) in reversed(edits):
+        text = text[:start - offset] + value + text[end - offset:]
+    return text
@@ -0,0 +1,84 @@
+import os
+import time
+from os.path import join
+from unittest.mock import patch
+
+from testil import assert_raises, eq, tempdir
+
+from .. import dircache as mod
+
+
+def test_listdir():
+    with tempdir() as tmp:
+        setup(tmp, ["b.txt", "A.txt", "dir/", "Cdir/"])
+        cache = mod.DirCache()
+        listing = cache.listdir(tmp)
+        eq(listing.names, ["A.txt", "b.txt", "Cdir", "dir"])
+        eq(listing.dirs, {"Cdir", "dir"})
+        eq(listing.dir_names, ["Cdir", "dir"])
+
+
+def test_listdir_reuses_unchanged_listing():
+    with tempdir() as tmp:
+        setup(tmp, ["a.txt"])
+        cache = mod.DirCache()
+        listing = cache.listdir(tmp)
+        with patch.object(os, "scandir", fail):
+            assert cache.listdir(tmp) is listing
+
+        setup(tmp, ["b.txt"])
+        eq(cache.listdir(tmp).names, ["a.txt", "b.txt"])
+
+
+def test_listdir_does_not_cache_recently_modified_directory():
+    with tempdir() as tmp:
+        cache = mod.DirCache()
+        listing = cache.listdir(tmp)
+        assert cache.listdir(tmp) is not listing
+
+
+def test_listdir_max_age():
+    with tempdir() as tmp:
+        setup(tmp, ["a.txt"])
+        cache = mod.DirCache(max_age=60)
+        listing = cache.listdir(tmp)
+        with patch.object(os, "stat", fail), patch.object(os, "scandir", fail):
+            assert cache.listdir(tmp) is listing
+
+
+def test_listdir_max_size():
+    with tempdir() as tmp:
+        setup(tmp, ["a/", "b/", "c/"])
+        cache = mod.DirCache(max_size=2)
+        listings = [cache.listdir(join(tmp, name)) for name in "abc"]
+        eq(list(cache._items), [join(tmp, "b"), join(tmp, "c")])
+        assert cache.listdir(join(tmp, "c")) is listings[2]
+
+
+def test_listdir_missing_directory():
+    with tempdir() as tmp:
+        with assert_raises(FileNotFoundError):
+            mod.DirCache().listdir(join(tmp, "missing"))
+
+
+def setup(tmp, names):
+    """Create files and directories (names ending with /) in tmp
+
+    Modification times are set in the past so listings are cacheable.
+    """
+    mtime = time.time() - mod.RACY_INTERVAL * 10
+    for name in names:
+        path = join(tmp, name)
+        if name.endswith("/"):
+            os.mkdir(path)
+            os.utime(path, (mtime, mtime))
+        else:
+            with open(path, "w"):
+                pass
+    # differs from mtime of any previous listing
+    mtime -= len(os.listdir(tmp))
+    os.utime(tmp, (mtime, mtime))
+
+
+def fail(*args, **kw):
+    raise AssertionError("unexpected call")
@@ -1,11 +1,15 @@
+import asyncio
 from contextlib import contextmanager
+from types import SimpleNamespace
 from unittest.mock import patch
 
-import pytest
-from testil import eq
+from pygls.workspace import TextDocument
+from testil import assert_raises, eq
 
+from .. import command
 from .. import editor as mod
 from .. import jsproxy
+from ..parser import String
 from ..tests.util import async_test, gentest, yield_test
 
 
@@ -21,7 +25,7 @@ def test_project_path():
     @async_test
     async def test(expected_result, calls=None):
         calls = calls or {}
-        calls.setdefault(ACTIVE_PATH, object)
+        calls.setdefault(ACTIVE_PATH, "/path/to/file")
         calls.setdefault(FOLDER_CALL, None)
         calls.setdefault(FIRST_WORKSPACE, None)
         with setup_editor(calls) as editor:
@@ -72,6 +76,333 @@ async def test_python_path():
         )
 
 
+@async_test
+async def test_search_backend():
+    with setup_editor() as editor:
+        eq(
+            await editor.search_backend,
+            "vscode.workspace.getConfiguration('pyxt',).get('searchBackend',)",
+        )
+
+
+@async_test
+async def test_search_page_size():
+    with setup_editor() as editor:
+        eq(
+            await editor.search_page_size,
+            "vscode.workspace.getConfiguration('pyxt',).get('searchPageSize',)",
+        )
+
+
+@yield_test
+def test_get_text_from_mirror():
+    @gentest
+    @async_test
+    async def test(expect, rng=None, source="0123456789", version=1):
+        documents = {"file:///file.py": TextDocument(
+            "file:///file.py", source, version=version)}
+        with setup_editor(CLIENT_TEXT, documents) as editor:
+            eq(await editor.get_text(rng), expect)
+
+    yield test("0123456789")
+    yield test("234", (2, 5))
+    yield test("234", (5, 2))
+    yield test("89", (8, 20))
+    yield test("client text", version=2)
+    yield test("client text", (2, 5), version=2)
+    yield test("a\u00e9b", source="a\u00e9b")
+    yield test("client text", source="a\U0001f600b")
+    yield test("client text", (0, 4), source="a\U0001f600b")
+
+
+@async_test
+async def test_get_texts_from_mirror():
+    documents = {"file:///file.py": TextDocument(
+        "file:///file.py", "0123456789", version=1)}
+    with setup_editor(CLIENT_TEXT, documents) as editor:
+        eq(await editor.get_texts([(0, 2), (7, 5)]), ["01", "56"])
+        eq(await editor.get_texts(editor.selections()), "client texts")
+
+
+@async_test
+async def test_get_text_without_mirror():
+    with setup_editor(CLIENT_TEXT) as editor:
+        eq(await editor.get_text(), "client text")
+        eq(await editor.get_texts([(0, 2)]), "client texts")
+
+
+@yield_test
+def test_set_text_with_mirror():
+    @gentest
+    @async_test
+    async def test(expect, text, rng=None, select=True, version=1):
+        documents = {"file:///file.py": TextDocument(
+            "file:///file.py", "a = 1\nb = 2\n", version=version)}
+        with setup_editor(CLIENT_TEXT, documents) as editor:
+            await editor.set_text(text, rng, select)
+            eq(editor.server.requests[-1], expect)
+
+    yield test(
+        "editor.set_texts(['0'], [(11, 11)], (0, 13))",
+        "a = 1\nb = 20\n",
+    )
+    yield test(
+        "editor.set_texts(['0'], [(11, 11)], (13, 13))",
+        "a = 1\nb = 20\n",
+        select=False,
+    )
+    yield test(
+        "editor.set_texts(['0'], [(11, 11)], (13, 6))",
+        "b = 20\n",
+        (12, 6),
+    )
+    yield test(
+        "editor.set_texts([], [], (6, 12))",
+        "b = 2\n",
+        (6, 12),
+    )
+    yield test(
+        "editor.set_texts(['\U0001f600'], [(11, 11)], (6, 14))",
+        "b = 2\U0001f600\n",
+        (6, 12),
+    )
+    yield test(
+        "editor.set_text('a = 1\\nb = 20\\n', None, True)",
+        "a = 1\nb = 20\n",
+        version=2,
+    )
+
+
+@async_test
+async def test_set_texts_with_mirror():
+    documents = {"file:///file.py": TextDocument(
+        "file:///file.py", "a = 1\nb = 2\n", version=1)}
+    with setup_editor(CLIENT_TEXT, documents) as editor:
+        await editor.set_texts(["a = 10", "b = 20"], [(0, 5), (6, 11)])
+        eq(editor.server.requests[-1],
+           "editor.set_texts(['0', '0'], [(5, 5), (11, 11)])")
+
+        editor.server.requests.clear()
+        await editor.set_texts(["a = 1"], [(0, 6)])
+        eq(editor.server.requests[-1], "editor.set_texts(['a = 1'], [(0, 6)])",
+           "mirror is outdated after edit")
+
+
+@async_test
+async def test_two_edits_with_mirror():
+    uri = "file:///file.py"
+    documents = {uri: TextDocument(uri, "a = 1\nb = 2\n", version=1)}
+    with setup_editor(CLIENT_TEXT, documents) as editor:
+        await editor.set_text("a = 10", (0, 5))
+        eq(editor.server.requests[-1], "editor.set_texts(['0'], [(5, 5)], (0, 6))")
+
+        # didChange not yet received: mirror text is outdated
+        await editor.set_text("b = 20", (7, 12))
+        eq(editor.server.requests[-1], "editor.set_text('b = 20', (7, 12), True)")
+
+        documents[uri] = TextDocument(uri, "a = 10\nb = 20\n", version=3)
+        await editor.set_text("a = 100", (0, 6))
+        eq(editor.server.requests[-1], "editor.set_texts(['0'], [(6, 6)], (0, 7))")
+
+
+@async_test
+async def test_set_texts_without_mirror():
+    with setup_editor(CLIENT_TEXT) as editor:
+        await editor.set_texts(["a = 10"], [(0, 5)])
+        eq(editor.server.requests[-1], "editor.set_texts(['a = 10'], [(0, 5)])")
+
+
+@yield_test
+def test_eol():
+    @async_test
+    async def test(expected_eol, eol):
+        calls = {
+            "vscode.window.activeTextEditor.document.eol": eol,
+            "vscode.EndOfLine.CRLF": 2,
+        }
+        with setup_editor(calls) as editor:
+            eq(await editor.eol, expected_eol)
+
+    yield test, "\n", 1
+    yield test, "\r\n", 2
+
+
+@async_test
+async def test_indentation_options():
+    calls = {
+        "vscode.window.activeTextEditor.options.insertSpaces": False,
+        "vscode.window.activeTextEditor.options.tabSize": 8,
+    }
+    with setup_editor(calls) as editor:
+        eq(await editor.insert_spaces, False)
+        eq(await editor.tab_size, 8)
+
+
+@async_test
+async def test_snapshot():
+    calls = {
+        ACTIVE_PATH: "/work/dir/file.py",
+        FOLDER_CALL: "/work",
+        "vscode.window.activeTextEditor.document.eol": 2,
+        "vscode.EndOfLine.CRLF": 2,
+        "vscode.window.activeTextEditor.options.insertSpaces": True,
+        "vscode.window.activeTextEditor.options.tabSize": 2,
+        "vscode.workspace.getConfiguration('pyxt',).get('agPath',)": None,
+        "vscode.workspace.getConfiguration('pyxt',).get('pythonPath',)": "py",
+        "vscode.workspace.getConfiguration('pyxt',).get('searchBackend',)": None,
+        "vscode.workspace.getConfiguration('pyxt',).get('searchPageSize',)": None,
+        SELECTIONS: [[1, 2], [5, 7]],
+        "vscode.window.activeTextEditor.document.version": 3,
+        f"{ACTIVE_URI}.toString()": "file:///work/dir/file.py",
+    }
+    with setup_editor(calls) as editor:
+        state = await editor.snapshot()
+        eq(state, mod.EditorState(
+            file_path="/work/dir/file.py",
+            project_path="/work",
+            dirname="/work/dir",
+            eol="\r\n",
+            insert_spaces=True,
+            tab_size=2,
+            ag_path="ag",
+            python_path="py",
+            search_backend="auto",
+            search_page_size=200,
+            selections=((1, 2), (5, 7)),
+            version=3,
+            uri="file:///work/dir/file.py",
+        ))
+        eq(state.selection, (1, 2))
+        assert await editor.snapshot() is state
+
+
+@async_test
+async def test_cancel():
+    async def get_many(proxies):
+        await asyncio.Event().wait()  # never responds
+
+    with setup_editor() as editor, patch.object(jsproxy, "_get_many", get_many):
+        task = asyncio.ensure_future(editor.file_path)
+        await asyncio.sleep(0)
+        editor.cancel()
+        with assert_raises(asyncio.CancelledError):
+            await task
+        assert editor._state.cancelled()
+
+
+@async_test
+async def test_cached_parser_of_cancelled_request_is_not_reused():
+    async def default(editor):
+        return await editor.file_path
+
+    def cmd(editor, args):
+        pass
+
+    with (
+        setup_editor() as editor,
+        patch.object(command, "parser_cache", {}),
+        patch.dict(command.REGISTRY),
+    ):
+        cmd = command.command(String("value", default=default))(cmd)
+        parser = await cmd.create_parser(editor)
+        editor.cancel()  # request cancelled after parser was created
+        srv = editor.server
+
+        editor = mod.Editor(srv)
+        parser2 = await cmd.create_parser(editor)
+        assert parser2 is not parser
+        args = await parser2.parse("")
+        eq(args.value, "vscode.window.activeTextEditor.document.uri.fsPath")
+
+        parser3 = await cmd.create_parser(mod.Editor(srv))
+        assert parser3 is parser2
+        assert editor.shared
+        editor.cancel()  # shared editor requests are not cancelled
+        assert not editor._state.cancelled()
+        assert await cmd.create_parser(mod.Editor(srv)) is not parser2
+
+
+@async_test
+async def test_snapshot_is_fetched_in_one_request():
+    requests = []
+
+    async def get_many(proxies):
+        requests.append(len(proxies))
+        return await fake_get_many(proxies)
+
+    with setup_editor() as editor, patch.object(jsproxy, "_get_many", get_many):
+        await editor.file_path
+        await editor.project_path
+        await editor.dirname
+        await editor.ag_path
+        await editor.python_path
+        await editor.search_backend
+        await editor.search_page_size
+        await editor.eol
+        await editor.insert_spaces
+        await editor.tab_size
+    eq(requests, [14])
+
+
+@async_test
+async def test_snapshot_is_shared_across_requests():
+    uri = f"{ACTIVE_URI}.toString()"
+    version = "vscode.window.activeTextEditor.document.version"
+    calls = {uri: "file:///file.py", version: 1}
+    with setup_editor(calls) as editor, setup_state_cache() as cache:
+        calls = editor.server
+        state = await editor.snapshot()
+        eq(await mod.Editor(calls).snapshot(), state)
+        assert await mod.Editor(calls).snapshot() is not state, "not cached"
+
+        cache.set_active("file:///file.py")
+        cache.set_version("file:///file.py", 1)
+        state = await mod.Editor(calls).snapshot()
+        assert await mod.Editor(calls).snapshot() is state, "cached"
+
+        cache.set_version("file:///file.py", 2)
+        calls[version] = 2
+        state2 = await mod.Editor(calls).snapshot()
+        assert state2 is not state, "document changed"
+        eq(state2.version, 2)
+        assert await mod.Editor(calls).snapshot() is state2, "cached"
+
+        cache.invalidate()
+        assert await mod.Editor(calls).snapshot() is not state2, "invalidated"
+
+
+@async_test
+async def test_snapshot_after_edit():
+    with setup_editor(CLIENT_TEXT) as editor, setup_state_cache() as cache:
+        cache.set_active("file:///file.py")
+        cache.set_version("file:///file.py", 1)
+        state = await editor.snapshot()
+        assert await mod.Editor(editor.server).snapshot() is state, "cached"
+
+        await editor.set_text("edited")
+        eq((await editor.snapshot()).version, 2)
+        eq((await mod.Editor(editor.server).snapshot()).version, 2)
+
+
+def test_state_cache_rejects_stale_state():
+    cache = mod.EditorStateCache()
+    cache.set_active("file:///file.py")
+    cache.set_version("file:///file.py", 1)
+    key = cache.key()
+    state = mod.EditorState(uri="file:///file.py", version=1)
+
+    cache.set_version("file:///file.py", 2)
+    cache.set(key, state)
+    eq(cache.get(cache.key()), None)
+
+    cache.set(cache.key(), state)
+    eq(cache.get(cache.key()), None)
+
+    key = cache.key()
+    cache.set(key, mod.EditorState(uri="file:///file.py", version=2))
+    eq(cache.get(key).version, 2)
+
+
 @async_test
 async def test_selection():
     with setup_editor({"editor.selection(None,)": [1, 2]}) as editor:
@@ -99,6 +430,19 @@ async def test_get_text():
         eq(await editor.get_text(editor.selection()), "text")
 
 
+CLIENT_TEXT = {
+    "vscode.window.activeTextEditor.document.uri.toString()": "file:///file.py",
+    "vscode.window.activeTextEditor.document.version": 1,
+    "editor.get_text(None,)": "client text",
+    "editor.get_text([0, 4],)": "client text",
+    "editor.get_text([2, 5],)": "client text",
+    "editor.get_text((0, 4),)": "client text",
+    "editor.get_text((2, 5),)": "client text",
+    "editor.get_texts([(0, 2)],)": "client texts",
+    "editor.get_texts(editor.selections(None,),)": "client texts",
+}
+SELECTIONS = "editor.selections(None,)"
+VERSION = "vscode.window.activeTextEditor.document.version"
 ACTIVE_URI = "vscode.window.activeTextEditor.document.uri"
 ACTIVE_PATH = f"{ACTIVE_URI}.fsPath"
 FOLDER_CALL = f"vscode.workspace.getWorkspaceFolder({ACTIVE_URI},).uri.fsPath"
@@ -106,18 +450,49 @@ FIRST_WORKSPACE = "vscode.workspace.workspaceFolders[0].uri.fsPath"
 
 
 @contextmanager
-def setup_editor(srv=None):
+def setup_editor(srv=None, documents=None):
+    srv = FakeServer(srv or {}, documents)
+    srv.setdefault(SELECTIONS, [[0, 0]])
     with (
         patch.object(mod, "expanduser", lambda path: "/home/user"),
         patch.object(jsproxy, "_get", fake_get),
+        patch.object(jsproxy, "_get_many", fake_get_many),
     ):
-        yield mod.Editor(srv or {})
+        yield mod.Editor(srv)
+
+
+class FakeServer(dict):
+
+    def __init__(self, calls, documents=None):
+        super().__init__(calls)
+        self.workspace = SimpleNamespace(text_documents=documents or {})
+        self.requests = []
+
+
+@contextmanager
+def setup_state_cache():
+    cache = mod.EditorStateCache()
+    with patch.object(mod, "state_cache", cache):
+        yield cache
 
 
 async def fake_get(proxy):
     path = str(proxy)
     calls, params = proxy._resolve()
+    calls.requests.append(path)
+    if path.startswith("editor.set_text") and isinstance(calls.get(VERSION), int):
+        calls[VERSION] += 1  # edit applied by client
     value = calls.get(path, path)
     if value is jsproxy.Error:
         raise value
     return value
+
+
+async def fake_get_many(proxies):
+    values = []
+    for proxy in proxies:
+        try:
+            values.append(await fake_get(proxy))
+        except jsproxy.Error as err:
+            values.append(err)
+    return values
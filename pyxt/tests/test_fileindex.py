@@ -0,0 +1,286 @@
+import asyncio
+import os
+from contextlib import contextmanager
+from os.path import join
+from pathlib import Path
+from unittest.mock import patch
+
+from testil import eq, tempdir
+
+from .util import async_test, gentest, yield_test
+from .. import fileindex as mod
+
+
+@yield_test
+def test_IgnoreRule():
+    @gentest
+    def test(line, path, expect, is_dir=False):
+        rule = mod.IgnoreRule.parse(line)
+        name = path.rpartition("/")[2]
+        eq(rule.match(path, name, is_dir), expect)
+
+    yield test("*.pyc", "a.pyc", True)
+    yield test("*.pyc", "dir/a.pyc", True)
+    yield test("*.pyc", "a.py", False)
+    yield test("build/", "build", True, is_dir=True)
+    yield test("build/", "build", False)
+    yield test("/build", "build", True)
+    yield test("/build", "dir/build", False)
+    yield test("doc/*.txt", "doc/a.txt", True)
+    yield test("doc/*.txt", "doc/x/a.txt", False)
+    yield test("doc/**/*.txt", "doc/x/y/a.txt", True)
+    yield test("doc/**/*.txt", "doc/a.txt", True)
+    yield test("**/tmp", "a/b/tmp", True)
+    yield test("a?c", "abc", True)
+    yield test("[ab].txt", "b.txt", True)
+    yield test("[!ab].txt", "b.txt", False)
+    yield test("\\#file", "#file", True)
+
+
+@yield_test
+def test_IgnoreRule_parse():
+    @gentest
+    def test(line, expect):
+        rule = mod.IgnoreRule.parse(line)
+        eq(repr(rule) if rule is not None else rule, expect)
+
+    yield test("", None)
+    yield test("# comment", None)
+    yield test("/", None)
+    yield test("!keep.txt ", "IgnoreRule('keep.txt', negate=True, "
+               "dir_only=False, anchored=False)")
+    yield test("/dir/", "IgnoreRule('dir', negate=False, "
+               "dir_only=True, anchored=True)")
+
+
+def test_scan():
+    with tempdir() as tmp:
+        setup(tmp, {
+            ".gitignore": "*.log\nbuild/\n!keep.log\n",
+            "a.txt": "",
+            "a.log": "",
+            "keep.log": "",
+            ".git/HEAD": "",
+            "node_modules/x.js": "",
+            "build/out.txt": "",
+            "src/build": "",
+            "src/.gitignore": "/gen\n",
+            "src/gen/x.py": "",
+            "src/main.py": "",
+            "src/sub/gen/y.py": "",
+            "src/sub/z.log": "",
+        })
+        snapshot = mod.scan(tmp)
+        eq(sorted(snapshot.files), [
+            ".gitignore",
+            "a.txt",
+            "keep.log",
+            "src/.gitignore",
+            "src/build",
+            "src/main.py",
+            "src/sub/gen/y.py",
+        ])
+        eq(sorted(snapshot.ignores), ["", "src"])
+        eq(sorted(snapshot.dirs), ["", "src", "src/sub", "src/sub/gen"])
+
+
+def test_scan_reuses_unchanged_directories():
+    with tempdir() as tmp:
+        setup(tmp, {"a/x.txt": "", "a/b/y.txt": "", "c/z.txt": ""})
+        previous = mod.scan(tmp)
+        setup(tmp, {"c/w.txt": ""})
+        os.utime(join(tmp, "c"), ns=(1, 1))
+        with patch.object(os, "scandir", wraps=os.scandir) as scandir:
+            snapshot = mod.scan(tmp, previous=previous)
+        eq([c.args[0] for c in scandir.call_args_list], [join(tmp, "c")])
+        eq(sorted(snapshot.files), ["a/b/y.txt", "a/x.txt", "c/w.txt", "c/z.txt"])
+
+        setup(tmp, {"a/.gitignore": "y.txt\n"})
+        snapshot = mod.scan(tmp, previous=snapshot)
+        eq(sorted(snapshot.files), [
+            "a/.gitignore", "a/x.txt", "c/w.txt", "c/z.txt"])
+
+
+@async_test
+async def test_FileIndex():
+    with tempdir() as tmp, cache_dir():
+        setup(tmp, {
+            ".gitignore": "*.log\n",
+            "parser.py": "",
+            "tests/test_parser.py": "",
+            "command.py": "",
+        })
+        index = mod.FileIndex(tmp)
+        eq(await index.find("pars"), ["parser.py", "tests/test_parser.py"])
+        eq(await index.find(""), [
+            ".gitignore", "command.py", "parser.py", "tests/test_parser.py"])
+        paths = await index.paths()
+        assert await index.paths() is paths
+
+        setup(tmp, {"new/parse.py": "", "new/x.log": "", "parse.log": ""})
+        index.update([
+            (join(tmp, "new"), mod.CREATED),
+            (join(tmp, "parse.log"), mod.CREATED),
+            (join(tmp, "tests"), mod.DELETED),
+            (join(tmp, "command.py"), mod.DELETED),
+            (join(tmp, "parser.py"), mod.CHANGED),
+            ("/elsewhere/parser.py", mod.CREATED),
+        ])
+        eq(len(index._pending), 5)
+        await index._subscan  # scan of created directory
+        eq(index._pending, [])
+        eq(await index.find("pars"), ["parser.py", "new/parse.py"])
+
+        setup(tmp, {".gitignore": ""})
+        index.update([(join(tmp, ".gitignore"), mod.CHANGED)])
+        await index._rescan
+        eq(await index.find("log"), ["new/x.log", "parse.log"])
+
+
+@async_test
+async def test_FileIndex_skips_changes_to_unindexed_paths():
+    with tempdir() as tmp, cache_dir():
+        setup(tmp, {".gitignore": "*.log\n", "a.txt": "", ".git/HEAD": ""})
+        index = mod.FileIndex(tmp)
+        paths = await index.paths()
+        version = index._version
+        setup(tmp, {"node_modules/x.js": "", "b.log": ""})
+        index.update([
+            (join(tmp, ".git", "index.lock"), mod.CREATED),
+            (join(tmp, ".git", "index.lock"), mod.DELETED),
+            (join(tmp, ".git", ".gitignore"), mod.CREATED),
+            (join(tmp, "node_modules"), mod.CREATED),
+            (join(tmp, "node_modules", "x.js"), mod.CREATED),
+            (join(tmp, "b.log"), mod.CREATED),
+            (join(tmp, "unknown.txt"), mod.DELETED),
+            (join(tmp, "a.txt"), mod.CREATED),
+        ])
+        eq(index._subscan, None)
+        eq(index._rescan, None)
+        eq(index._version, version)
+        assert await index.paths() is paths
+
+
+@async_test
+async def test_generation():
+    with tempdir() as tmp, tempdir() as other, cache_dir(), \
+            patch.object(mod, "_indexes", {}), patch.object(mod, "_generations", {}):
+        setup(tmp, {".gitignore": "*.log\n", "dir/a.txt": ""})
+        await mod.get_index(tmp).paths()
+        eq(mod.generation(tmp), 0)
+        eq(mod.generation(other), 0)
+
+        mod.update([(join(tmp, "dir", "b.txt"), mod.CREATED)])
+        eq((mod.generation(tmp), mod.generation(other)), (1, 0))
+        mod.update([
+            (join(tmp, ".git", "index.lock"), mod.CREATED),
+            (join(tmp, "dir", ".hidden"), mod.CREATED),
+            (join(tmp, "dir", "x.log"), mod.CHANGED),
+            (join(tmp + "2", "a.txt"), mod.CHANGED),
+        ])
+        eq(mod.generation(tmp), 1)
+        mod.update([(join(tmp, "node_modules", "x.js"), mod.CREATED)])
+        eq(mod.generation(tmp), 2)  # searched unless ignored
+        mod.update([(join(tmp, "dir", ".gitignore"), mod.CREATED)])
+        eq(mod.generation(tmp), 3)
+        mod.update([(tmp, mod.DELETED)])
+        eq((mod.generation(tmp), mod.generation(other)), (4, 0))
+        mod.update([(join(other, "a.txt"), mod.CHANGED)])
+        eq((mod.generation(tmp), mod.generation(other)), (4, 1))
+
+
+def test_is_searched():
+    with tempdir() as tmp, cache_dir(), patch.object(mod, "_indexes", {}):
+        setup(tmp, {".gitignore": "*.log\n"})
+        assert mod.is_searched(tmp, tmp)
+        assert mod.is_searched(tmp, join(tmp, "dir", "a.log"))  # not indexed
+        assert not mod.is_searched(tmp, join(tmp, ".git", "HEAD"))
+        assert not mod.is_searched(tmp, tmp + "2")
+
+        index = mod.get_index(tmp)
+        index._snapshot = mod.scan(tmp)
+        assert not mod.is_searched(tmp, join(tmp, "dir", "a.log"))
+        assert mod.is_searched(tmp, join(tmp, "node_modules", "a.js"))
+
+
+@async_test
+async def test_FileIndex_update_while_building():
+    with tempdir() as tmp, cache_dir():
+        setup(tmp, {"a.txt": ""})
+        index = mod.FileIndex(tmp)
+        task = asyncio.ensure_future(index.paths())
+        await asyncio.sleep(0)  # start build
+        assert not index._build.done()
+        setup(tmp, {"b.txt": ""})
+        index.update([(join(tmp, "b.txt"), mod.CREATED)])
+        eq(index._pending, [(join(tmp, "b.txt"), mod.CREATED)])
+        await task
+        eq(await index.paths(), ["a.txt", "b.txt"])
+
+
+def test_snapshot():
+    with tempdir() as tmp, cache_dir() as cache:
+        setup(tmp, {".gitignore": "*.log\n", "a.txt": "", "dir/b.txt": ""})
+        snapshot = mod.scan(tmp)
+        assert mod.save_snapshot(tmp, snapshot)
+        assert mod.snapshot_path(tmp).startswith(cache)
+
+        loaded = mod.load_snapshot(tmp)
+        eq(loaded.files, snapshot.files)
+        eq(loaded.dirs, snapshot.dirs)
+        eq(sorted(loaded.ignores), [""])
+        eq(mod.load_snapshot(join(tmp, "dir")), None)
+
+        snapshot.files.add("new\nline")
+        assert not mod.save_snapshot(tmp, snapshot)
+
+        with open(mod.snapshot_path(tmp), "w") as fh:
+            fh.write(f"{mod.SNAPSHOT_VERSION}\t{tmp}\n1\t2\n")
+        eq(mod.load_snapshot(tmp), None)
+
+
+@async_test
+async def test_FileIndex_loads_snapshot():
+    with tempdir() as tmp, cache_dir():
+        setup(tmp, {"a.txt": "", "dir/b.txt": ""})
+        eq(await mod.FileIndex(tmp).paths(), ["a.txt", "dir/b.txt"])
+
+        setup(tmp, {"dir/c.txt": ""})
+        os.utime(join(tmp, "dir"), ns=(1, 1))
+        index = mod.FileIndex(tmp)
+        snapshot, loaded = index._load_or_scan()
+        assert loaded
+        eq(sorted(snapshot.files), ["a.txt", "dir/b.txt"])
+
+        await index.paths()
+        if index._rescan is not None:
+            await index._rescan
+        eq(await index.paths(), ["a.txt", "dir/b.txt", "dir/c.txt"])
+        eq(sorted(mod.load_snapshot(tmp).files), ["a.txt", "dir/b.txt", "dir/c.txt"])
+
+
+@async_test
+async def test_preload():
+    with tempdir() as tmp, cache_dir(), patch.object(mod, "_indexes", {}):
+        setup(tmp, {"a.txt": ""})
+        mod.preload(tmp)
+        eq(mod._indexes, {})
+
+        assert mod.save_snapshot(tmp, mod.scan(tmp))
+        mod.preload(tmp)
+        index = mod._indexes[tmp]
+        assert index._build is not None
+        eq(await index.paths(), ["a.txt"])
+
+
+@contextmanager
+def cache_dir():
+    with tempdir() as tmp, patch.dict(os.environ, {"XDG_CACHE_HOME": tmp}):
+        yield tmp
+
+
+def setup(tmp, files):
+    for name, content in files.items():
+        path = Path(tmp) / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
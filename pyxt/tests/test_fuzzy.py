@@ -0,0 +1,85 @@
+from testil import eq
+
+from .. import fuzzy
+from ..tests.util import gentest, yield_test
+
+NAMES = [
+    "parser.py",
+    "command.py",
+    "CommandParser",
+    "test_parser.py",
+    "compare",
+    "spacer",
+]
+
+
+@yield_test
+def test_fuzzy_matcher():
+    @gentest
+    def test(query, expect, matches=(), limit=fuzzy.LIMIT):
+        matcher = fuzzy.FuzzyMatcher(limit)
+        found = matcher(query, NAMES, list(matches))
+        eq([NAMES[i] for i in found], expect)
+
+    yield test("", [])
+    yield test("", ["command.py"], [1])
+    yield test("xyz", [])
+    par = ["parser.py", "CommandParser", "test_parser.py", "compare", "spacer"]
+    yield test("par", par)
+    yield test("Par", par)
+    yield test("pars", ["parser.py"], [0], limit=1)
+    yield test("cp", ["command.py", "CommandParser", "compare"])
+    yield test("ser", ["parser.py", "CommandParser", "test_parser.py", "spacer"])
+    yield test("tpy", ["test_parser.py"])
+    yield test("cmd", ["command.py", "CommandParser"])
+    yield test("pr", par)
+    yield test("spa", ["spacer", "test_parser.py"], [5])
+    yield test("a", [
+        "parser.py", "spacer", "command.py", "CommandParser",
+        "test_parser.py", "compare",
+    ])
+
+
+def test_fuzzy_matcher_reuses_prepared_names():
+    matcher = fuzzy.FuzzyMatcher()
+    matcher("c", NAMES, [])
+    prepared = matcher._prepared
+    eq(matcher("p", NAMES, []), [0, 1, 2, 3, 5, 4])
+    assert matcher._prepared is prepared
+    eq(matcher("p", ["x", "p"], []), [1])
+
+
+def test_fuzzy_matcher_with_adjacent_prefix_matches():
+    matcher = fuzzy.FuzzyMatcher()
+    eq(matcher("ab", ["Abc", "Abd", "xabc", "Abe"], []), [0, 1, 3, 2])
+    eq(matcher("ab", ["ab", "ab", "ab"], []), [0, 1, 2])
+
+
+def test_fuzzy_matcher_with_names_longer_when_lowercase():
+    names = ["İİİİ", "abc", "İxyz", "xyz"]
+    matcher = fuzzy.FuzzyMatcher()
+    eq(matcher("xy", names, []), [3, 2])
+    eq(matcher("bc", names, []), [1])
+
+
+@yield_test
+def test_score():
+    @gentest
+    def test(query, better, worse):
+        assert fuzzy.score(query, better) > fuzzy.score(query, worse), \
+            (fuzzy.score(query, better), fuzzy.score(query, worse))
+
+    yield test("fb", "fooBar", "fobar")
+    yield test("fb", "foo_bar", "fobar")
+    yield test("fb", "foo/bar", "fobar")
+    yield test("ab", "abc", "a_b")
+    yield test("ab", "xa_b", "xaxb")
+    yield test("cp", "command_parser", "compare")
+
+
+def test_score_no_match():
+    eq(fuzzy.score("ba", "abc"), None)
+
+
+def test_prefix_matcher():
+    eq(fuzzy.prefix("x", NAMES, [2, 0]), [2, 0])
@@ -1,7 +1,12 @@
+import asyncio
+import json
+import logging
+
+from pygls.server import LanguageServer
 from testil import assert_raises, eq
 
 from ..tests.util import async_test
-from ..jsproxy import Error, JSProxy
+from ..jsproxy import compile_proxy, Error, gather, JSProxy, OutboundQueue
 
 
 @async_test
@@ -55,6 +60,61 @@ async def test_proxy_call_with_resolved_arg():
     ], "root": "JSProxy"})
 
 
+@async_test
+async def test_compiled_proxy():
+    server = FakeServer()
+    get_text = compile_proxy("editor.get_text")
+    eq(str(get_text(server, (1, 2))), "editor.get_text((1, 2),)")
+    eq(await get_text(server, (1, 2)), {
+        "root": "editor",
+        "path": ["get_text"],
+        "args": [(1, 2)],
+    })
+    eq(await compile_proxy("vscode.window.showMessage")(server, "hi"), {
+        "root": "vscode",
+        "path": ["window", "showMessage"],
+        "args": ["hi"],
+    })
+
+
+@async_test
+async def test_compiled_proxy_with_resolved_arg():
+    server = FakeServer()
+    get_texts = compile_proxy("editor.get_texts")
+    selections = compile_proxy("editor.selections")
+    proxy = JSProxy(server, root="JSProxy")
+    eq(await get_texts(server, selections(server)), {
+        "root": "editor",
+        "path": ["get_texts"],
+        "args": [{
+            "root": "editor",
+            "path": ["selections"],
+            "args": [],
+            "__resolve__": True,
+        }],
+    })
+    eq(await proxy.func(selections(server)), {"name": "func", "args": [
+        {"root": "editor", "path": ["selections"], "args": [], "__resolve__": True}
+    ], "root": "JSProxy"})
+
+
+@async_test
+async def test_gather_compiled_proxies():
+    proxy = test_proxy()
+    server = proxy._parent
+    get_text = compile_proxy("editor.get_text")
+    eq(await gather(proxy.foo, get_text(server)), [
+        {"name": "foo", "root": "JSProxy"},
+        {"root": "editor", "path": ["get_text"], "args": []},
+    ])
+    eq(server.requests, 1)
+
+
+def test_compile_proxy_without_function():
+    with assert_raises(ValueError):
+        compile_proxy("editor")
+
+
 @async_test
 async def test_proxy_error():
     proxy = test_proxy(ErrorServer())
@@ -62,6 +122,179 @@ async def test_proxy_error():
         await proxy.attr
 
 
+@async_test
+async def test_gather():
+    proxy = test_proxy()
+    server = proxy._parent
+
+    async def other():
+        return "other"
+
+    eq(await gather(proxy.foo, other(), proxy.bar.baz), [
+        {"name": "foo", "root": "JSProxy"},
+        "other",
+        {"name": "bar", "next": {"name": "baz"}, "root": "JSProxy"},
+    ])
+    eq(server.requests, 1)
+
+
+@async_test
+async def test_gather_without_proxies():
+    async def value(x):
+        return x
+
+    proxy = test_proxy()
+    eq(await gather(value(1), value(2)), [1, 2])
+    eq(proxy._parent.requests, 0)
+
+
+@async_test
+async def test_gather_error():
+    proxy = test_proxy(BatchErrorServer())
+    with assert_raises(Error, msg="bar failed"):
+        await gather(proxy.foo, proxy.bar)
+
+
+@async_test
+async def test_gather_return_exceptions():
+    proxy = test_proxy(BatchErrorServer())
+    foo, bar = await gather(proxy.foo, proxy.bar, return_exceptions=True)
+    eq(foo, {"name": "foo", "root": "JSProxy"})
+    eq(type(bar), Error)
+    eq(str(bar), "bar failed")
+
+
+@async_test
+async def test_gather_return_exceptions_with_request_error():
+    async def other():
+        return "other"
+
+    proxy = test_proxy(RequestErrorServer())
+    foo, value, bar = await gather(
+        proxy.foo, other(), proxy.bar, return_exceptions=True)
+    eq(type(foo), RuntimeError)
+    eq(str(foo), "connection lost")
+    eq(value, "other")
+    assert bar is foo, bar
+
+
+@async_test
+async def test_outbound_queue():
+    server = SlowServer()
+    proxy = test_proxy(server)
+    queue = OutboundQueue()
+    await queue.put(proxy.update("cmd", "a"))
+    await asyncio.sleep(0)  # first batch in flight
+    await queue.put(proxy.update("cmd", "b"), idempotent=True)
+    await queue.put(proxy.update("cmd", "b"), idempotent=True)
+    await queue.put(proxy.update("cmd", "c"), idempotent=True)
+    await queue.put(proxy.update("cmd", "b"), idempotent=True)
+    server.ready.set()
+    await queue.join()
+    eq(server.batches, [["a"], ["b", "c", "b"]])
+
+
+@async_test
+async def test_outbound_queue_does_not_coalesce_non_idempotent_requests():
+    server = SlowServer()
+    proxy = test_proxy(server)
+    queue = OutboundQueue()
+    await queue.put(proxy.update("cmd", "a"))
+    await asyncio.sleep(0)  # first batch in flight
+    await queue.put(proxy.update("cmd", "b"))
+    await queue.put(proxy.update("cmd", "b"))
+    server.ready.set()
+    await queue.join()
+    eq(server.batches, [["a"], ["b", "b"]])
+
+
+@async_test
+async def test_outbound_queue_waits_for_space_when_full():
+    server = SlowServer()
+    proxy = test_proxy(server)
+    queue = OutboundQueue(max_pending=2)
+    await queue.put(proxy.update("cmd", "a"))
+    await asyncio.sleep(0)  # first batch in flight
+    await queue.put(proxy.update("cmd", "b"))
+    await queue.put(proxy.update("cmd", "c"))
+    put = asyncio.ensure_future(queue.put(proxy.update("cmd", "d")))
+    await asyncio.sleep(0)
+    assert not put.done(), "put should wait while queue is full"
+    server.ready.set()
+    await put
+    await queue.join()
+    eq(server.batches, [["a"], ["b", "c"], ["d"]])
+
+
+@async_test
+async def test_outbound_queue_logs_errors(caplog):
+    proxy = test_proxy(BatchErrorServer())
+    queue = OutboundQueue()
+    with caplog.at_level(logging.ERROR):
+        await queue.put(proxy.foo)
+        await queue.put(proxy.bar)
+        await queue.join()
+    assert "Outbound request failed: JSProxy.bar: bar failed" in caplog.text, \
+        caplog.text
+    assert "JSProxy.foo" not in caplog.text, caplog.text
+
+
+@async_test
+async def test_cancel_request():
+    server = SlowServer()
+    proxy = test_proxy(server)
+    for awaitable in [proxy.foo, gather(proxy.foo, proxy.bar)]:
+        server.notifications.clear()
+        server.msg_id = None
+        task = asyncio.ensure_future(awaitable)
+        while server.msg_id is None:
+            await asyncio.sleep(0)  # wait for request to be sent
+        task.cancel()
+        with assert_raises(asyncio.CancelledError):
+            await task
+        (method, params), = server.notifications
+        eq(method, "$/cancelRequest")
+        eq(params.id, server.msg_id)
+        assert server.msg_id not in server._request_futures, "not forgotten"
+        assert server.msg_id not in server._result_types, "not forgotten"
+        eq(server._result_types.pop(server.msg_id), None)  # late response
+
+
+@async_test
+async def test_cancel_request_with_pygls_protocol(caplog):
+    # _forget_request depends on private attributes of pygls
+    # JsonRPCProtocol. This test should fail if they change.
+    server = LanguageServer("test", "v0")
+    transport = FakeTransport()
+    server.lsp.connection_made(transport)
+    eq(type(server.lsp._request_futures), dict)
+    eq(type(server.lsp._result_types), dict)
+    proxy = test_proxy(server)
+    task = asyncio.ensure_future(proxy.foo)
+    while not transport.messages:
+        await asyncio.sleep(0)  # wait for request to be sent
+    request, = transport.messages
+    msg_id = request["id"]
+    assert msg_id in server.lsp._request_futures, server.lsp._request_futures
+    assert msg_id in server.lsp._result_types, server.lsp._result_types
+    task.cancel()
+    with assert_raises(asyncio.CancelledError):
+        await task
+    eq(server.lsp._request_futures, {})
+    eq(dict(server.lsp._result_types), {})
+    cancel = transport.messages[-1]
+    eq(cancel["method"], "$/cancelRequest")
+    eq(cancel["params"], {"id": msg_id})
+
+    # late response is ignored
+    with caplog.at_level(logging.WARNING):
+        server.lsp.data_received(FakeTransport.encode(
+            {"jsonrpc": "2.0", "id": msg_id, "result": None}))
+    assert "unknown message id" in caplog.text, caplog.text
+    errors = [r for r in caplog.records if r.levelno >= logging.ERROR]
+    eq(errors, [])
+
+
 def test_proxy(server=None):
     server = server or FakeServer()
     return JSProxy(server, root="JSProxy")
@@ -72,14 +305,16 @@ test_proxy.__test__ = False
 
 class FakeServer:
 
+    requests = 0
+
     @property
     def lsp(self):
         return self
 
-    @staticmethod
-    async def send_request_async(command, params):
+    async def send_request_async(self, command, params, msg_id=None):
         if command == "pyxt.resolve":
             eq(len(params), 1, params)
+            self.requests += 1
             return params[0]
         raise RuntimeError(f"unknown command: {command}")
 
@@ -87,5 +322,59 @@ class FakeServer:
 class ErrorServer(FakeServer):
 
     @staticmethod
-    async def send_request_async(command, params):
+    async def send_request_async(command, params, msg_id=None):
         return ["__error__", "something is wrong", "stack trace"]
+
+
+class SlowServer(FakeServer):
+
+    def __init__(self):
+        self.ready = asyncio.Event()
+        self.batches = []
+        self.notifications = []
+        self._request_futures = {}
+        self._result_types = {}
+
+    def notify(self, method, params):
+        self.notifications.append((method, params))
+
+    async def send_request_async(self, command, params, msg_id=None):
+        self.msg_id = msg_id
+        self._request_futures[msg_id] = None
+        self._result_types[msg_id] = None
+        specs = await super().send_request_async(command, params)
+        await self.ready.wait()
+        self.batches.append([spec["args"][1] for spec in specs])
+        return specs
+
+
+class RequestErrorServer(FakeServer):
+
+    async def send_request_async(self, command, params, msg_id=None):
+        raise RuntimeError("connection lost")
+
+
+class BatchErrorServer(FakeServer):
+
+    async def send_request_async(self, command, params, msg_id=None):
+        specs = await super().send_request_async(command, params)
+        return [
+            ["__error__", f"{spec['name']} failed", "stack trace"]
+            if spec["name"] == "bar" else spec
+            for spec in specs
+        ]
+
+
+class FakeTransport:
+
+    def __init__(self):
+        self.messages = []
+
+    def write(self, data):
+        body = data.split(b"\r\n\r\n", 1)[1]
+        self.messages.append(json.loads(body))
+
+    @staticmethod
+    def encode(message):
+        body = json.dumps(message).encode("utf-8")
+        return b"Content-Length: %d\r\n\r\n" % len(body) + body
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 import re
@@ -8,10 +9,11 @@ from unittest.mock import patch
 from testil import assert_raises, eq as eq_, tempdir, Config
 
 from .util import FakeEditor, async_test, await_coroutine, yield_test
+from .. import fuzzy
 from .. import parser as mod
 from ..parser import (Arg, Choice, Int, String, Regex, RegexPattern,
     File, CommandParser, SubArgs, SubParser, VarArgs, CompleteWord, Conditional,
-    identifier, Options, Error, ArgumentError, ParseError)
+    depends_on, identifier, Options, Error, ArgumentError, ParseError)
 
 log = logging.getLogger(__name__)
 
@@ -180,6 +182,133 @@ async def test_CommandParser_incomplete():
         await parser.parse('a')
 
 
+def test_CommandParser_has_dynamic_defaults():
+    def default(editor):
+        return "value"
+
+    dynamic = String("value", default=default)
+    eq_(create_parser(yesno, String("value")).has_dynamic_defaults(), False)
+    eq_(create_parser(yesno, dynamic).has_dynamic_defaults(), True)
+    eq_(create_parser(VarArgs("values", yesno)).has_dynamic_defaults(), False)
+    eq_(create_parser(VarArgs("values", dynamic)).has_dynamic_defaults(), True)
+    eq_(create_parser(Conditional(bool, dynamic)).has_dynamic_defaults(), True)
+    eq_(create_parser(SubParser(
+        "action",
+        SubArgs("a", yesno),
+        SubArgs("b", dynamic),
+    )).has_dynamic_defaults(), True)
+    eq_(create_parser(SubParser(
+        "action",
+        SubArgs("a", yesno),
+    )).has_dynamic_defaults(), False)
+
+
+@async_test
+async def test_CommandParser_reuses_args_of_unchanged_prefix():
+    class Counted(String):
+        async def consume(self, text, index):
+            consumed.append((self.name, text[index:]))
+            return await super().consume(text, index)
+
+    async def tokenize(text):
+        del consumed[:]
+        return [str(arg) async for arg in parser.tokenize(text, 0)]
+
+    consumed = []
+    parser = create_parser(Counted("a"), Counted("b"), Counted("c"))
+    eq_(await tokenize("x y"), ["x", "y", ""])
+    eq_(consumed, [("a", "x y"), ("b", "y")])
+    eq_(await tokenize("x yz"), ["x", "yz", ""])
+    eq_(consumed, [("b", "yz")])
+    eq_(await tokenize("x yz z"), ["x", "yz", "z"])
+    eq_(consumed, [("b", "yz z"), ("c", "z")])
+    eq_(await tokenize("x yz zz"), ["x", "yz", "zz"])
+    eq_(consumed, [("c", "zz")])
+    eq_(await tokenize("w yz z"), ["w", "yz", "z"])
+    eq_(consumed, [("a", "w yz z"), ("b", "yz z"), ("c", "z")])
+    del consumed[:]
+    eq_(await parser.parse("w yz z"), Options(a="w", b="yz", c="z"))
+    eq_(consumed, [("c", "z")])
+
+
+@async_test
+async def test_CommandParser_analyze():
+    class Counted(Choice):
+        async def consume(self, text, index):
+            consumed.append(text[index:])
+            return await super().consume(text, index)
+
+    consumed = []
+    parser = create_parser(Counted("yes no", name="yn"), String("value"))
+    analysis = await parser.analyze("y")
+    eq_(consumed, ["y"])
+    eq_(await analysis.parse(), Options(yn="yes", value=None))
+    eq_(await analysis.get_completions(), ["yes"])
+    eq_(await analysis.get_placeholder(), ("yes", "value"))
+    eq_(consumed, ["y"])
+
+    analysis = await parser.analyze("y a b")
+    with assert_raises(mod.ArgumentError, msg="unexpected argument(s): b"):
+        await analysis.parse()
+    eq_(await analysis.get_completions(), [])
+
+
+@async_test
+async def test_CommandParser_with_context():
+    async def default_a(editor):
+        log.append("a start")
+        await asyncio.sleep(0)
+        log.append("a end")
+        return "a"
+
+    async def default_b(editor):
+        log.append("b start")
+        await asyncio.sleep(0)
+        log.append("b end")
+        return "b"
+
+    @depends_on("a", "b")
+    async def default_c(editor, a, b):
+        log.append("c")
+        return a + b
+
+    log = []
+    parser = create_parser(
+        String("c", default=default_c),
+        String("a", default=default_a),
+        String("b", default=default_b),
+    )
+    parser = await parser.with_context(FakeEditor())
+    eq_([f.default for f in parser.argspec], ["ab", "a", "b"])
+    eq_(log, ["a start", "b start", "a end", "b end", "c"])
+
+
+@async_test
+async def test_CommandParser_with_context_dependency_errors():
+    @depends_on("b")
+    def default_a(editor, b):
+        return b
+
+    @depends_on("a")
+    def default_b(editor, a):
+        return a
+
+    @depends_on("x")
+    def default_x(editor, x):
+        return x
+
+    parser = create_parser(
+        String("a", default=default_a),
+        String("b", default=default_b),
+    )
+    with assert_raises(ValueError, msg="circular field dependency: a -> b -> a"):
+        await parser.with_context(FakeEditor())
+
+    parser = create_parser(String("a", default=default_x))
+    with assert_raises(ValueError, msg="a depends on unknown field(s): x"):
+        await parser.with_context(FakeEditor())
+
+
 @yield_test
 def test_CommandParser_arg_string():
     @async_test
@@ -406,6 +535,95 @@ def test_Arg():
     yield test, mod.Arg(string, '  \\ ', 0, opts), ''
 
 
+def test_Arg_sync_field():
+    arg = mod.Arg(Int("num"), "12 x", 0, Options())
+    eq_(arg.end, 3)
+    eq_(arg.value, 12)
+
+    arg = mod.Arg(Int("num"), "x", 0, Options())
+    eq_(arg.value, None)
+    eq_([str(e) for e in arg.errors],
+        ["invalid literal for int() with base 10: 'x'"])
+
+    arg = mod.Arg(File("path"), "x", 0, Options())
+    assert not hasattr(arg, "end"), arg
+    eq_(await_coroutine(_await(arg)).end, 2)
+
+
+async def _await(value):
+    return await value
+
+
+def test_Field_is_sync():
+    class Async(String):
+        async def consume(self, text, index):
+            return await super().consume(text, index)
+
+    def test(field, expect):
+        eq_(field.is_sync, expect, field)
+
+    test(Choice("a b"), True)
+    test(Int("num"), True)
+    test(mod.Float("num"), True)
+    test(String("str"), True)
+    test(mod.UnlimitedString("str"), True)
+    test(Regex("regex"), True)
+    test(VarArgs("nums", Int("num")), True)
+    test(Conditional(lambda arg: True, Int("num")), True)
+    test(File("path"), False)
+    test(mod.DynamicList("name", lambda: [], lambda x: x), False)
+    test(VarArgs("paths", File("path")), False)
+    test(Async("str"), False)
+
+
+@async_test
+async def test_CommandParser_tokenize_sync_fields_without_consume():
+    def fail(self, text, index):
+        raise AssertionError("unexpected async consume")
+
+    parser = create_parser(yesno, Int("num"), VarArgs("words", String("word")))
+    with patch.object(mod.Field, "consume", fail):
+        eq_(await parser.parse("n 4 a b"),
+            Options(yes=False, num=4, words=["a", "b"]))
+
+
+def test_Arg_has_no_dict():
+    arg = mod.Arg(Int("num"), "12", 0, Options())
+    assert not hasattr(arg, "__dict__"), vars(arg)
+
+
+def test_options_type():
+    Fixed = mod.options_type(["a", "b"])
+    assert mod.options_type(("a", "b")) is Fixed
+    assert issubclass(Fixed, Options), Fixed.__mro__
+    opts = Fixed(b=2)
+    opts.c = 3
+    eq_(list(opts), [("b", 2), ("c", 3)])
+    eq_(repr(opts), "Options(b=2, c=3)")
+    eq_(opts, Options(b=2, c=3))
+    eq_(Options(b=2, c=3), opts)
+
+
+@async_test
+async def test_CommandParser_options_type():
+    parser = create_parser(yesno, Int("num"))
+    options = await parser.parse("y 3")
+    eq_(type(options), parser.options_type)
+    eq_(options, Options(yes=True, num=3))
+    assert "yes" not in vars(options), vars(options)
+
+
+def test_CompleteWord():
+    word = CompleteWord("a b", start=2)
+    eq_(vars(word), {"start": 2})
+    eq_(word.complete(), "a b ")
+    copied = CompleteWord(word, escape=lambda v: v.replace(" ", "\\ "))
+    eq_(copied.start, 2)
+    eq_(copied.complete(), "a\\ b ")
+    eq_(CompleteWord(copied, start=0, extra=1).__dict__.keys(),
+        {"start", "escape", "extra"})
+
+
 @yield_test
 def test_identifier():
     def test(name, ident):
@@ -904,6 +1122,23 @@ def test_File():
         yield test, " ", 0, ("~/dir", "")
 
 
+@async_test
+async def test_File_completions_do_not_stat_entries():
+    with tempdir() as tmp:
+        os.mkdir(join(tmp, "dir"))
+        with open(join(tmp, "file.txt"), "w"):
+            pass
+        field = await File('path').with_context(FakeEditor(join(tmp, "file.txt")))
+        arg = await mod.Arg(field, "", 0, None)
+        with patch.object(os.path, "isdir", fail), \
+                patch.object(os, "listdir", fail):
+            eq_(await field.get_completions(arg), ["dir/", "file.txt"])
+
+
+def fail(*args, **kw):
+    raise AssertionError("unexpected call")
+
+
 @yield_test
 def test_DynamicList():
     def get_items(editor):
@@ -947,6 +1182,47 @@ def test_DynamicList():
     yield test, "Hammer", ""
 
 
+@async_test
+async def test_Choice_prefix_shared_by_many_names():
+    field = Choice("abc abd abe")
+    with assert_raises(ParseError, msg="'ab' is ambiguous: abc, abd, abe"):
+        await field.consume("ab", 0)
+    eq_(await field.consume("abe", 0), ("abe", 4))
+
+
+@async_test
+async def test_DynamicList_reuses_index():
+    def get_items(editor):
+        return list(items)
+
+    items = ["Hammer", "Drill"]
+    field = mod.DynamicList('tool', get_items, str)
+    eq_(await field.consume("d", 0), ("Drill", 2))
+    index = field.index_cache.get(items)
+    field = await field.with_context(FakeEditor())
+    eq_(await field.get_completions("h"), ["Hammer"])
+    assert field.index_cache.get(items) is index
+
+    items.append("Hacksaw")
+    eq_(await field.get_completions("h"), ["Hammer", "Hacksaw"])
+
+
+@async_test
+async def test_fuzzy_completions():
+    def get_items(editor):
+        return ["Hammer", "Screw Driver", "Drill"]
+
+    choice = Choice("hammer screw_driver drill")
+    dynamic = mod.DynamicList('tool', get_items, str)
+    dynamic = await dynamic.with_context(FakeEditor())
+    with patch.object(fuzzy, "matcher", fuzzy.FuzzyMatcher()):
+        eq_(await choice.get_completions("dr"), ["drill", "screw_driver"])
+        eq_(await choice.get_placeholder(Arg(choice, "dr", 0, None)), ("drill", ""))
+        eq_(await dynamic.get_completions("dr"), ["Drill", "Screw\\ Driver"])
+        eq_(await dynamic.get_completions("sd"), ["Screw\\ Driver"])
+    eq_(await choice.get_completions("dr"), ["drill"])
+
+
 @yield_test
 def test_Regex():
     field = Regex('regex')
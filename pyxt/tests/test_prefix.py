@@ -0,0 +1,41 @@
+from testil import eq
+
+from ..prefix import IndexCache, PrefixIndex
+from ..tests.util import gentest, yield_test
+
+NAMES = ["beta", "alpha", "Alpine", "al", "gamma", "alp"]
+
+
+@yield_test
+def test_find():
+    @gentest
+    def test(prefix, expect, fold=False):
+        index = PrefixIndex(NAMES, fold)
+        eq([NAMES[i] for i in index.find(prefix)], expect)
+
+    yield test("", NAMES)
+    yield test("a", ["alpha", "al", "alp"])
+    yield test("al", ["alpha", "al", "alp"])
+    yield test("alp", ["alpha", "alp"])
+    yield test("alpha", ["alpha"])
+    yield test("alphas", [])
+    yield test("A", ["Alpine"])
+    yield test("A", ["alpha", "Alpine", "al", "alp"], fold=True)
+    yield test("ALPI", ["Alpine"], fold=True)
+    yield test("z", [])
+    yield test("z", [], fold=True)
+
+
+def test_first():
+    index = PrefixIndex(NAMES, fold=True)
+    eq(index.first("alp"), 1)
+    eq(index.first("G"), 4)
+    eq(index.first("x"), None)
+
+
+def test_index_cache():
+    cache = IndexCache(fold=True)
+    index = cache.get(list(NAMES))
+    assert cache.get(list(NAMES)) is index
+    assert cache.get(NAMES + ["delta"]) is not index
+    eq(cache.get(NAMES + ["delta"]).find("d"), [6])
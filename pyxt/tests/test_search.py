@@ -0,0 +1,72 @@
+import re
+from pathlib import Path
+
+from testil import eq, tempdir
+
+from .util import async_test, gentest, yield_test
+from .. import search as mod
+
+
+@yield_test
+def test_search():
+    with tempdir() as tmp:
+        setup(tmp)
+
+        @gentest
+        @async_test
+        async def test(pattern, expect, flags=0, pool=False):
+            eq([m async for m in mod.search(tmp, pattern, flags, pool)], expect)
+
+        yield test("b+", [
+            ("a.txt", 2, 0, 3, "bbb"),
+            ("dir/b.txt", 1, 2, 1, "a b a b"),
+        ])
+        yield test("B", [("dir/b.txt", 2, 0, 1, "B")])
+        yield test("b", [
+            ("a.txt", 2, 0, 1, "bbb"),
+            ("dir/b.txt", 1, 2, 1, "a b a b"),
+            ("dir/b.txt", 2, 0, 1, "B"),
+        ], re.IGNORECASE)
+        yield test("a\\nb", [("a.txt", 1, 2, 1, "a a")])
+        yield test("é", [("dir/b.txt", 3, 1, 1, "xé")])
+        yield test("bbb", [("a.txt", 2, 0, 3, "bbb")], pool=True)
+
+
+@yield_test
+def test_required_literal():
+    @gentest
+    def test(pattern, expect, flags=0):
+        eq(mod.required_literal(pattern, flags), expect)
+
+    yield test("foo", "foo")
+    yield test("a.*bcd", "bcd")
+    yield test("x\\.py", "x.py")
+    yield test("\\bdef (\\w+)", "def ")
+    yield test("a|bc", None)
+    yield test("(?i)foo", None)
+    yield test("foo", None, re.IGNORECASE)
+    yield test("[ab]", None)
+    yield test("(", None)
+
+
+@async_test
+async def test_search_selects_files_like_ag():
+    with tempdir() as tmp:
+        root = Path(tmp)
+        for path in ["node_modules/x", ".git/x", "build/x", "a.log", "b.txt", ".h"]:
+            (root / path).parent.mkdir(parents=True, exist_ok=True)
+            (root / path).write_text("x")
+        (root / ".gitignore").write_text("build/\n*.log\n")
+        found = [m[0] async for m in mod.search(tmp, "x")]
+        eq(found, ["b.txt", "node_modules/x"])
+
+
+def setup(tmp):
+    root = Path(tmp)
+    (root / "dir").mkdir()
+    (root / ".hidden").mkdir()
+    (root / "a.txt").write_text("a a\nbbb\r\n")
+    (root / "dir/b.txt").write_text("a b a b\nB\nxé", encoding="utf-8")
+    (root / ".hidden/b.txt").write_text("b")
+    (root / "binary").write_bytes(b"b\0")
+    (root / "empty").write_text("")
@@ -2,6 +2,7 @@ from unittest.mock import patch
 from testil import eq
 
 from .. import command
+from .. import fileindex
 from .. import history
 from .. import server as mod
 from ..parser import Choice, String
@@ -9,7 +10,9 @@ from ..results import error, result
 from ..tests.util import (
     async_test,
     fake_history,
+    FakeEditor,
     gentest,
+    get_completions,
     test_command,
     yield_test,
 )
@@ -190,6 +193,27 @@ def test_get_completions_with_history():
     ], value="cmd a"), {"cmd": ["a", "b"]})
 
 
+@async_test
+async def test_field_defaults_are_evaluated_once_per_editor_state():
+    async def default(editor):
+        calls.append(editor)
+        return "def"
+
+    calls = []
+    editor = FakeEditor()
+    with test_command(String("value", default=default)):
+        for value in ["cmd", "cmd ", "cmd x"]:
+            await get_completions(value, editor)
+        eq(len(calls), 1)
+
+        editor.selection = (0, 1)
+        await get_completions("cmd x", editor)
+        eq(len(calls), 2)
+
+        await get_completions("cmd x", FakeEditor())
+        eq(len(calls), 3)
+
+
 @yield_test
 def test_parse_command():
     def test(input_value, expected_args, found=True):
@@ -226,5 +250,48 @@ def test_load_user_script():
         eq(commands, sorted(commands))
 
 
+def test_editor_state_notifications():
+    from types import SimpleNamespace as Params
+    from ..editor import EditorStateCache
+
+    def doc(uri, version=None):
+        return Params(text_document=Params(uri=uri, version=version))
+
+    cache = EditorStateCache()
+    with patch.object(mod, "state_cache", cache):
+        eq(cache.key(), None)
+        mod.did_open(None, doc("file:///a.py", 1))
+        mod.did_open(None, doc("file:///b.py", 5))
+        eq(cache.key(), None)
+        mod.did_change_editor(None, Params(uri="file:///a.py"))
+        eq(cache.key(), ("file:///a.py", 1, 1))
+        mod.did_change(None, doc("file:///a.py", 2))
+        eq(cache.key(), ("file:///a.py", 2, 1))
+        mod.did_change_configuration(None, Params(settings={}))
+        eq(cache.key(), ("file:///a.py", 2, 2))
+        event = Params(added=[], removed=[])
+        mod.did_change_workspace_folders(None, Params(event=event))
+        eq(cache.key(), ("file:///a.py", 2, 3))
+        mod.did_change_editor(None, Params(uri="file:///b.py"))
+        eq(cache.key(), ("file:///b.py", 5, 4))
+        mod.did_close(None, doc("file:///b.py"))
+        eq(cache.key(), ("file:///b.py", None, 4))
+
+
+def test_file_indexes_are_preloaded():
+    from types import SimpleNamespace as Params
+
+    def folder(path):
+        return Params(uri=f"file://{path}", name=path)
+
+    workspace = Params(folders={"a": folder("/a"), "b": folder("/b")})
+    server = Params(workspace=workspace)
+    event = Params(added=[folder("/c")], removed=[folder("/a")])
+    with patch.object(fileindex, "preload") as preload:
+        mod.initialized(server, Params())
+        mod.did_change_workspace_folders(server, Params(event=event))
+    eq([c.args for c in preload.call_args_list], [("/a",), ("/b",), ("/c",)])
+
+
 def item(label, offset, **kw):
     return {"label": label, "offset": offset, **kw}
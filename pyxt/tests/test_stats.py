@@ -0,0 +1,55 @@
+from unittest.mock import patch
+
+from testil import eq
+
+from .. import stats as mod
+from ..jsproxy import gather
+from ..tests.util import async_test
+from .test_jsproxy import test_proxy
+
+
+def test_percentile():
+    stat = mod.Stat("cmd", "path")
+    for ms in range(1, 101):
+        stat.add(ms / 1000)
+    eq(stat.count, 100)
+    eq(round(stat.total, 3), 5.05)
+    eq(stat.percentile(50), 0.05)
+    eq(stat.percentile(95), 0.095)
+    eq(stat.percentile(99), 0.099)
+    eq(mod.Stat("cmd", "path").percentile(50), None)
+
+
+@async_test
+async def test_proxy_round_trips_are_recorded():
+    with patch.object(mod, "_stats", {}):
+        mod.set_command("cmd")
+        proxy = test_proxy()
+        await proxy.foo.bar(1)
+        await proxy.foo.bar(2)
+        await proxy[0]
+        await gather(proxy.foo, proxy.baz[1])
+        eq(sorted((s.command, s.path, s.count) for s in mod.top()), [
+            ("cmd", "JSProxy.foo.bar", 2),
+            ("cmd", "JSProxy[0]", 1),
+            ("cmd", "batch: JSProxy.foo, JSProxy.baz[1]", 1),
+        ])
+
+
+@async_test
+async def test_top():
+    with patch.object(mod, "_stats", {}):
+        mod.set_command("cmd")
+        mod.record("fast", 0.001)
+        mod.record("slow", 0.003)
+        mod.record("fast", 0.001)
+        mod.set_command("other")
+        mod.record("fast", 0.004)
+        eq([(s.command, s.path) for s in mod.top()], [
+            ("other", "fast"),
+            ("cmd", "slow"),
+            ("cmd", "fast"),
+        ])
+        eq(len(mod.top(2)), 2)
+        mod.reset()
+        eq(mod.top(), [])
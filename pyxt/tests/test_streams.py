@@ -0,0 +1,150 @@
+import asyncio
+
+from testil import eq
+
+from .util import async_test, FakeServer
+from .. import streams as mod
+
+
+@async_test
+async def test_ResultStream_complete_before_delay():
+    kept = []
+    stream = mod.ResultStream(keep=kept.append)
+    stream.run(produce(stream, "a", "b"))
+    assert await stream.wait()
+    eq(stream.take(), ["a", "b"])
+    eq(stream.take(), [])
+    eq(kept, ["a", "b"])
+
+
+@async_test
+async def test_ResultStream_streams_remaining_items():
+    proceed = asyncio.Event()
+    server = FakeServer()
+    stream = mod.ResultStream()
+    stream.run(produce(stream, "a", "b", proceed, "c"))
+    assert not await stream.wait(0)
+    eq(stream.take(), ["a", "b"])
+    stream.start(server)
+    assert stream.id in mod._streams
+    proceed.set()
+    await stream.sender
+    eq(server.notifications, [(mod.RESULTS, {
+        "id": stream.id, "items": ["c"], "done": True, "more": False,
+    })])
+    assert stream.id not in mod._streams
+
+
+@async_test
+async def test_ResultStream_holds_back_items_not_ready():
+    def ready(items):
+        return max(len(items) - 1, 0)
+    proceed = asyncio.Event()
+    stream = mod.ResultStream(ready=ready, finish=list.reverse)
+    stream.run(produce(stream, "a", "b", proceed, "c"))
+    assert not await stream.wait(0)
+    eq(stream.take(), ["a"])
+    proceed.set()
+    await stream.task
+    eq(stream.take(), ["c", "b"])
+
+
+@async_test
+async def test_ResultStream_pages():
+    def notified(items, done=False, more=False):
+        return (mod.RESULTS, {
+            "id": stream.id, "items": items, "done": done, "more": more,
+        })
+    server = FakeServer()
+    stream = mod.ResultStream(page_size=2)
+    stream.run(produce(stream, "a", "b", "c", "d", "e"))
+    assert not await stream.wait()
+    eq(stream.take(), ["a", "b"])
+    await asyncio.sleep(0.01)
+    eq(stream.items, ["c", "d", "e"])  # producer paused: buffer is full
+    assert stream.more
+    stream.start(server)
+    await asyncio.sleep(0.01)
+    eq(server.notifications, [])
+
+    mod.load(stream.id)
+    await asyncio.sleep(0.01)
+    eq(server.notifications, [notified(["c", "d"], more=True)])
+
+    mod.load(stream.id)
+    await stream.sender
+    eq(server.notifications[1:], [notified(["e"], done=True)])
+    eq(stream.count, 5)
+
+
+@async_test
+async def test_ResultStream_last_page_is_full():
+    stream = mod.ResultStream(page_size=2)
+    stream.run(produce(stream, "a", "b"))
+    assert await stream.wait()
+    eq(stream.take(), ["a", "b"])
+
+
+@async_test
+async def test_ResultStream_sends_error():
+    async def fail():
+        await proceed.wait()
+        raise ValueError("bad")
+    proceed = asyncio.Event()
+    server = FakeServer()
+    stream = mod.ResultStream()
+    stream.run(produce(stream, "a", proceed, fail()))
+    assert not await stream.wait(0)
+    eq(stream.take(), ["a"])
+    stream.start(server)
+    proceed.set()
+    await stream.sender
+    eq(server.notifications, [(mod.RESULTS, {
+        "id": stream.id,
+        "items": [{"label": "", "description": "bad"}],
+        "done": True,
+        "more": False,
+    })])
+
+
+@async_test
+async def test_cancel():
+    server = FakeServer()
+    stream = mod.ResultStream(page_size=1)
+    stream.run(produce(stream, "a", "b", asyncio.Event()))
+    assert not await stream.wait(0)
+    eq(stream.take(), ["a"])
+    stream.start(server)
+    await asyncio.sleep(0.01)  # wait for load
+    mod.cancel(stream.id)
+    await asyncio.wait({stream.sender})
+    assert stream.task.cancelled()
+    eq(server.notifications, [])
+    assert stream.id not in mod._streams
+
+
+@async_test
+async def test_cancel_wait():
+    stream = mod.ResultStream()
+    stream.run(produce(stream, asyncio.Event()))
+    waiter = asyncio.ensure_future(stream.wait(0))
+    await asyncio.sleep(0.01)
+    waiter.cancel()
+    await asyncio.wait({waiter})
+    await asyncio.sleep(0)
+    assert stream.task.cancelled()
+
+
+async def produce(stream, *values):
+    """Put values in stream
+
+    Wait for events and await coroutines found in values.
+    """
+    for value in values:
+        if isinstance(value, asyncio.Event):
+            await value.wait()
+        elif asyncio.iscoroutine(value):
+            await value
+        else:
+            stream.put(value)
+            await stream.drain()
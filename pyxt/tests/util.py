@@ -1,9 +1,10 @@
 import asyncio
 import sys
 from contextlib import contextmanager, nullcontext
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from functools import wraps
 from inspect import iscoroutine
+from itertools import count
 from os.path import dirname
 from unittest.mock import patch
 
@@ -11,6 +12,8 @@ from .. import command
 from .. import history
 from .. import jsproxy
 from .. import server
+from .. import streams
+from ..editor import EditorState
 from ..parser import Choice
 from ..results import error, result
 
@@ -83,13 +86,18 @@ class KeywordArgs:
         return ", ".join("%s=%r" % kv for kv in sorted(self.kw.items()))
 
 
-async def do_command(input_value, editor=None):
+async def do_command(input_value, editor=None, stream_delay=60):
+    """Execute command
+
+    Results are not streamed unless the command takes longer than
+    `stream_delay` seconds to complete.
+    """
     def reraise(message):
         if sys.exc_info()[1] is not None:
             raise sys.exc_info()[1]
         raise Error(message)
 
-    def do_not_update_history(server, input_value, command):
+    async def do_not_update_history(server, input_value, command):
         pass
 
     if editor is None:
@@ -99,6 +107,7 @@ async def do_command(input_value, editor=None):
         patch.object(server, "Editor", lambda srv: editor),
         patch.object(server, "error", reraise),
         patch.object(history, "update_history", do_not_update_history),
+        patch.object(streams, "STREAM_DELAY", stream_delay),
     ):
         return await server.do_command(srv, [input_value])
 
@@ -126,7 +135,11 @@ def test_command(*args, name="cmd", with_history=False):
         history_patch = nullcontext()
     else:
         history_patch = patch.object(server, "get_history", no_history)
-    with patch.object(command, "REGISTRY", {}), history_patch:
+    with (
+        patch.object(command, "REGISTRY", {}),
+        patch.object(command, "parser_cache", {}),
+        history_patch,
+    ):
         @command.command(name=name, has_placeholder_item=False, *args)
         async def cmd(editor, args):
             if args.value == "error":
@@ -140,7 +153,7 @@ test_command.__test__ = False
 
 @contextmanager
 def fake_history(cache=None):
-    def async_do(proxy):
+    async def async_do(proxy, idempotent=False):
         path = str(proxy)
         server, params = proxy._resolve()
         server["calls"].append(path)
@@ -172,6 +185,9 @@ class async_property:
         return setattr(owner, self.name, value)
 
 
+VERSIONS = count()
+
+
 @dataclass
 class FakeEditor:
     _file_path: str = None
@@ -180,14 +196,21 @@ class FakeEditor:
     text: str = ""
     _ag_path: str = "ag"
     _python_path: str = "python"
+    _search_backend: str = "auto"
+    _search_page_size: int = 200
     _eol: str = "\n"
     _insert_spaces: bool = True
     _tab_size: int = 4
+    _version: int = field(default_factory=lambda: next(VERSIONS))
+    failed = False
+    shared = False
 
     file_path = async_property("_file_path")
     project_path = async_property("_project_path")
     ag_path = async_property("_ag_path")
     python_path = async_property("_python_path")
+    search_backend = async_property("_search_backend")
+    search_page_size = async_property("_search_page_size")
     eol = async_property("_eol")
     insert_spaces = async_property("_insert_spaces")
     tab_size = async_property("_tab_size")
@@ -197,6 +220,22 @@ class FakeEditor:
         filepath = await self.file_path
         return dirname(filepath) if filepath else None
 
+    async def snapshot(self):
+        return EditorState(
+            version=self._version,
+            file_path=self._file_path,
+            project_path=self._project_path,
+            dirname=await self.dirname,
+            eol=self._eol,
+            insert_spaces=self._insert_spaces,
+            tab_size=self._tab_size,
+            ag_path=self._ag_path,
+            python_path=self._python_path,
+            search_backend=self._search_backend,
+            search_page_size=self._search_page_size,
+            selections=(self._selected_range,),
+        )
+
     @property
     def selection(self):
         return self._selection
@@ -243,6 +282,7 @@ class FakeEditor:
             value,
             self.text[end:],
         ])
+        self._version = next(VERSIONS)
         self.selection = (start, start + len(value)) if select else (end, end)
 
     async def set_texts(self, values, ranges, select=True):
@@ -257,6 +297,15 @@ class FakeEditor:
         self._file_path = path
 
 
+class FakeServer:
+
+    def __init__(self):
+        self.notifications = []
+
+    def send_notification(self, method, params):
+        self.notifications.append((method, params))
+
+
 class Error(Exception):
     pass
 